@@ -1,103 +1,589 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import AsyncExitStack, asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Literal
 import os
-import uvicorn
-from magentic_one_agent import MagenticOneAgent
-from config.lumen_branding import LumenBrandConfig
+import json
+import time
+import asyncio
+from magentic_one_agent import AsyncMagenticOneAgent, preload_sdk
+from config.lumen_branding import get_brand_config
+from services.agent_pool import AsyncAgentPool, AgentPoolExhausted
+from services.run_polling import poll_metrics
+from services.response_cache import get_response_cache
+from services.batch import BatchItemError, BatchJobStore, run_batch_async, validate_batch_item
+from services.sessions import AsyncSessionManager
+from services.coalescing import get_async_coalescer
+from services.admission import AdmissionRejected, AdmissionScheduler
+from services.token_budget import RateLimitExceeded, get_token_budget
+from services.jobs import JobRunner, JobStore
+from services.credentials import close_async_credential, credential_stats
+from services.state import get_shared_store, get_state_store
+from services.context_window import get_context_window
+from services.run_resilience import get_run_resilience
+from services.circuit_breaker import CIRCUIT_STATES, get_circuit_breaker
+from services.payloads import PrecomputedPayload, encode_json, etag_matches, get_response_encoder
+from services.metrics import registry as metrics_registry, http_seconds, stage_seconds, configure_tracing, shutdown_tracing
+
+brand_config = get_brand_config()
+response_cache = get_response_cache()
+response_encoder = get_response_encoder()
+
+# The brand is static, so "/" and "/branding" are serialized once; clients
+# revalidate with If-None-Match and get a 304 while the ETag is unchanged.
+BRANDING_MAX_AGE = int(os.environ.get("BRANDING_MAX_AGE", "3600"))
+ROOT_PAYLOAD = PrecomputedPayload({
+    "message": "Lumen Magentic-One Agent API",
+    "company": brand_config.company_name,
+    "industry": brand_config.industry,
+    "primary_color": brand_config.primary_color,
+    "tagline": brand_config.tagline,
+    "version": "1.0.0",
+    "mode": "oneshot",
+    "features": [
+        "Customer Support Specialization",
+        "Channel Partner Scaling",
+        "Lumen Brand Integration",
+        "Technology Industry Focus"
+    ]
+}, max_age=BRANDING_MAX_AGE)
+BRANDING_PAYLOAD = PrecomputedPayload({
+    "color_scheme": brand_config.get_color_scheme(),
+    "brand_identity": brand_config.get_brand_identity(),
+    "css_variables": brand_config.get_css_variables()
+}, max_age=BRANDING_MAX_AGE)
+agent_pool = AsyncAgentPool(AsyncMagenticOneAgent)
+coalescer = get_async_coalescer()
+admission = AdmissionScheduler()
+admission.register_metrics()
+token_budget = get_token_budget()
+batch_store = BatchJobStore()
+
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "8"))
+
+# Scrape-time gauges over state that is already tracked elsewhere.
+metrics_registry.gauge(
+    "support_agent_pool_agents", "Pooled agents by state.", ("state",),
+    callback=lambda: {state: agent_pool.health()[state] for state in ("idle", "in_use")}
+)
+metrics_registry.gauge(
+    "support_agent_pool_lease_events", "Pool leases, waits and timeouts since start.", ("event",),
+    callback=lambda: {event: agent_pool.health()[event] for event in ("leases", "lease_waits", "lease_timeouts")}
+)
+metrics_registry.gauge(
+    "support_run_polls", "Run status polls and finished runs since start.", ("kind",),
+    callback=lambda: {kind: poll_metrics.snapshot()[kind] for kind in ("runs", "polls")}
+)
+metrics_registry.gauge(
+    "support_response_cache", "Response cache entries and hit rate.", ("field",),
+    callback=lambda: {field: response_cache.stats()[field] for field in ("entries", "hit_rate")} if response_cache else {}
+)
+metrics_registry.gauge(
+    "support_circuit_state", "Agent backend circuit state: 0 closed, 1 half-open, 2 open.",
+    callback=lambda: {(): CIRCUIT_STATES.index(get_circuit_breaker().state)}
+)
+metrics_registry.gauge(
+    "support_sessions", "Active partner sessions and spare threads.", ("field",),
+    callback=lambda: {field: session_manager.stats()[field] for field in ("active_sessions", "spare_threads")} if session_manager else {}
+)
+
+session_manager = None
+_session_manager_lock = asyncio.Lock()
+
+async def _get_session_manager():
+    """Session manager bound to the pool's agents client, created once the pool has started."""
+    global session_manager
+    async with _session_manager_lock:
+        if session_manager is None:
+            if agent_pool.agent_client is None:
+                await agent_pool.start()
+            manager = AsyncSessionManager(agent_pool.agent_client, store=get_shared_store())
+            await manager.start()
+            session_manager = manager
+    return session_manager
+
+job_runner = None
+
+def _get_job_runner():
+    """Background job runner over the SQLite job store, created on first use."""
+    global job_runner
+    if job_runner is None:
+        job_runner = JobRunner(JobStore(), _run_job)
+    return job_runner
+
+# "background" starts accepting requests (and answering /health) right away and
+# builds the Azure client, pool and sessions in a task; "eager" finishes that
+# before the server accepts connections.
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "background").lower()
+startup_state = {"mode": STARTUP_MODE, "status": "starting", "warm_up_seconds": None, "error": None}
+
+async def _warm_up():
+    """Import the SDK, create the client and agent definition, and pre-create session threads."""
+    started = time.perf_counter()
+    startup_state["status"] = "warming"
+    try:
+        await asyncio.to_thread(preload_sdk)
+        await agent_pool.start()
+        await _get_session_manager()
+        startup_state["status"] = "ready"
+    except Exception as e:
+        # Keep serving /health; requests retry the start and surface the error.
+        startup_state["status"] = "degraded"
+        startup_state["error"] = str(e)
+        print(f"Agent pool warm-up failed: {e}")
+    startup_state["warm_up_seconds"] = round(time.perf_counter() - started, 3)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create the shared agent pool at startup and release it on shutdown."""
+    configure_tracing()
+    warm_up_task = None
+    if not agent_pool.warm_up:
+        startup_state["status"] = "lazy"
+    elif STARTUP_MODE == "eager":
+        await _warm_up()
+    else:
+        warm_up_task = asyncio.create_task(_warm_up())
+    # Resume jobs queued or interrupted before this worker started.
+    await _get_job_runner().start()
+    yield
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    await job_runner.close()
+    if session_manager is not None:
+        await session_manager.close()
+    await agent_pool.close()
+    await close_async_credential()
+    get_state_store().close()
+    shutdown_tracing()
 
 app = FastAPI(
     title="Lumen Magentic-One Agent API",
     description="Lumen-customized Magentic-One Agent for customer support and channel partner scaling",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
-brand_config = LumenBrandConfig()
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Observe request latency per route template (streams are timed to their first byte)."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        http_seconds.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=status
+        )
 
 class QueryRequest(BaseModel):
     query: str
     partner_info: Optional[Dict[str, Any]] = None
+    session_id: Optional[str] = None
 
 class TechnicalSupportRequest(BaseModel):
     technical_issue: str
     urgency: str = "medium"
+    session_id: Optional[str] = None
 
 class PartnerScalingRequest(BaseModel):
     partner_profile: Dict[str, Any]
+    session_id: Optional[str] = None
+
+class BatchItem(BaseModel):
+    type: Literal["query", "technical", "scaling"]
+    query: Optional[str] = None
+    partner_info: Optional[Dict[str, Any]] = None
+    technical_issue: Optional[str] = None
+    urgency: Optional[str] = None
+    partner_profile: Optional[Dict[str, Any]] = None
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem] = []
+    max_concurrency: Optional[int] = None
+    job_id: Optional[str] = None
+
+class JobRequest(BatchItem):
+    webhook_url: Optional[str] = None
+
+class PartnerScalingJobRequest(PartnerScalingRequest):
+    webhook_url: Optional[str] = None
 
 class AgentResponse(BaseModel):
     response: str
     status: str = "success"
 
+def _cache_bypassed(header_value: Optional[str]):
+    """Whether the client asked to skip the response cache via X-Cache-Bypass."""
+    return header_value is not None and header_value.lower() in ("1", "true", "yes")
+
+def _session_key(session_id: Optional[str], partner_info: Optional[Dict[str, Any]] = None):
+    """Follow-ups reuse a thread per explicit session, otherwise per partner."""
+    if session_id:
+        return f"session:{session_id}"
+    if partner_info and partner_info.get("partner_name"):
+        return f"partner:{partner_info['partner_name']}"
+    return None
+
+def _partner_tier(partner_info: Optional[Dict[str, Any]] = None):
+    return (partner_info or {}).get("partner_tier")
+
+def _item_partner(item: Dict[str, Any]):
+    """Partner details of a batch or job item: the scaling profile or the query's partner_info."""
+    return item.get("partner_profile") or item.get("partner_info")
+
+def _rejected(e):
+    """429 for admission rejections and model rate limits, carrying their Retry-After hint."""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def _enter_backend(stack: AsyncExitStack, context):
+    """Enter a context that calls the agent backend, counting its failure against the circuit."""
+    try:
+        return await stack.enter_async_context(context)
+    except (AgentPoolExhausted, TimeoutError):
+        # Local capacity and shared-lock waits, not backend failures.
+        raise
+    except Exception:
+        get_circuit_breaker().record(False)
+        raise
+
+@asynccontextmanager
+async def _leased_agent(session_key: Optional[str] = None, priority: str = "medium", tier: Optional[str] = None):
+    """
+    Claim the request's session, admit it, then lease a pooled agent that
+    takes the session's remote thread when it starts a run.
+    
+    While the backend circuit is open the request skips admission, the agent
+    definition and the session thread, so it is answered from the agent's
+    degraded path without waiting on the backend.
+    """
+    if get_circuit_breaker().is_open():
+        async with agent_pool.lease(ensure_definition=False) as agent:
+            try:
+                yield agent
+            finally:
+                # The circuit may have half-opened since, letting the agent start its own thread.
+                await agent.close_support_session()
+        return
+    
+    async with AsyncExitStack() as stack:
+        # Queue behind the session's own runs first, so a burst from one
+        # partner waits without holding admission slots or pooled agents.
+        sessions = await _get_session_manager()
+        claim = await stack.enter_async_context(sessions.claim(session_key))
+        stack.callback(admission.release, await admission.acquire(priority, tier))
+        started = time.perf_counter()
+        agent = await _enter_backend(stack, agent_pool.lease())
+        stage_seconds.observe(time.perf_counter() - started, stage="pool_wait")
+        # The thread is taken only when a run needs it: cached answers never create one.
+        agent.thread_source = lambda: sessions.thread_for(claim)
+        yield agent
+
+def _static_response(payload: PrecomputedPayload, if_none_match: Optional[str], accept_encoding: Optional[str]):
+    """The payload's bytes in the negotiated coding, or an empty 304 when the client already has them."""
+    body, headers = payload.encoded(response_encoder, accept_encoding)
+    if etag_matches(if_none_match, headers["ETag"]):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=payload.media_type, headers=headers)
+
+def _answer_headers(agent):
+    """X-Cache and X-Run-Outcome for an answer, read while the agent is still leased."""
+    headers = {"X-Cache": agent.last_cache_status}
+    if agent.last_run_outcome:
+        headers["X-Run-Outcome"] = agent.last_run_outcome
+    return headers
+
+def _answer_response(response: str, headers: Dict[str, str], accept_encoding: Optional[str]):
+    """
+    The AgentResponse body encoded straight to bytes. The answer is a str
+    built by the agent, so the model validation and generic encoding
+    FastAPI applies to returned values are skipped; response_model is still
+    declared for the OpenAPI schema.
+    """
+    body, encoding_headers = response_encoder.encode(
+        encode_json({"response": response, "status": "success"}), accept_encoding
+    )
+    return Response(content=body, media_type="application/json", headers={**headers, **encoding_headers})
+
 @app.get("/")
-async def root():
+async def root(if_none_match: Optional[str] = Header(None), accept_encoding: Optional[str] = Header(None)):
     """Root endpoint with Lumen branding."""
-    return {
-        "message": "Lumen Magentic-One Agent API",
-        "company": brand_config.company_name,
-        "industry": brand_config.industry,
-        "primary_color": brand_config.primary_color,
-        "tagline": brand_config.tagline,
-        "version": "1.0.0",
-        "mode": "oneshot",
-        "features": [
-            "Customer Support Specialization",
-            "Channel Partner Scaling",
-            "Lumen Brand Integration",
-            "Technology Industry Focus"
-        ]
-    }
+    return _static_response(ROOT_PAYLOAD, if_none_match, accept_encoding)
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "service": "lumen-magentic-one-agent"}
+    circuit = get_circuit_breaker().stats()
+    # The budget sits behind the shared store's lock, which is taken off the loop.
+    budget = await token_budget.stats_async() if token_budget else None
+    return {
+        # Still serving (cached or canned answers) while the backend circuit is open.
+        "status": "degraded" if circuit["state"] == "open" else "healthy",
+        "service": "lumen-magentic-one-agent",
+        "startup": startup_state,
+        "agent_pool": agent_pool.health(),
+        "run_polling": poll_metrics.snapshot(),
+        "response_cache": response_cache.stats() if response_cache else None,
+        "sessions": session_manager.stats() if session_manager else None,
+        "coalescing": coalescer.stats() if coalescer else None,
+        "admission": admission.stats(),
+        "token_budget": budget,
+        "jobs": job_runner.stats() if job_runner else None,
+        "credential": credential_stats(),
+        "state": get_state_store().stats(),
+        "context_window": get_context_window().stats(),
+        "run_resilience": get_run_resilience().stats(),
+        "circuit_breaker": circuit,
+        "response_encoding": response_encoder.stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of request, stage, run and cache metrics."""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.post("/query", response_model=AgentResponse)
-async def handle_query(request: QueryRequest):
+async def handle_query(request: QueryRequest, x_cache_bypass: Optional[str] = Header(None),
+                       accept_encoding: Optional[str] = Header(None)):
     """Handle general customer support queries."""
     try:
-        agent = MagenticOneAgent()
-        response = agent.handle_customer_query(request.query, request.partner_info)
-        agent.cleanup()
+        async with _leased_agent(
+            _session_key(request.session_id, request.partner_info),
+            tier=_partner_tier(request.partner_info)
+        ) as agent:
+            # Follow-ups in an explicit session depend on its history, so they skip the cache.
+            response = await agent.handle_customer_query(
+                request.query,
+                request.partner_info,
+                use_cache=not (_cache_bypassed(x_cache_bypass) or request.session_id)
+            )
+            headers = _answer_headers(agent)
         
-        return AgentResponse(response=response)
+        return _answer_response(response, headers, accept_encoding)
+    except (AdmissionRejected, RateLimitExceeded) as e:
+        raise _rejected(e)
+    except AgentPoolExhausted as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
 @app.post("/technical-support", response_model=AgentResponse)
-async def handle_technical_support(request: TechnicalSupportRequest):
+async def handle_technical_support(request: TechnicalSupportRequest, x_cache_bypass: Optional[str] = Header(None),
+                                   accept_encoding: Optional[str] = Header(None)):
     """Handle technical support requests."""
     try:
-        agent = MagenticOneAgent()
-        response = agent.handle_technical_support(request.technical_issue, request.urgency)
-        agent.cleanup()
+        async with _leased_agent(_session_key(request.session_id), priority=request.urgency) as agent:
+            response = await agent.handle_technical_support(
+                request.technical_issue,
+                request.urgency,
+                use_cache=not (_cache_bypassed(x_cache_bypass) or request.session_id)
+            )
+            headers = _answer_headers(agent)
         
-        return AgentResponse(response=response)
+        return _answer_response(response, headers, accept_encoding)
+    except (AdmissionRejected, RateLimitExceeded) as e:
+        raise _rejected(e)
+    except AgentPoolExhausted as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing technical support: {str(e)}")
 
 @app.post("/partner-scaling", response_model=AgentResponse)
-async def handle_partner_scaling(request: PartnerScalingRequest):
+async def handle_partner_scaling(request: PartnerScalingRequest, x_cache_bypass: Optional[str] = Header(None),
+                                 accept_encoding: Optional[str] = Header(None)):
     """Handle partner scaling recommendations."""
     try:
-        agent = MagenticOneAgent()
-        response = agent.get_partner_scaling_recommendations(request.partner_profile)
-        agent.cleanup()
+        async with _leased_agent(
+            _session_key(request.session_id, request.partner_profile),
+            tier=_partner_tier(request.partner_profile)
+        ) as agent:
+            response = await agent.get_partner_scaling_recommendations(
+                request.partner_profile,
+                use_cache=not (_cache_bypassed(x_cache_bypass) or request.session_id)
+            )
+            headers = _answer_headers(agent)
         
-        return AgentResponse(response=response)
+        return _answer_response(response, headers, accept_encoding)
+    except (AdmissionRejected, RateLimitExceeded) as e:
+        raise _rejected(e)
+    except AgentPoolExhausted as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing scaling request: {str(e)}")
 
+@app.post("/batch")
+async def handle_batch(request: BatchRequest):
+    """Run many query, technical and scaling items in one call, or resume a batch by job_id."""
+    items = [item.model_dump(exclude_none=True) for item in request.items]
+    max_concurrency = min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    
+    async def handle_item(item: dict):
+        # Every item is admitted and leases its own agent and one-off thread, so
+        # a batch only holds the capacity it is actually using. Bulk work is low
+        # priority: it is the first to be turned away when saturated, and a
+        # rejected item is left for a resume.
+        partner_info = _item_partner(item)
+        async with _leased_agent(priority="low", tier=_partner_tier(partner_info)) as agent:
+            return await agent.answer_item(item)
+    
+    try:
+        return await run_batch_async(items, handle_item, max_concurrency, store=batch_store, job_id=request.job_id)
+    except (AdmissionRejected, RateLimitExceeded) as e:
+        raise _rejected(e)
+    except BatchItemError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown batch job: {request.job_id}")
+    except AgentPoolExhausted as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
+
+@app.get("/batch/{job_id}")
+async def get_batch(job_id: str):
+    """Get the stored items and per-item results of a batch job."""
+    job = await asyncio.to_thread(batch_store.load, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch job: {job_id}")
+    return job
+
+async def _run_job(job: dict):
+    """Answer one stored job item on a pooled agent, subject to admission like any request."""
+    item = job["payload"]
+    partner_info = _item_partner(item)
+    async with _leased_agent(
+        _session_key(None, partner_info),
+        priority=item.get("urgency") or "medium",
+        tier=_partner_tier(partner_info)
+    ) as agent:
+        # A failed or timed-out run raises, failing the job instead of storing the apology.
+        return await agent.answer_item(item)
+
+async def _submit_job(item: dict, webhook_url: Optional[str], http_response: Response):
+    try:
+        validate_batch_item(item)
+        job = await _get_job_runner().submit_async(item["type"], item, webhook_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    http_response.status_code = 202
+    http_response.headers["Location"] = f"/jobs/{job['id']}"
+    return {"job_id": job["id"], "status": job["status"], "status_url": f"/jobs/{job['id']}"}
+
+@app.post("/jobs")
+async def submit_job(request: JobRequest, http_response: Response):
+    """Queue a query, technical or scaling item as a background job; poll /jobs/{job_id} or pass a webhook_url."""
+    item = request.model_dump(exclude_none=True, exclude={"webhook_url"})
+    return await _submit_job(item, request.webhook_url, http_response)
+
+@app.post("/partner-scaling/jobs")
+async def submit_partner_scaling_job(request: PartnerScalingJobRequest, http_response: Response):
+    """Queue a partner scaling consultation without holding the connection open."""
+    item = {"type": "scaling", "partner_profile": request.partner_profile}
+    return await _submit_job(item, request.webhook_url, http_response)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Status of a background job, with its result once it has finished."""
+    job = _get_job_runner().store.get(job_id, public=True)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+def _sse(event: str, text: str):
+    """Encode one server-sent event; the text is JSON-encoded so newlines survive."""
+    return f"event: {event}\ndata: {json.dumps({'text': text})}\n\n"
+
+class _LeasedStream(StreamingResponse):
+    """
+    SSE response streamed from an agent leased before it starts.
+    
+    However the response ends, including a client that disconnects before the
+    first event, the event source is closed and the lease (session claim,
+    admission ticket and pooled agent) is released.
+    """
+    
+    def __init__(self, event_source, lease: AsyncExitStack, **kwargs):
+        super().__init__(event_source, **kwargs)
+        self.event_source = event_source
+        self.lease = lease
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.event_source.aclose()
+            await self.lease.aclose()
+
+async def _stream_response(stream_factory, session_key: Optional[str] = None, priority: str = "medium", tier: Optional[str] = None):
+    """Wrap an agent event stream in an SSE response that holds a pooled agent while streaming."""
+    # Lease before the response starts so a rejection is still a plain 429.
+    # The session is claimed before admission, as for every other request.
+    lease = AsyncExitStack()
+    try:
+        agent = await lease.enter_async_context(_leased_agent(session_key, priority, tier))
+    except AdmissionRejected as e:
+        raise _rejected(e)
+    except AgentPoolExhausted as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
+    
+    async def event_source():
+        try:
+            async for event, text in stream_factory(agent):
+                yield _sse(event, text)
+        except Exception as e:
+            yield _sse("error", f"Error processing request: {str(e)}")
+        yield _sse("done", "")
+    
+    return _LeasedStream(
+        event_source(),
+        lease,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/query/stream")
+async def stream_query(request: QueryRequest):
+    """Stream a general customer support answer as server-sent events."""
+    return await _stream_response(
+        lambda agent: agent.stream_customer_query(request.query, request.partner_info, events=True),
+        _session_key(request.session_id, request.partner_info),
+        tier=_partner_tier(request.partner_info)
+    )
+
+@app.post("/technical-support/stream")
+async def stream_technical_support(request: TechnicalSupportRequest):
+    """Stream a technical support answer as server-sent events."""
+    return await _stream_response(
+        lambda agent: agent.stream_technical_support(request.technical_issue, request.urgency, events=True),
+        _session_key(request.session_id),
+        priority=request.urgency
+    )
+
+@app.post("/partner-scaling/stream")
+async def stream_partner_scaling(request: PartnerScalingRequest):
+    """Stream partner scaling recommendations as server-sent events."""
+    return await _stream_response(
+        lambda agent: agent.stream_partner_scaling_recommendations(request.partner_profile, events=True),
+        _session_key(request.session_id, request.partner_profile),
+        tier=_partner_tier(request.partner_profile)
+    )
+
 @app.get("/branding")
-async def get_branding():
+async def get_branding(if_none_match: Optional[str] = Header(None), accept_encoding: Optional[str] = Header(None)):
     """Get Lumen branding configuration."""
-    return {
-        "color_scheme": brand_config.get_color_scheme(),
-        "brand_identity": brand_config.get_brand_identity(),
-        "css_variables": brand_config.get_css_variables()
-    }
+    return _static_response(BRANDING_PAYLOAD, if_none_match, accept_encoding)
 
 if __name__ == "__main__":
+    import uvicorn
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run("app:app", host="0.0.0.0", port=port, reload=False)
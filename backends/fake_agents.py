@@ -0,0 +1,506 @@
+import asyncio
+import itertools
+import os
+import random
+import threading
+import time
+
+
+def _env_float(name: str, default: float):
+    return float(os.environ.get(name, str(default)))
+
+
+class FakeAgentsConfig:
+    """Latency and failure knobs for the in-process agents service."""
+
+    def __init__(self, call_latency: float = 0.005, run_seconds: float = 0.5, run_jitter: float = 0.2,
+                 token_delay: float = 0.005, failure_rate: float = 0.0, response_words: int = 120, seed: int = None):
+        self.call_latency = call_latency
+        self.run_seconds = run_seconds
+        self.run_jitter = run_jitter
+        self.token_delay = token_delay
+        self.failure_rate = failure_rate
+        self.response_words = response_words
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls):
+        seed = os.environ.get("FAKE_AGENTS_SEED")
+        return cls(
+            call_latency=_env_float("FAKE_AGENTS_CALL_LATENCY_MS", 5) / 1000,
+            run_seconds=_env_float("FAKE_AGENTS_RUN_SECONDS", 0.5),
+            run_jitter=_env_float("FAKE_AGENTS_RUN_JITTER", 0.2),
+            token_delay=_env_float("FAKE_AGENTS_TOKEN_DELAY_MS", 5) / 1000,
+            failure_rate=_env_float("FAKE_AGENTS_FAILURE_RATE", 0.0),
+            response_words=int(_env_float("FAKE_AGENTS_RESPONSE_WORDS", 120)),
+            seed=int(seed) if seed else None
+        )
+
+
+class _Record:
+    """Attribute bag mirroring the SDK model objects the agents read."""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.__dict__!r})"
+
+
+class FakeText(_Record):
+    pass
+
+
+class FakeTextContent(_Record):
+    pass
+
+
+class FakeMessage(_Record):
+    pass
+
+
+class FakeRun(_Record):
+    pass
+
+
+class FakeDeltaChunk(_Record):
+    pass
+
+
+_FILLER = (
+    "Lumen partners can scale managed network cloud and security services by aligning "
+    "offers to customer outcomes automating onboarding and tracking adoption metrics"
+).split()
+
+
+class FakeAgentsService:
+    """
+    In-process stand-in for the Azure AI agents service.
+
+    State lives in memory; runs advance with wall-clock time, finishing after
+    the configured run duration (or failing at the configured rate) and then
+    appending a canned assistant answer derived from the prompt.
+    """
+
+    def __init__(self, config: FakeAgentsConfig = None):
+        self.config = config or FakeAgentsConfig.from_env()
+        self._random = random.Random(self.config.seed)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.agents = {}
+        self.threads = {}
+        self.messages = {}
+        self.runs = {}
+        self.calls = 0
+
+    def _id(self, prefix: str):
+        return f"{prefix}_{next(self._ids):08d}"
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    # Agents
+
+    def create_agent(self, model, name, instructions, tools=None, tool_resources=None, metadata=None):
+        agent = _Record(id=self._id("asst"), model=model, name=name, instructions=instructions,
+                        tools=tools or [], metadata=metadata or {})
+        with self._lock:
+            self.agents[agent.id] = agent
+        return agent
+
+    def get_agent(self, agent_id):
+        with self._lock:
+            if agent_id not in self.agents:
+                raise KeyError(f"Agent {agent_id} not found")
+            return self.agents[agent_id]
+
+    def list_agents(self):
+        with self._lock:
+            return list(self.agents.values())
+
+    def delete_agent(self, agent_id):
+        with self._lock:
+            self.agents.pop(agent_id, None)
+
+    # Threads and messages
+
+    def create_thread(self):
+        thread = _Record(id=self._id("thread"), created_at=time.time())
+        with self._lock:
+            self.threads[thread.id] = thread
+            self.messages[thread.id] = []
+        return thread
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            self.threads.pop(thread_id, None)
+            self.messages.pop(thread_id, None)
+
+    def create_message(self, thread_id, role, content, run_id=None):
+        message = FakeMessage(
+            id=self._id("msg"),
+            thread_id=thread_id,
+            run_id=run_id,
+            role=role,
+            content=[FakeTextContent(type="text", text=FakeText(value=content, annotations=[]))],
+            created_at=time.time()
+        )
+        with self._lock:
+            if thread_id not in self.messages:
+                raise KeyError(f"Thread {thread_id} not found")
+            self.messages[thread_id].append(message)
+        return message
+
+    def list_messages(self, thread_id, run_id=None, order="desc", limit=None):
+        with self._lock:
+            messages = list(self.messages.get(thread_id, []))
+        if run_id is not None:
+            messages = [message for message in messages if message.run_id == run_id]
+        if str(getattr(order, "value", order)).lower() == "desc":
+            messages.reverse()
+        return messages[:limit] if limit else messages
+
+    # Runs
+
+    def create_run(self, thread_id, agent_id, **kwargs):
+        with self._lock:
+            if thread_id not in self.threads:
+                raise KeyError(f"Thread {thread_id} not found")
+            active = [run for run in self.runs.values()
+                      if run.thread_id == thread_id and run.status in ("queued", "in_progress")]
+            duration = max(0.0, self.config.run_seconds + self._random.uniform(-1, 1) * self.config.run_jitter)
+            fails = self._random.random() < self.config.failure_rate
+        if active:
+            raise RuntimeError(f"Thread {thread_id} already has an active run")
+
+        prompt = self._last_user_message(thread_id)
+        run = FakeRun(
+            id=self._id("run"),
+            thread_id=thread_id,
+            agent_id=agent_id,
+            status="queued",
+            created_at=time.time(),
+            completes_at=time.monotonic() + duration,
+            fails=fails,
+            last_error=None,
+            usage=None,
+            answer=self._answer(prompt),
+            prompt_tokens=self._prompt_tokens(thread_id, kwargs.get("truncation_strategy"), kwargs.get("max_prompt_tokens"))
+        )
+        with self._lock:
+            self.runs[run.id] = run
+        return run
+
+    def _prompt_tokens(self, thread_id, truncation_strategy=None, max_prompt_tokens=None):
+        """Tokens of the thread messages a run reads, honouring the run's truncation options."""
+        with self._lock:
+            messages = list(self.messages.get(thread_id, []))
+        if truncation_strategy and truncation_strategy.get("type") == "last_messages":
+            messages = messages[-truncation_strategy["last_messages"]:]
+        tokens = sum(len(m.content[0].text.value) for m in messages) // 4
+        return min(tokens, max_prompt_tokens) if max_prompt_tokens else tokens
+
+    def get_run(self, thread_id, run_id):
+        with self._lock:
+            run = self.runs[run_id]
+        self._advance(run)
+        return run
+
+    def cancel_run(self, thread_id, run_id):
+        with self._lock:
+            run = self.runs[run_id]
+            if run.status in ("queued", "in_progress"):
+                # Like the service, the run only reaches "cancelled" on a later read.
+                run.status = "cancelling"
+        return run
+
+    def _advance(self, run):
+        """Move a run forward according to wall-clock time."""
+        with self._lock:
+            if run.status == "cancelling":
+                run.status = "cancelled"
+                return
+            if run.status not in ("queued", "in_progress"):
+                return
+            if time.monotonic() < run.completes_at:
+                run.status = "in_progress"
+                return
+            if run.fails:
+                run.status = "failed"
+                run.last_error = {"code": "server_error", "message": "Simulated failure"}
+                return
+            run.status = "completed"
+        self.create_message(run.thread_id, "assistant", run.answer, run_id=run.id)
+        completion_tokens = len(run.answer.split())
+        run.usage = _Record(prompt_tokens=run.prompt_tokens, completion_tokens=completion_tokens,
+                            total_tokens=run.prompt_tokens + completion_tokens)
+
+    def _last_user_message(self, thread_id):
+        with self._lock:
+            for message in reversed(self.messages.get(thread_id, [])):
+                if message.role == "user":
+                    return message.content[0].text.value
+        return ""
+
+    def _answer(self, prompt: str):
+        first_line = next((line.strip() for line in prompt.splitlines() if line.strip()), "your request")
+        words = [self._random.choice(_FILLER) for _ in range(self.config.response_words)]
+        return f"Thank you for reaching out about: {first_line[:120]}\n\n" + " ".join(words) + "."
+
+    def stream_plan(self, thread_id, agent_id, **kwargs):
+        """Create a run and return it with the answer split into streamed tokens."""
+        run = self.create_run(thread_id, agent_id, **kwargs)
+        tokens = [token + " " for token in run.answer.split(" ")]
+        tokens[-1] = tokens[-1].rstrip()
+        return run, tokens
+
+
+class _Operations:
+    def __init__(self, service: FakeAgentsService):
+        self._service = service
+
+    def _call(self):
+        self._service.count_call()
+        if self._service.config.call_latency:
+            time.sleep(self._service.config.call_latency)
+
+
+class _FakeThreadsOperations(_Operations):
+    def create(self, **kwargs):
+        self._call()
+        return self._service.create_thread()
+
+    def delete(self, thread_id):
+        self._call()
+        self._service.delete_thread(thread_id)
+
+
+class _FakeMessagesOperations(_Operations):
+    def create(self, thread_id, role, content, **kwargs):
+        self._call()
+        return self._service.create_message(thread_id, str(getattr(role, "value", role)), content)
+
+    def list(self, thread_id, run_id=None, order="desc", limit=None, **kwargs):
+        self._call()
+        return iter(self._service.list_messages(thread_id, run_id, order, limit))
+
+
+class _FakeRunStream:
+    """Context manager yielding (event_type, event_data, raw) like the SDK run stream."""
+
+    def __init__(self, service: FakeAgentsService, thread_id: str, agent_id: str, **kwargs):
+        self._service = service
+        self._run, self._tokens = service.stream_plan(thread_id, agent_id, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def _events(self, sleep):
+        run = self._run
+        yield "thread.run.created", run, None
+        yield "thread.run.in_progress", run, None
+        if run.fails:
+            run.completes_at = time.monotonic()
+            self._service.get_run(run.thread_id, run.id)
+            yield "thread.run.failed", run, None
+            return
+        for token in self._tokens:
+            yield sleep, None, None
+            yield "thread.message.delta", FakeDeltaChunk(text=token), None
+        run.completes_at = time.monotonic()
+        self._service.get_run(run.thread_id, run.id)
+        yield "thread.run.completed", run, None
+        yield "done", None, None
+
+    def __iter__(self):
+        delay = self._service.config.token_delay
+        for event in self._events("sleep"):
+            if event[0] == "sleep":
+                if delay:
+                    time.sleep(delay)
+                continue
+            yield event
+
+
+class _FakeRunsOperations(_Operations):
+    def create(self, thread_id, agent_id, **kwargs):
+        self._call()
+        return self._service.create_run(thread_id, agent_id, **kwargs)
+
+    def get(self, thread_id, run_id, **kwargs):
+        self._call()
+        return self._service.get_run(thread_id, run_id)
+
+    def cancel(self, thread_id, run_id, **kwargs):
+        self._call()
+        return self._service.cancel_run(thread_id, run_id)
+
+    def stream(self, thread_id, agent_id, **kwargs):
+        self._call()
+        return _FakeRunStream(self._service, thread_id, agent_id, **kwargs)
+
+
+class FakeAgentsClient(_Operations):
+    """Synchronous client exposing the subset of AgentsClient used by MagenticOneAgent."""
+
+    def __init__(self, service: FakeAgentsService):
+        super().__init__(service)
+        self.threads = _FakeThreadsOperations(service)
+        self.messages = _FakeMessagesOperations(service)
+        self.runs = _FakeRunsOperations(service)
+
+    def create_agent(self, model, name, instructions, tools=None, tool_resources=None, metadata=None, **kwargs):
+        self._call()
+        return self._service.create_agent(model, name, instructions, tools, tool_resources, metadata)
+
+    def get_agent(self, agent_id):
+        self._call()
+        return self._service.get_agent(agent_id)
+
+    def list_agents(self, **kwargs):
+        self._call()
+        return iter(self._service.list_agents())
+
+    def delete_agent(self, agent_id):
+        self._call()
+        self._service.delete_agent(agent_id)
+
+
+class FakeProjectClient:
+    """Drop-in for AIProjectClient backed by a FakeAgentsService."""
+
+    def __init__(self, service: FakeAgentsService = None):
+        self.service = service or get_fake_service()
+        self.agents = FakeAgentsClient(self.service)
+
+    def close(self):
+        pass
+
+
+# Async variants
+
+
+class _AsyncOperations:
+    def __init__(self, service: FakeAgentsService):
+        self._service = service
+
+    async def _call(self):
+        self._service.count_call()
+        if self._service.config.call_latency:
+            await asyncio.sleep(self._service.config.call_latency)
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+class _AsyncFakeThreadsOperations(_AsyncOperations):
+    async def create(self, **kwargs):
+        await self._call()
+        return self._service.create_thread()
+
+    async def delete(self, thread_id):
+        await self._call()
+        self._service.delete_thread(thread_id)
+
+
+class _AsyncFakeMessagesOperations(_AsyncOperations):
+    async def create(self, thread_id, role, content, **kwargs):
+        await self._call()
+        return self._service.create_message(thread_id, str(getattr(role, "value", role)), content)
+
+    def list(self, thread_id, run_id=None, order="desc", limit=None, **kwargs):
+        async def pages():
+            await self._call()
+            for message in self._service.list_messages(thread_id, run_id, order, limit):
+                yield message
+        return pages()
+
+
+class _AsyncFakeRunStream(_FakeRunStream):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def __aiter__(self):
+        delay = self._service.config.token_delay
+        for event in self._events("sleep"):
+            if event[0] == "sleep":
+                if delay:
+                    await asyncio.sleep(delay)
+                continue
+            yield event
+
+
+class _AsyncFakeRunsOperations(_AsyncOperations):
+    async def create(self, thread_id, agent_id, **kwargs):
+        await self._call()
+        return self._service.create_run(thread_id, agent_id, **kwargs)
+
+    async def get(self, thread_id, run_id, **kwargs):
+        await self._call()
+        return self._service.get_run(thread_id, run_id)
+
+    async def cancel(self, thread_id, run_id, **kwargs):
+        await self._call()
+        return self._service.cancel_run(thread_id, run_id)
+
+    async def stream(self, thread_id, agent_id, **kwargs):
+        await self._call()
+        return _AsyncFakeRunStream(self._service, thread_id, agent_id, **kwargs)
+
+
+class AsyncFakeAgentsClient(_AsyncOperations):
+    """Asyncio client exposing the subset of the aio AgentsClient used by AsyncMagenticOneAgent."""
+
+    def __init__(self, service: FakeAgentsService):
+        super().__init__(service)
+        self.threads = _AsyncFakeThreadsOperations(service)
+        self.messages = _AsyncFakeMessagesOperations(service)
+        self.runs = _AsyncFakeRunsOperations(service)
+
+    async def create_agent(self, model, name, instructions, tools=None, tool_resources=None, metadata=None, **kwargs):
+        await self._call()
+        return self._service.create_agent(model, name, instructions, tools, tool_resources, metadata)
+
+    async def get_agent(self, agent_id):
+        await self._call()
+        return self._service.get_agent(agent_id)
+
+    def list_agents(self, **kwargs):
+        return _aiter(self._service.list_agents())
+
+    async def delete_agent(self, agent_id):
+        await self._call()
+        self._service.delete_agent(agent_id)
+
+
+class AsyncFakeProjectClient:
+    """Drop-in for the aio AIProjectClient backed by a FakeAgentsService."""
+
+    def __init__(self, service: FakeAgentsService = None):
+        self.service = service or get_fake_service()
+        self.agents = AsyncFakeAgentsClient(self.service)
+
+    async def close(self):
+        pass
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_fake_service():
+    """Process-wide fake service so every agent in a worker sees the same state."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = FakeAgentsService()
+        return _service
@@ -0,0 +1,129 @@
+"""
+Cold start profile for the API.
+
+Reports the slowest imports of `app` (via python -X importtime), the cost of
+the Azure SDK imports that are deferred to warm-up, and time-to-first-request:
+from spawning uvicorn to the first 200 from /health and to the first answered
+/query (against the fake backend unless --backend azure).
+
+Usage:
+    python benchmarks/cold_start.py [--runs 3] [--top 15] [--target-ms 1500]
+        [--startup-mode background|eager] [--backend fake|azure]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_profile(statement: str, env: dict):
+    """Run a statement under -X importtime; returns (wall seconds, [(cumulative_us, module)])."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.append((int(cumulative_us), name.rstrip()))
+    return wall, modules
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(url: str, body: dict = None, timeout: float = 120):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status, json.loads(response.read() or b"null")
+
+
+def time_to_first_request(env: dict, timeout: float = 60):
+    """Seconds from spawning uvicorn to the first /health 200 and the first answered /query."""
+    port = _free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL
+    )
+    try:
+        health = None
+        while time.perf_counter() - started < timeout:
+            try:
+                status, body = _request(f"{base}/health", timeout=1)
+                if status == 200:
+                    health = time.perf_counter() - started
+                    startup = body.get("startup", {})
+                    break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.02)
+        if health is None:
+            raise RuntimeError("Server never answered /health")
+
+        _request(f"{base}/query", {"query": "What SD-WAN options suit a 40-site retailer?"})
+        first_query = time.perf_counter() - started
+        return {"health_seconds": health, "first_query_seconds": first_query, "startup": startup}
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--target-ms", type=float, default=1500, help="fail when median time to /health exceeds this")
+    parser.add_argument("--startup-mode", choices=["background", "eager"], default="background")
+    parser.add_argument("--backend", choices=["fake", "azure"], default="fake")
+    args = parser.parse_args()
+
+    env = dict(os.environ, AGENT_BACKEND=args.backend, STARTUP_MODE=args.startup_mode, PYTHONDONTWRITEBYTECODE="1")
+
+    wall, modules = import_profile("import app", env)
+    print(f"import app: {wall * 1000:.0f} ms wall (interpreter included)")
+    print("=" * 60)
+    for cumulative_us, name in sorted(modules, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:9.1f} ms  {name}")
+
+    try:
+        sdk_wall, sdk_modules = import_profile("import azure.ai.projects.aio, azure.identity.aio", env)
+        top_level = [m for m in sdk_modules if not m[1].startswith(" ")]
+        print(f"\nDeferred Azure SDK imports: {sum(us for us, _ in top_level) / 1000:.0f} ms (done during warm-up)")
+    except RuntimeError as e:
+        print(f"\nAzure SDK not importable here: {e}")
+
+    runs = [time_to_first_request(env) for _ in range(args.runs)]
+    health_ms = statistics.median(run["health_seconds"] for run in runs) * 1000
+    query_ms = statistics.median(run["first_query_seconds"] for run in runs) * 1000
+    print(f"\nTime to first request ({args.startup_mode} startup, {args.backend} backend, median of {args.runs})")
+    print("=" * 60)
+    print(f"/health 200       {health_ms:8.0f} ms   (target {args.target_ms:.0f} ms)")
+    print(f"first /query      {query_ms:8.0f} ms")
+
+    if health_ms > args.target_ms:
+        print("FAILED: time to first /health exceeds target")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
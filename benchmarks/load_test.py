@@ -0,0 +1,288 @@
+"""
+Load test for the support API or the agent itself against the fake agents backend.
+
+Drives /query, /technical-support and /partner-scaling (or the matching
+AsyncMagenticOneAgent methods with --target agent) at a fixed concurrency and
+reports latency percentiles, throughput, errors and memory. Results are saved
+as JSON; pass --baseline with an earlier result to fail on regressions.
+
+The API server is started with AGENT_BACKEND=fake unless --url points at a
+running instance. Fake service latency is controlled by the FAKE_AGENTS_*
+environment variables, which are passed through to the server.
+
+Usage:
+    python benchmarks/load_test.py [--target http|agent] [--concurrency 32]
+        [--requests 500] [--workers 1] [--url http://127.0.0.1:8000]
+        [--output benchmarks/results/load.json] [--baseline previous.json]
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PAYLOADS = [
+    ("query", "/query", {"query": "What cloud solutions do you recommend for a growing SMB?",
+                         "partner_info": {"partner_name": "Acme", "partner_tier": "Gold"}}),
+    ("technical", "/technical-support", {"technical_issue": "Intermittent SD-WAN packet loss", "urgency": "high"}),
+    ("scaling", "/partner-scaling", {"partner_profile": {"partner_name": "TechSolutions Inc", "partner_tier": "Gold",
+                                                         "focus_area": "Cloud Infrastructure", "region": "North America"}})
+]
+
+
+def percentile(values: list, fraction: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _rss_kb(pid: int):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _process_tree(pid: int):
+    pids = [pid]
+    for known in pids:
+        for task in os.listdir(f"/proc/{known}/task") if os.path.isdir(f"/proc/{known}/task") else []:
+            try:
+                with open(f"/proc/{known}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+            except OSError:
+                pass
+    return pids
+
+
+async def _post(host: str, port: int, path: str, body: dict, bypass_cache: bool):
+    """Minimal HTTP/1.1 POST returning (status, elapsed seconds)."""
+    payload = json.dumps(body).encode("utf-8")
+    headers = [
+        f"POST {path} HTTP/1.1",
+        f"Host: {host}:{port}",
+        "Content-Type: application/json",
+        f"Content-Length: {len(payload)}",
+        "Connection: close"
+    ]
+    if bypass_cache:
+        headers.append("X-Cache-Bypass: 1")
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + payload)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1]), time.perf_counter() - started
+
+
+async def _drive(call, total: int, concurrency: int):
+    """Run `total` calls with at most `concurrency` in flight, returning per-call records."""
+    counter = itertools.count()
+    records = []
+
+    async def worker():
+        while True:
+            index = next(counter)
+            if index >= total:
+                return
+            kind = PAYLOADS[index % len(PAYLOADS)][0]
+            started = time.perf_counter()
+            try:
+                ok, elapsed = await call(index)
+            except Exception:
+                ok, elapsed = False, time.perf_counter() - started
+            records.append({"kind": kind, "ok": ok, "latency": elapsed})
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return records
+
+
+def _wait_for_port(host: str, port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Server did not start on {host}:{port}")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def run_http(args):
+    server = None
+    if args.url:
+        parsed = urllib.parse.urlparse(args.url)
+        host, port = parsed.hostname, parsed.port or 80
+    else:
+        host, port = "127.0.0.1", _free_port()
+        env = dict(os.environ, AGENT_BACKEND="fake")
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--host", host, "--port", str(port),
+             "--workers", str(args.workers), "--log-level", "warning"],
+            cwd=ROOT, env=env
+        )
+        _wait_for_port(host, port)
+
+    async def call(index):
+        _, path, body = PAYLOADS[index % len(PAYLOADS)]
+        status, elapsed = await _post(host, port, path, body, args.bypass_cache)
+        return status == 200, elapsed
+
+    try:
+        await _drive(call, min(args.warmup, args.requests), args.concurrency)
+        started = time.perf_counter()
+        records = await _drive(call, args.requests, args.concurrency)
+        wall = time.perf_counter() - started
+        memory = {}
+        if server is not None:
+            memory = {str(pid): _rss_kb(pid) for pid in _process_tree(server.pid)}
+        return records, wall, memory
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+
+async def run_agent(args):
+    os.environ["AGENT_BACKEND"] = "fake"
+    from magentic_one_agent import AsyncMagenticOneAgent
+    from services.agent_pool import AsyncAgentPool
+
+    pool = AsyncAgentPool(AsyncMagenticOneAgent, size=args.concurrency)
+    await pool.start()
+
+    async def call(index):
+        kind, _, body = PAYLOADS[index % len(PAYLOADS)]
+        use_cache = not args.bypass_cache
+        started = time.perf_counter()
+        async with pool.lease() as agent:
+            if kind == "technical":
+                await agent.handle_technical_support(body["technical_issue"], body["urgency"], use_cache=use_cache)
+            elif kind == "scaling":
+                await agent.get_partner_scaling_recommendations(body["partner_profile"], use_cache=use_cache)
+            else:
+                await agent.handle_customer_query(body["query"], body["partner_info"], use_cache=use_cache)
+        return True, time.perf_counter() - started
+
+    try:
+        await _drive(call, min(args.warmup, args.requests), args.concurrency)
+        started = time.perf_counter()
+        records = await _drive(call, args.requests, args.concurrency)
+        wall = time.perf_counter() - started
+    finally:
+        await pool.close()
+    return records, wall, {str(os.getpid()): resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+
+def summarize(records: list, wall: float, memory: dict, args):
+    def stats(subset):
+        latencies = [r["latency"] * 1000 for r in subset]
+        return {
+            "count": len(subset),
+            "errors": sum(1 for r in subset if not r["ok"]),
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "mean_ms": statistics.fmean(latencies) if latencies else None
+        }
+
+    return {
+        "target": args.target,
+        "concurrency": args.concurrency,
+        "workers": args.workers,
+        "requests": len(records),
+        "wall_seconds": wall,
+        "throughput_rps": len(records) / wall if wall else None,
+        "overall": stats(records),
+        "by_endpoint": {kind: stats([r for r in records if r["kind"] == kind]) for kind, _, _ in PAYLOADS},
+        "memory_rss_kb": memory,
+        "fake_agents": {key: value for key, value in os.environ.items() if key.startswith("FAKE_AGENTS_")},
+        "timestamp": time.time()
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float):
+    """Regressions beyond tolerance in p95 latency or throughput."""
+    regressions = []
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        old, new = baseline["overall"].get(key), result["overall"].get(key)
+        if old and new and new > old * (1 + tolerance):
+            regressions.append(f"{key}: {old:.1f} -> {new:.1f}")
+    old, new = baseline.get("throughput_rps"), result.get("throughput_rps")
+    if old and new and new < old * (1 - tolerance):
+        regressions.append(f"throughput_rps: {old:.1f} -> {new:.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["http", "agent"], default="http")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when the server is started here")
+    parser.add_argument("--url", help="benchmark an already running server instead of starting one")
+    parser.add_argument("--bypass-cache", action="store_true", help="skip the response cache on every request")
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results", f"load_{int(time.time())}.json"))
+    parser.add_argument("--baseline", help="earlier result JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression fraction")
+    args = parser.parse_args()
+
+    runner = run_http if args.target == "http" else run_agent
+    records, wall, memory = asyncio.run(runner(args))
+    result = summarize(records, wall, memory, args)
+
+    overall = result["overall"]
+    print(f"{args.target} load test: {result['requests']} requests, concurrency {args.concurrency}")
+    print("=" * 60)
+    print(f"throughput       {result['throughput_rps']:8.1f} req/s")
+    print(f"latency p50/p95/p99 {overall['p50_ms']:.1f} / {overall['p95_ms']:.1f} / {overall['p99_ms']:.1f} ms")
+    print(f"errors           {overall['errors']}")
+    for kind, endpoint in result["by_endpoint"].items():
+        print(f"  {kind:<10} p95 {endpoint['p95_ms'] or 0:8.1f} ms  errors {endpoint['errors']}")
+    for pid, rss in memory.items():
+        print(f"rss pid {pid:<8} {rss / 1024:8.1f} MiB")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
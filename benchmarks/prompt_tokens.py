@@ -0,0 +1,71 @@
+"""
+Prompt token report.
+
+Estimates the input tokens of the agent instructions and of each message
+template with and without prompt compaction (PROMPT_COMPACTION), using
+tiktoken when installed and a four-characters-per-token estimate otherwise.
+The instructions are billed on every run, so their savings apply to every
+request.
+
+Usage:
+    python benchmarks/prompt_tokens.py [--output report.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.lumen_branding import LumenBrandConfig
+from magentic_one_agent import BaseMagenticOneAgent
+from services.token_budget import estimate_tokens, tiktoken
+from templates.compaction import PromptCompactor, compact_whitespace
+from templates.engine import TemplateRegistry
+from templates.support_templates import TEMPLATE_DIRECTORY, TEMPLATE_FIELDS
+
+
+class _Prompts(BaseMagenticOneAgent):
+    """Just the prompt construction of the agent, without a client."""
+
+    def __init__(self):
+        self.brand_config = LumenBrandConfig()
+
+
+def build_report():
+    os.environ["PROMPT_COMPACTION"] = "false"
+    instructions = _Prompts()._build_instructions()
+    before, after = estimate_tokens(instructions), estimate_tokens(compact_whitespace(instructions))
+    report = {
+        "instructions": {
+            "tokens_before": before,
+            "tokens_after": after,
+            "tokens_saved": before - after,
+            "saved_percent": round(100 * (before - after) / before, 1)
+        }
+    }
+    compacted = TemplateRegistry(TEMPLATE_DIRECTORY, TEMPLATE_FIELDS, compactor=PromptCompactor(instructions))
+    report.update(compacted.compaction_report())
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="also write the report as JSON")
+    args = parser.parse_args()
+
+    report = build_report()
+    print(f"Prompt tokens ({'tiktoken cl100k_base' if tiktoken is not None else 'chars/4 estimate'})")
+    print("=" * 60)
+    print(f"{'prompt':<18}{'before':>8}{'after':>8}{'saved':>8}{'%':>8}")
+    for name, row in report.items():
+        print(f"{name:<18}{row['tokens_before']:>8}{row['tokens_after']:>8}{row['tokens_saved']:>8}{row['saved_percent']:>8}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Serialization and compression benchmark for agent answers.
+
+Builds branded partner-scaling answers of a few typical lengths and compares
+the response path FastAPI takes for a returned AgentResponse (model
+validation, then the standard JSON encoder) with the pre-serialized path in
+app.py (services.payloads.encode_json, orjson when installed). For each
+answer it also reports the bytes on the wire and the time to compress them
+with gzip and, when the brotli package is installed, brotli.
+
+Usage:
+    python benchmarks/response_encoding.py [--iterations 20000] [--output report.json]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.lumen_branding import get_brand_config
+from services.payloads import ResponseEncoder, brotli, encode_json, orjson
+
+try:
+    from pydantic import BaseModel
+except ImportError:  # pragma: no cover - optional dependency
+    BaseModel = None
+
+SECTION = """## {number}. {title}
+
+**Current state:** TechSolutions Inc (Gold, North America) resells Lumen connectivity to mid-market customers \
+and has {customers} active accounts in Cloud Infrastructure.
+
+**Recommendation:**
+- Add Lumen SD-WAN and Secure Access Service Edge bundles to the existing connectivity offers
+- Qualify two pre-sales engineers on the Lumen Edge and network-as-a-service portfolio this quarter
+- Use co-op marketing funds for a joint webinar series targeting multi-site retail and healthcare
+- Track pipeline in the partner portal and review win rates with the channel manager monthly
+
+**Expected impact:** {impact}% revenue growth over 12 months, with shorter sales cycles on bundled deals.
+"""
+
+TITLES = ["Portfolio Expansion", "Technical Enablement", "Go-to-Market", "Customer Success",
+          "Operational Scaling", "Partner Tier Progression", "Regional Growth", "Managed Services"]
+
+def scaling_answer(sections: int):
+    """A branded scaling consultation answer with the given number of sections."""
+    prefix, suffix = get_brand_config().get_response_wrappers()
+    body = "# Partner Scaling Recommendations\n\n" + "\n".join(
+        SECTION.format(number=number + 1, title=TITLES[number % len(TITLES)], customers=40 + 15 * number, impact=10 + 5 * number)
+        for number in range(sections)
+    )
+    return prefix + body + suffix
+
+if BaseModel is not None:
+    class _AgentResponse(BaseModel):
+        response: str
+        status: str = "success"
+
+def fastapi_default(response: str):
+    """
+    What FastAPI does for `return AgentResponse(response=...)`: dump the
+    model, validate it against response_model, dump again, then render with
+    JSONResponse's json.dumps.
+    """
+    if BaseModel is not None:
+        content = _AgentResponse.model_validate(_AgentResponse(response=response).model_dump()).model_dump(mode="json")
+    else:
+        content = {"response": response, "status": "success"}
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def per_call_us(call, iterations: int):
+    return min(timeit.repeat(call, number=iterations, repeat=3)) / iterations * 1e6
+
+def build_report(iterations: int):
+    encoder = ResponseEncoder(min_bytes=0, enabled=True)
+    encodings = ["gzip"] + (["br"] if brotli is not None else [])
+    report = {
+        "json_encoder": "orjson" if orjson is not None else "json",
+        "model_validation": BaseModel is not None,
+        "answers": []
+    }
+    for sections in (2, 4, 8):
+        response = scaling_answer(sections)
+        body = encode_json({"response": response, "status": "success"})
+        row = {
+            "sections": sections,
+            "identity_bytes": len(body),
+            "default_us": round(per_call_us(lambda: fastapi_default(response), iterations), 2),
+            "pre_serialized_us": round(per_call_us(lambda: encode_json({"response": response, "status": "success"}), iterations), 2)
+        }
+        for encoding in encodings:
+            row[f"{encoding}_bytes"] = len(encoder.compress(body, encoding))
+            row[f"{encoding}_us"] = round(per_call_us(lambda: encoder.compress(body, encoding), max(1, iterations // 10)), 2)
+        report["answers"].append(row)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--output", help="Also write the report as JSON to this path")
+    args = parser.parse_args()
+
+    report = build_report(args.iterations)
+    validation = "with" if report["model_validation"] else "without (pydantic not installed)"
+    print(f"Answer serialization: default path {validation} model validation vs {report['json_encoder']}")
+    print("=" * 78)
+    print(f"{'sections':>8} {'bytes':>7} {'default us':>11} {'pre-ser. us':>12} {'gzip bytes':>11} {'gzip us':>8} {'br bytes':>9} {'br us':>7}")
+    for row in report["answers"]:
+        print(f"{row['sections']:>8} {row['identity_bytes']:>7} {row['default_us']:>11} {row['pre_serialized_us']:>12} "
+              f"{row['gzip_bytes']:>11} {row['gzip_us']:>8} {row.get('br_bytes', '-'):>9} {row.get('br_us', '-'):>7}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Micro-benchmark for CustomerSupportTemplates rendering.
+
+Compares the precompiled templates against formatting the raw template text
+and stripping it on every call, which is what the original f-string methods did.
+
+Usage:
+    python benchmarks/template_render.py [--iterations 100000]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from templates.support_templates import CustomerSupportTemplates, TEMPLATE_DIRECTORY
+
+PARTNER_PROFILE = {
+    "partner_name": "TechSolutions Inc",
+    "partner_tier": "Gold",
+    "focus_area": "Cloud Infrastructure",
+    "region": "North America"
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100000)
+    args = parser.parse_args()
+
+    templates = CustomerSupportTemplates()
+    with open(os.path.join(TEMPLATE_DIRECTORY, "scaling.txt")) as f:
+        raw_scaling = "\n" + f.read() + "        "
+
+    cases = {
+        "scaling (per-call format + strip)": lambda: raw_scaling.format(**PARTNER_PROFILE).strip(),
+        "scaling (precompiled)": lambda: templates.get_scaling_template(PARTNER_PROFILE),
+        "technical (precompiled)": lambda: templates.get_technical_template("SD-WAN packet loss", "critical"),
+        "product inquiry (precompiled)": lambda: templates.get_product_inquiry_template("Cloud", "Backup"),
+        "onboarding (precompiled)": lambda: templates.get_onboarding_template("MSP", "Managed Services")
+    }
+
+    print(f"Template render cost over {args.iterations} calls")
+    print("=" * 60)
+    for label, render in cases.items():
+        seconds = min(timeit.repeat(render, number=args.iterations, repeat=3))
+        print(f"{label:<36} {seconds / args.iterations * 1e6:8.2f} us/call")
+
+if __name__ == "__main__":
+    main()
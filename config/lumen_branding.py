@@ -1,5 +1,10 @@
 class LumenBrandConfig:
-    """Lumen brand configuration and theming for the Magentic-One Agent."""
+    """
+    Lumen brand configuration and theming for the Magentic-One Agent.
+    
+    The brand is static once configured: header, footer and CSS strings are
+    built on first use and reused for every response.
+    """
     
     def __init__(self):
         self.primary_color = "#3b82f6"
@@ -15,6 +20,8 @@ class LumenBrandConfig:
         self.logo_text = "LUMEN"
         self.tagline = "Enabling amazing things"
         
+        self._rendered = {}
+        
     def get_color_scheme(self):
         """Get the complete Lumen color scheme."""
         return {
@@ -35,8 +42,17 @@ class LumenBrandConfig:
             "tagline": self.tagline
         }
     
+    def _memoized(self, name: str, build):
+        value = self._rendered.get(name)
+        if value is None:
+            value = self._rendered[name] = build()
+        return value
+    
     def get_header(self):
         """Get branded header for agent responses."""
+        return self._memoized("header", self._build_header)
+    
+    def _build_header(self):
         return f"""
 ╔══════════════════════════════════════════════════════════════╗
 ║  {self.logo_text} - {self.tagline}                                    ║
@@ -46,6 +62,9 @@ class LumenBrandConfig:
     
     def get_footer(self):
         """Get branded footer for agent responses."""
+        return self._memoized("footer", self._build_footer)
+    
+    def _build_footer(self):
         return f"""
 ────────────────────────────────────────────────────────────────
 {self.company_name} | Empowering Digital Transformation
@@ -54,6 +73,9 @@ For additional support: Contact your dedicated partner manager
     
     def get_css_variables(self):
         """Get CSS variables for web interfaces."""
+        return self._memoized("css_variables", self._build_css_variables)
+    
+    def _build_css_variables(self):
         return f"""
 :root {{
     --lumen-primary: {self.primary_color};
@@ -64,6 +86,10 @@ For additional support: Contact your dedicated partner manager
 }}
         """.strip()
     
+    def get_response_wrappers(self):
+        """(prefix, suffix) placed around every answer: the header and footer with their spacing."""
+        return self._memoized("wrappers", lambda: (f"{self.get_header()}\n\n", f"\n\n{self.get_footer()}"))
+    
     def get_styled_message(self, message: str, message_type: str = "info"):
         """Get a styled message with Lumen branding."""
         colors = {
@@ -80,3 +106,14 @@ For additional support: Contact your dedicated partner manager
 │ {message}
 └─────────────────────────────────────────────────────────────
         """.strip()
+
+
+_shared = None
+
+
+def get_brand_config():
+    """Brand configuration shared by every agent in the process."""
+    global _shared
+    if _shared is None:
+        _shared = LumenBrandConfig()
+    return _shared
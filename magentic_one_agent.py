@@ -1,40 +1,152 @@
 import time
 import json
+import math
 import os
-from azure.ai.projects import AIProjectClient
-from azure.ai.agents import AgentClient
-from azure.ai.agents.models import MessageTextContent, ListSortOrder
-from azure.identity import DefaultAzureCredential
-from config.lumen_branding import LumenBrandConfig
+import asyncio
+from config.lumen_branding import get_brand_config
 from templates.support_templates import CustomerSupportTemplates
+from templates.compaction import compact_whitespace, compaction_enabled
+from services.agent_registry import AgentRegistry, AsyncAgentRegistry
+from services.run_polling import RunPoller, is_terminal
+from services.response_cache import get_response_cache
+from services.batch import run_batch, run_batch_async
+from services.coalescing import coalescing_key, get_coalescer, get_async_coalescer
+from services.token_budget import (
+    RateLimitExceeded, estimate_tokens, get_token_budget, is_rate_limited, rate_limit_retries,
+    retry_after_hint, retry_delay
+)
+from services.metrics import stage, stage_seconds, run_status, cache_lookups
+from services.credentials import get_credential, get_async_credential
+from services.state import get_shared_store
+from services.context_window import get_context_window
+from services.run_resilience import classify_run, get_run_resilience, run_hedges, run_retries
+from services.circuit_breaker import degraded_responses, get_circuit_breaker
 
-class MagenticOneAgent:
+AGENT_NAME = "lumen-customer-support-agent"
+
+# Plain-string values of AgentStreamEvent and ListSortOrder (both str enums), so
+# the Azure SDK is only imported once a real project client is created.
+MESSAGE_DELTA_EVENT = "thread.message.delta"
+STREAM_FAILURE_EVENTS = ("thread.run.failed", "error")
+NEWEST_FIRST = "desc"
+
+PARTNER_CONTEXT_FIELDS = (
+    ("partner_name", "Partner"),
+    ("partner_tier", "Tier"),
+    ("focus_area", "Focus Area"),
+    ("region", "Region")
+)
+
+FALLBACK_RESPONSE = "I apologize, but I encountered an issue processing your request. Please try again or contact our support team for assistance."
+# Run outcomes that count against the backend's circuit breaker.
+BACKEND_FAILURE_OUTCOMES = ("failed", "transient", "timeout")
+TIMEOUT_RESPONSE = "I apologize, but your request is taking longer than expected and was stopped. Please try again or contact our support team for assistance."
+
+class RunFailed(RuntimeError):
     """
-    Lumen-customized Magentic-One Agent for customer support and channel partner scaling.
-    Configured for oneshot mode without MCP Tools or A2A capabilities.
+    The backend produced no answer; the apology or canned reply in `response`
+    was all the agent could return. retry_after is set, in whole seconds,
+    when the backend's circuit is open and a later attempt may succeed.
+    """
+    
+    def __init__(self, message: str, outcome: str, response: str, retry_after: int = None):
+        super().__init__(message)
+        self.outcome = outcome
+        self.response = response
+        self.retry_after = retry_after
+
+def preload_sdk():
     """
+    Import the Azure SDK modules the real backend uses.
     
-    def __init__(self):
-        self.brand_config = LumenBrandConfig()
-        self.support_templates = CustomerSupportTemplates()
+    They are otherwise imported when the first project client is created; the
+    API calls this from a worker thread during warm-up so the slow imports do
+    not block the event loop.
+    """
+    if os.environ.get("AGENT_BACKEND", "azure").lower() == "fake":
+        return
+    import azure.ai.projects.aio  # noqa: F401
+    import azure.identity.aio  # noqa: F401
+
+class BaseMagenticOneAgent:
+    """
+    Configuration and prompt construction shared by the sync and async agents.
+    Subclasses provide the Azure client and the remote agent calls.
+    """
+    
+    def __init__(self, project_client=None, agent=None):
+        self.brand_config = get_brand_config()
+        # Template lines that repeat the agent instructions are dropped from
+        # each message; the agent already has them.
+        self.support_templates = CustomerSupportTemplates(reference=self._build_instructions())
         self.project_endpoint = os.environ.get("PROJECT_ENDPOINT")
         self.model_deployment_name = os.environ.get("MODEL_DEPLOYMENT_NAME", "gpt-4")
         
-        if not self.project_endpoint:
+        # "azure" talks to the project endpoint; "fake" uses the in-process
+        # agents service from backends.fake_agents for local runs and load tests.
+        self.backend = os.environ.get("AGENT_BACKEND", "azure").lower()
+        
+        if not self.project_endpoint and project_client is None and self.backend != "fake":
             raise ValueError("PROJECT_ENDPOINT environment variable is required")
         
-        self.project_client = AIProjectClient(
-            endpoint=self.project_endpoint,
-            credential=DefaultAzureCredential()
-        )
+        # A shared project client (e.g. from AgentPool) is owned by the caller
+        # and must not be closed by this instance.
+        self._owns_client = project_client is None
+        if project_client is None:
+            with stage("client_create"):
+                project_client = self._create_project_client()
         
+        self.project_client = project_client
         self.agent_client = self.project_client.agents
-        self.agent = None
+        self.agent = agent
         self.thread = None
+        # Callable supplying the thread when a run first needs one (e.g. the
+        # API's session manager); None creates a thread owned by this agent.
+        self.thread_source = None
         
-    def initialize_agent(self):
-        """Initialize the Lumen customer support agent with oneshot configuration."""
+        # "poll" waits with the adaptive RunPoller; "stream" completes on run events.
+        self.completion_mode = os.environ.get("RUN_COMPLETION_MODE", "poll").lower()
+        self.run_poller = RunPoller()
+        self.last_poll_stats = None
+        
+        # "first_text" returns the first text part of the run's message; "all_text" joins every part.
+        self.response_retrieval = os.environ.get("RESPONSE_RETRIEVAL_MODE", "first_text").lower()
+        
+        self.response_cache = get_response_cache()
+        self.last_cache_status = None
+        
+        # Shared TPM/RPM budget (None when no quota is configured) and retries
+        # for runs the service throttles.
+        self.token_budget = get_token_budget()
+        self.expected_completion_tokens = int(os.environ.get("TOKEN_BUDGET_COMPLETION_TOKENS", "800"))
+        self.rate_limit_retries = int(os.environ.get("RATE_LIMIT_MAX_RETRIES", "3"))
+        self.rate_limit_max_wait = float(os.environ.get("RATE_LIMIT_MAX_WAIT", "60"))
+        self._instruction_tokens = None
         
+        # Keeps long session threads from growing every run's prompt (CONTEXT_STRATEGY).
+        self.context_window = get_context_window()
+        
+        # Per-endpoint deadlines, retries of transient failures and hedged runs.
+        self.run_resilience = get_run_resilience()
+        self.last_run_outcome = None
+        self._hedge_threads = []
+        self._hedge_reservations = {}
+        
+        # Fails fast, with a stale cached or canned answer, while the backend is unhealthy.
+        self.circuit_breaker = get_circuit_breaker()
+    
+    def _create_project_client(self):
+        """Create the Azure AI project client owned by this agent."""
+        raise NotImplementedError
+    
+    def _registry_path(self):
+        """Agent registry cache file; fake agent IDs are kept apart from real ones."""
+        if self.backend == "fake":
+            return os.environ.get("FAKE_AGENT_REGISTRY_PATH", ".agent_registry.fake.json")
+        return None
+    
+    def _build_instructions(self):
+        """Build the oneshot customer support instructions for the remote agent."""
         instructions = f"""
         You are a specialized customer support agent for Lumen, a leading technology company.
         
@@ -74,112 +186,1121 @@ class MagenticOneAgent:
         
         Remember: You represent Lumen's commitment to partner success and technological excellence.
         """
+        return compact_whitespace(instructions) if compaction_enabled() else instructions
+    
+    def _enhance_query_with_context(self, query: str, partner_info: dict = None):
+        """Enhance the query with partner context and Lumen-specific information."""
+        context_parts = [f"Customer Query: {query}"]
+        
+        # Blank or whitespace-only fields add tokens without context, and the
+        # heading is only sent when at least one field is left.
+        partner_lines = []
+        for field, label in PARTNER_CONTEXT_FIELDS:
+            value = str((partner_info or {}).get(field) or "").strip()
+            if value:
+                partner_lines.append(f"- {label}: {value}")
+        if partner_lines:
+            context_parts.append("Partner Context:")
+            context_parts.extend(partner_lines)
         
-        self.agent = self.agent_client.create_agent(
+        context_parts.append("\nPlease provide a comprehensive response that addresses the query while considering Lumen's technology offerings and the partner's scaling needs.")
+        
+        return "\n".join(context_parts)
+    
+    def _format_response(self, response_text: str):
+        """Format the response with Lumen branding and structure."""
+        prefix, suffix = self.brand_config.get_response_wrappers()
+        return prefix + response_text + suffix
+    
+    def _cache_scope(self, partner_info: dict = None):
+        """Cached answers are only shared between partners of the same tier."""
+        tier = (partner_info or {}).get("partner_tier") or "default"
+        return str(tier).lower()
+    
+    def _cached_response(self, enhanced_query: str, partner_info: dict = None, use_cache: bool = True):
+        """Look up a cached answer for the enhanced query, recording the outcome."""
+        if self.response_cache is None or not use_cache:
+            self.last_cache_status = "bypass"
+            cache_lookups.inc(result="bypass")
+            return None
+        with stage("cache_lookup"):
+            response, self.last_cache_status = self.response_cache.lookup(
+                enhanced_query, self._cache_scope(partner_info)
+            )
+        cache_lookups.inc(result=self.last_cache_status)
+        return response
+    
+    def _store_response(self, enhanced_query: str, partner_info: dict, response: str):
+        if self.response_cache is not None:
+            self.response_cache.put(enhanced_query, response, self._cache_scope(partner_info))
+    
+    def _extract_response_text(self, message):
+        """Text of a single assistant message according to the retrieval mode."""
+        text_parts = [
+            content_item.text.value for content_item in message.content
+            if getattr(content_item, "type", None) == "text"
+        ]
+        if not text_parts:
+            return None
+        if self.response_retrieval == "all_text":
+            return "\n\n".join(text_parts)
+        return text_parts[0]
+    
+    def _dispatch_batch_item(self, item: dict):
+        """Route one batch item to the matching handler (awaitable on the async agent)."""
+        if item["type"] == "technical":
+            return self.handle_technical_support(item["technical_issue"], item.get("urgency") or "medium")
+        if item["type"] == "scaling":
+            return self.get_partner_scaling_recommendations(item["partner_profile"])
+        return self.handle_customer_query(item["query"], item.get("partner_info"))
+    
+    def _stream_header(self):
+        """Branded header chunk emitted before any streamed answer text."""
+        return self.brand_config.get_response_wrappers()[0]
+    
+    def _stream_footer(self):
+        """Branded footer chunk emitted after the streamed answer text."""
+        return self.brand_config.get_response_wrappers()[1]
+    
+    def _estimate_run_tokens(self, prompt: str):
+        """Tokens a run is expected to use: instructions and prompt plus a typical answer."""
+        if self._instruction_tokens is None:
+            self._instruction_tokens = estimate_tokens(self._build_instructions())
+        return self._instruction_tokens + estimate_tokens(prompt) + self.expected_completion_tokens
+    
+    @staticmethod
+    def _run_tokens(run):
+        """Total tokens the run reported using, or None."""
+        return getattr(getattr(run, "usage", None), "total_tokens", None)
+    
+    def _settle_budget(self, reservation: str, run):
+        """Replace the reserved estimate with the run's reported usage."""
+        total_tokens = self._run_tokens(run)
+        if reservation is not None and total_tokens:
+            self.token_budget.settle(reservation, total_tokens)
+    
+    def _throttle_delay(self, outcome, attempt: int):
+        """Seconds to wait before retrying a throttled run, or raise once retries are used up."""
+        if attempt >= self.rate_limit_retries:
+            hint = retry_after_hint(outcome) or 1
+            raise RateLimitExceeded("Model deployment rate limit exceeded", max(1, math.ceil(hint)))
+        rate_limit_retries.inc()
+        return retry_delay(outcome, attempt, self.rate_limit_max_wait)
+    
+    @staticmethod
+    def _record_run(run):
+        """Count the run's terminal status for /metrics."""
+        status = getattr(run, "status", None) if run is not None else "none"
+        run_status.inc(status=getattr(status, "value", status))
+    
+    @staticmethod
+    def _is_run_event(event_type):
+        """Whether a stream event carries the run object itself."""
+        return str(getattr(event_type, "value", event_type)).startswith("thread.run.")
+    
+    def _run_response(self, response_text: str, enhanced_query: str, partner_info: dict = None):
+        """Formatted answer for the last run's outcome; only complete answers are cached."""
+        if self.last_run_outcome in ("completed", "incomplete") and response_text is not None:
+            response = self._format_response(response_text)
+            if self.last_run_outcome == "completed":
+                self._store_response(enhanced_query, partner_info, response)
+            return response
+        return TIMEOUT_RESPONSE if self.last_run_outcome == "timeout" else FALLBACK_RESPONSE
+    
+    def _require_answer(self, response: str):
+        """
+        Return the response, or raise RunFailed when it is the apology for a run
+        that failed or timed out, or the degraded reply sent while the backend
+        circuit is open. Apologies are recognized by their text, since
+        last_run_outcome is unset when another request's run was shared; a
+        degraded reply carries retry_after so jobs are retried once the
+        circuit lets calls through again.
+        """
+        if self.last_run_outcome == "circuit_open":
+            retry_after = max(1, math.ceil(self.circuit_breaker.retry_after()))
+            raise RunFailed("Agent backend unavailable (circuit_open)", "circuit_open", response, retry_after)
+        if response in (FALLBACK_RESPONSE, TIMEOUT_RESPONSE):
+            outcome = self.last_run_outcome or ("timeout" if response == TIMEOUT_RESPONSE else "failed")
+            raise RunFailed(f"Agent run did not produce an answer ({outcome})", outcome, response)
+        return response
+    
+    def _degraded_message(self, prompt: str, endpoint: str = "query", urgency: str = "medium"):
+        """Branded canned guidance for the request's template category."""
+        degraded_responses.inc(source="canned")
+        message = self.support_templates.get_degraded_message(endpoint, prompt, urgency)
+        return self.brand_config.get_styled_message(message, "warning")
+    
+    def _degraded_response(self, enhanced_query: str, partner_info: dict = None, urgency: str = "medium",
+                           endpoint: str = "query"):
+        """Answer without the backend: the last cached answer, even if expired, else a canned one."""
+        self.last_run_outcome = "circuit_open"
+        if self.response_cache is not None:
+            response = self.response_cache.lookup_stale(enhanced_query, self._cache_scope(partner_info))
+            if response is not None:
+                self.last_cache_status = "stale"
+                degraded_responses.inc(source="stale")
+                return response
+        return self._format_response(self._degraded_message(enhanced_query, endpoint, urgency))
+    
+    def _degraded_events(self, prompt: str, endpoint: str = "query"):
+        """Streamed (event, text) pairs of the canned answer."""
+        self.last_run_outcome = "circuit_open"
+        return [
+            ("header", self._stream_header()),
+            ("delta", self._degraded_message(prompt, endpoint)),
+            ("footer", self._stream_footer())
+        ]
+    
+    def _record_hedge(self, winner, others: list, primary_id: str):
+        """Count a hedged run as won when it answered first, lost when it was overtaken or abandoned."""
+        if not others:
+            return
+        hedge_won = winner.id != primary_id and classify_run(winner) == "completed"
+        run_hedges.inc(result="won" if hedge_won else "lost")
+    
+    def reset_session(self):
+        """Forget the current support session so the next query starts a new thread."""
+        self.thread = None
+        self.thread_source = None
+
+class MagenticOneAgent(BaseMagenticOneAgent):
+    """
+    Lumen-customized Magentic-One Agent for customer support and channel partner scaling.
+    Configured for oneshot mode without MCP Tools or A2A capabilities.
+    """
+    
+    def __init__(self, project_client=None, agent=None):
+        super().__init__(project_client, agent)
+        self.agent_registry = AgentRegistry(self.agent_client, self._registry_path(), get_shared_store())
+        self.coalescer = get_coalescer()
+    
+    def _create_project_client(self):
+        if self.backend == "fake":
+            from backends.fake_agents import FakeProjectClient
+            return FakeProjectClient()
+        from azure.ai.projects import AIProjectClient
+        return AIProjectClient(
+            endpoint=self.project_endpoint,
+            credential=get_credential()
+        )
+    
+    def initialize_agent(self):
+        """Initialize the Lumen customer support agent with oneshot configuration."""
+        self.agent = self.agent_registry.get_or_create(
             model=self.model_deployment_name,
-            name="lumen-customer-support-agent",
-            instructions=instructions,
-            tools=[],
-            tool_resources=None
+            name=AGENT_NAME,
+            instructions=self._build_instructions(),
+            tools=[]
         )
         
-        print(f"Created Lumen customer support agent with ID: {self.agent.id}")
+        print(f"Using Lumen customer support agent with ID: {self.agent.id}")
         return self.agent
     
     def create_support_session(self):
-        """Create a new customer support session thread."""
-        self.thread = self.agent_client.threads.create()
+        """Create a new customer support session thread, or take it from thread_source."""
+        if self.thread_source is not None:
+            self.thread = self.thread_source()
+            return self.thread
+        with stage("thread_create"):
+            self.thread = self.agent_client.threads.create()
         print(f"Created support session thread with ID: {self.thread.id}")
         return self.thread
     
-    def handle_customer_query(self, query: str, partner_info: dict = None):
+    def close_support_session(self):
+        """Delete the session thread this agent created, for one-off work that keeps no history."""
+        thread, self.thread = self.thread, None
+        if thread is None:
+            return
+        self.context_window.forget(thread.id)
+        try:
+            self.agent_client.threads.delete(thread.id)
+        except Exception as e:
+            print(f"Could not delete session thread {thread.id}: {e}")
+    
+    def answer_item(self, item: dict):
+        """
+        Answer one batch or job item ({"type": "query" | "technical" | "scaling", ...}).
+        
+        Raises RunFailed instead of returning the apology when the run failed
+        or timed out, so callers storing results can mark the item failed.
+        """
+        return self._require_answer(self._dispatch_batch_item(item))
+    
+    def handle_customer_query(self, query: str, partner_info: dict = None, urgency: str = "medium", use_cache: bool = True,
+                              endpoint: str = "query"):
         """
         Handle a customer support query in oneshot mode.
         
         Args:
             query: The customer's question or issue
             partner_info: Optional partner context information
+            urgency: Poll budget profile used while waiting for the run
+            use_cache: Set to False to skip the response cache lookup
+            endpoint: "query", "technical" or "scaling"; selects the run deadline
         """
+        enhanced_query = self._enhance_query_with_context(query, partner_info)
+        self.last_run_outcome = None
+        
+        cached_response = self._cached_response(enhanced_query, partner_info, use_cache)
+        if cached_response is not None:
+            return cached_response
+        
+        # Identical prompts already running elsewhere in the process share that
+        # run. Uncached requests (bypass or explicit sessions) always run alone.
+        if self.coalescer is not None and use_cache:
+            response, shared = self.coalescer.do(
+                coalescing_key(enhanced_query, self._cache_scope(partner_info)),
+                lambda: self._answer(enhanced_query, partner_info, urgency, endpoint)
+            )
+            if shared:
+                self.last_cache_status = "coalesced"
+            return response
+        
+        return self._answer(enhanced_query, partner_info, urgency, endpoint)
+    
+    def _post_prompt(self, prompt: str):
+        """Post the prompt to the session thread, preceded by a summary of older turns when due."""
+        summary = self.context_window.before_turn(self.thread.id, prompt)
+        with stage("message_post"):
+            if summary is not None:
+                self.agent_client.messages.create(thread_id=self.thread.id, role="user", content=summary)
+            self.agent_client.messages.create(
+                thread_id=self.thread.id,
+                role="user",
+                content=prompt
+            )
+    
+    def _answer(self, enhanced_query: str, partner_info: dict = None, urgency: str = "medium", endpoint: str = "query"):
+        """Answer through the agent backend, or from the degraded path while its circuit is open."""
+        if not self.circuit_breaker.allow():
+            return self._degraded_response(enhanced_query, partner_info, urgency, endpoint)
+        started = time.monotonic()
+        try:
+            response = self._run_answer(enhanced_query, partner_info, urgency, endpoint)
+        except RateLimitExceeded:
+            # Quota pressure is handled by the token budget, not the breaker.
+            self.circuit_breaker.record(None)
+            raise
+        except Exception:
+            self.circuit_breaker.record(False, time.monotonic() - started)
+            raise
+        except BaseException:
+            self.circuit_breaker.record(None)
+            raise
+        self.circuit_breaker.record(self.last_run_outcome not in BACKEND_FAILURE_OUTCOMES, time.monotonic() - started)
+        return response
+    
+    def _run_answer(self, enhanced_query: str, partner_info: dict = None, urgency: str = "medium", endpoint: str = "query"):
+        """Run the prompt on the session thread and return the formatted answer."""
         if not self.agent:
-            self.initialize_agent()
+            with stage("agent_init"):
+                self.initialize_agent()
         
         if not self.thread:
             self.create_support_session()
         
-        enhanced_query = self._enhance_query_with_context(query, partner_info)
+        # Reserve before posting: a shed request must not leave an unanswered question on the thread.
+        reservation = self._acquire_budget(enhanced_query)
+        self._post_prompt(enhanced_query)
+        
+        run = self._run_with_budget(enhanced_query, urgency, endpoint, reservation)
+        
+        print(f"Run finished with status: {run.status} ({self.last_run_outcome})")
+        
+        response_text = None
+        try:
+            if self.last_run_outcome in ("completed", "incomplete"):
+                with stage("message_fetch"):
+                    response_text = self._fetch_run_response(run)
+                self.context_window.after_turn(self.thread.id, enhanced_query, response_text, run)
+        finally:
+            self._close_hedges()
+        
+        return self._run_response(response_text, enhanced_query, partner_info)
+    
+    def _acquire_budget(self, prompt: str):
+        """Reserve a run's estimated tokens against the shared budget; None without one."""
+        if self.token_budget is None:
+            return None
+        with stage("token_budget"):
+            return self.token_budget.acquire(self._estimate_run_tokens(prompt))
+    
+    def _run_with_budget(self, prompt: str, urgency: str = "medium", endpoint: str = "query",
+                         reservation: str = None):
+        """
+        Run within the shared token budget and the endpoint's deadline, retrying
+        throttled runs after the service's retry hint and transient failures
+        with backoff.
+        
+        Every run is reserved against the budget: the first with the
+        reservation taken before the prompt was posted, a retry after a
+        transient failure by settling the failed run and reserving again. A
+        throttled run used no tokens, so its retry keeps the reservation.
+        """
         
-        message = self.agent_client.threads.messages.create(
-            thread_id=self.thread.id,
-            role="user",
-            content=enhanced_query
+        deadline = self.run_resilience.deadline(endpoint)
+        attempt = 0
+        failures = 0
+        while True:
+            started = time.monotonic()
+            try:
+                with stage("run"):
+                    run = self._run_to_completion(urgency, deadline, endpoint, prompt)
+            except Exception as e:
+                if not is_rate_limited(e):
+                    raise
+                outcome = e
+            else:
+                self._record_run(run)
+                if not is_rate_limited(run):
+                    self.last_run_outcome = classify_run(run)
+                    self.run_resilience.record(endpoint, self.last_run_outcome, time.monotonic() - started)
+                    delay = None
+                    if self.last_run_outcome == "transient":
+                        delay = self.run_resilience.retry_delay(failures, deadline)
+                    self._settle_budget(reservation, run)
+                    if delay is None:
+                        return run
+                    run_retries.inc(endpoint=endpoint)
+                    failures += 1
+                    time.sleep(delay)
+                    reservation = self._acquire_budget(prompt)
+                    continue
+                outcome = run
+            time.sleep(self._throttle_delay(outcome, attempt))
+            attempt += 1
+    
+    def _fetch_run_response(self, run):
+        """Fetch only the latest message written by the completed run."""
+        messages = self.agent_client.messages.list(
+            thread_id=getattr(run, "thread_id", None) or self.thread.id,
+            run_id=run.id,
+            order=NEWEST_FIRST,
+            limit=1
         )
         
-        run = self.agent_client.threads.runs.create_and_poll(
-            thread_id=self.thread.id,
-            assistant_id=self.agent.id
+        # Stop after the first item so no further pages are requested.
+        for message in messages:
+            if message.role == "assistant":
+                return self._extract_response_text(message)
+            break
+        
+        return None
+    
+    def _run_to_completion(self, urgency: str = "medium", deadline: float = None, endpoint: str = "query",
+                           prompt: str = None):
+        """
+        Start a run on the session thread and wait for it to reach a terminal
+        status; a run still going at the deadline is cancelled.
+        """
+        if self.completion_mode == "stream":
+            return self._stream_to_completion(deadline)
+        
+        run = self.agent_client.runs.create(
+            thread_id=self.thread.id, agent_id=self.agent.id, **self.context_window.run_options(self.thread.id)
         )
+        thread_id, run_id = self.thread.id, run.id
+        get_run = lambda: self.agent_client.runs.get(thread_id=thread_id, run_id=run_id)
+        hedge_after = self.run_resilience.hedge_after(endpoint, urgency) if prompt is not None else None
+        if hedge_after is None:
+            run, self.last_poll_stats = self.run_poller.wait(run, get_run, urgency, deadline)
+            others = []
+        else:
+            run, others, self.last_poll_stats = self.run_poller.wait_hedged(
+                run, get_run, lambda: self._start_hedge(prompt), hedge_after, urgency, deadline
+            )
+            self._record_hedge(run, others, run_id)
+        for pending in [run] + others:
+            if not is_terminal(pending):
+                self._cancel_run(pending)
+            self._settle_budget(self._hedge_reservations.pop(pending.id, None), pending)
+        return run
+    
+    def _has_history(self):
+        """Whether the session thread holds messages before the prompt just posted."""
+        count = 0
+        for _ in self.agent_client.messages.list(thread_id=self.thread.id, order=NEWEST_FIRST, limit=2):
+            count += 1
+            if count > 1:
+                return True
+        return False
+    
+    def _start_hedge(self, prompt: str):
+        """
+        Start a second run of the prompt on a scratch thread; returns it and its
+        poll function, or None when the session thread has earlier turns the
+        scratch thread would not see, or the token budget has no room for it now.
+        """
+        if self._has_history():
+            return None
+        reservation = None
+        if self.token_budget is not None:
+            reservation, _ = self.token_budget.reserve(self._estimate_run_tokens(prompt))
+            if reservation is None:
+                return None
+        thread = self.agent_client.threads.create()
+        self._hedge_threads.append(thread.id)
+        self.agent_client.messages.create(thread_id=thread.id, role="user", content=prompt)
+        run = self.agent_client.runs.create(thread_id=thread.id, agent_id=self.agent.id)
+        self._hedge_reservations[run.id] = reservation
+        run_hedges.inc(result="started")
+        return run, lambda: self.agent_client.runs.get(thread_id=thread.id, run_id=run.id)
+    
+    def _cancel_run(self, run):
+        """Cancel a run that is no longer waited on so it stops using quota."""
+        try:
+            self.agent_client.runs.cancel(thread_id=getattr(run, "thread_id", None) or self.thread.id, run_id=run.id)
+        except Exception as e:
+            print(f"Could not cancel run {run.id}: {e}")
+    
+    def _close_hedges(self):
+        """Delete the scratch threads of hedged runs once their answer has been read."""
+        hedge_threads, self._hedge_threads = self._hedge_threads, []
+        self._hedge_reservations.clear()
+        for thread_id in hedge_threads:
+            try:
+                self.agent_client.threads.delete(thread_id)
+            except Exception as e:
+                print(f"Could not delete hedge thread {thread_id}: {e}")
+    
+    def _stream_to_completion(self, deadline: float = None):
+        """
+        Event-driven completion: follow the run's event stream instead of
+        polling. The deadline is checked between events.
+        """
+        run = None
+        with self.agent_client.runs.stream(
+            thread_id=self.thread.id, agent_id=self.agent.id, **self.context_window.run_options(self.thread.id)
+        ) as stream:
+            for event_type, event_data, _ in stream:
+                if self._is_run_event(event_type):
+                    run = event_data
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        self.last_poll_stats = None
+        if run is not None and not is_terminal(run):
+            self._cancel_run(run)
+        return run
+    
+    def stream_customer_query(self, query: str, partner_info: dict = None, events: bool = False, endpoint: str = "query"):
+        """
+        Stream a customer support answer as it is generated.
+        
+        Yields the branded header, the answer text deltas and the footer. With
+        events=True, yields (event, text) pairs where event is one of "header",
+        "delta", "error" or "footer".
+        """
+        enhanced_query = self._enhance_query_with_context(query, partner_info)
+        for event, text in self._stream_prompt(enhanced_query, endpoint):
+            yield (event, text) if events else text
+    
+    def _stream_prompt(self, prompt: str, endpoint: str = "query"):
+        """Yield (event, text) pairs for the prompt, from the degraded path while the backend circuit is open."""
+        if not self.circuit_breaker.allow():
+            for event in self._degraded_events(prompt, endpoint):
+                yield event
+            return
+        started = time.monotonic()
+        answered = False
+        try:
+            for event, text in self._stream_run(prompt, endpoint):
+                answered = answered or event == "delta"
+                yield event, text
+        except RateLimitExceeded:
+            self.circuit_breaker.record(None)
+            raise
+        except Exception:
+            self.circuit_breaker.record(False, time.monotonic() - started)
+            raise
+        except BaseException:
+            self.circuit_breaker.record(None)
+            raise
+        self.circuit_breaker.record(answered, time.monotonic() - started)
+    
+    def _stream_run(self, prompt: str, endpoint: str = "query"):
+        """
+        Post the prompt and yield (event, text) pairs from the streaming run.
+        
+        The endpoint's run deadline is checked between events; a run still
+        going when it passes is cancelled and the stream ends with the timeout
+        apology as an error event.
+        """
+        if not self.agent:
+            with stage("agent_init"):
+                self.initialize_agent()
+        
+        if not self.thread:
+            self.create_support_session()
+        
+        reservation = self._acquire_budget(prompt)
+        self._post_prompt(prompt)
+        deadline = self.run_resilience.deadline(endpoint)
+        
+        yield "header", self._stream_header()
         
-        print(f"Run completed with status: {run.status}")
+        received_text = []
+        run = None
+        started = time.perf_counter()
+        with self.agent_client.runs.stream(
+            thread_id=self.thread.id, agent_id=self.agent.id, **self.context_window.run_options(self.thread.id)
+        ) as stream:
+            for event_type, event_data, _ in stream:
+                if event_type == MESSAGE_DELTA_EVENT and event_data.text:
+                    if not received_text:
+                        stage_seconds.observe(time.perf_counter() - started, stage="stream_first_token")
+                    received_text.append(event_data.text)
+                    yield "delta", event_data.text
+                elif self._is_run_event(event_type):
+                    run = event_data
+                elif event_type in STREAM_FAILURE_EVENTS:
+                    break
+                if time.monotonic() >= deadline:
+                    break
         
-        if run.status == "completed":
-            messages = self.agent_client.threads.messages.list(
+        self.last_run_outcome = classify_run(run)
+        self.run_resilience.record(endpoint, self.last_run_outcome)
+        if self.last_run_outcome == "timeout" and run is not None:
+            self._cancel_run(run)
+        self._settle_budget(reservation, run)
+        self.context_window.after_turn(self.thread.id, prompt, "".join(received_text), run)
+        if self.last_run_outcome == "timeout":
+            yield "error", TIMEOUT_RESPONSE
+        elif not received_text:
+            yield "error", FALLBACK_RESPONSE
+        
+        yield "footer", self._stream_footer()
+    
+    def get_partner_scaling_recommendations(self, partner_profile: dict, use_cache: bool = True):
+        """Provide specific scaling recommendations for channel partners."""
+        scaling_query = self.support_templates.get_scaling_template(partner_profile)
+        return self.handle_customer_query(scaling_query, partner_profile, use_cache=use_cache, endpoint="scaling")
+    
+    def stream_partner_scaling_recommendations(self, partner_profile: dict, events: bool = False):
+        """Stream scaling recommendations for channel partners."""
+        scaling_query = self.support_templates.get_scaling_template(partner_profile)
+        return self.stream_customer_query(scaling_query, partner_profile, events=events, endpoint="scaling")
+    
+    def handle_technical_support(self, technical_issue: str, urgency: str = "medium", use_cache: bool = True):
+        """Handle technical support requests with appropriate urgency."""
+        tech_query = self.support_templates.get_technical_template(technical_issue, urgency)
+        return self.handle_customer_query(tech_query, urgency=urgency, use_cache=use_cache, endpoint="technical")
+    
+    def stream_technical_support(self, technical_issue: str, urgency: str = "medium", events: bool = False):
+        """Stream a technical support answer with appropriate urgency."""
+        tech_query = self.support_templates.get_technical_template(technical_issue, urgency)
+        return self.stream_customer_query(tech_query, events=events, endpoint="technical")
+    
+    def handle_batch(self, items: list, max_concurrency: int = 4, job_id: str = None):
+        """
+        Run many partner questions concurrently, each on its own support thread.
+        
+        Args:
+            items: Dicts with a "type" of "query", "technical" or "scaling" plus that type's fields
+            max_concurrency: Maximum number of runs in flight at once
+            job_id: Resume an earlier batch, re-running only items that did not succeed
+        
+        Returns the job ID and per-item status, timing and response in input order.
+        """
+        if not self.agent:
+            self.initialize_agent()
+        
+        def handle_item(item):
+            # Workers share this agent's client and definition but get their own
+            # thread, which is deleted once the item is answered.
+            worker = type(self)(project_client=self.project_client, agent=self.agent)
+            try:
+                return worker.answer_item(item)
+            finally:
+                worker.close_support_session()
+        
+        return run_batch(items, handle_item, max_concurrency, job_id=job_id)
+    
+    def cleanup(self):
+        """Clean up resources."""
+        if hasattr(self, 'project_client') and self._owns_client:
+            self.project_client.close()
+
+class AsyncMagenticOneAgent(BaseMagenticOneAgent):
+    """
+    Asyncio variant of MagenticOneAgent built on the async Azure AI clients.
+    Runs are awaited instead of blocking, so one event loop can keep many
+    customer queries in flight at once.
+    """
+    
+    def __init__(self, project_client=None, agent=None):
+        super().__init__(project_client, agent)
+        self.agent_registry = AsyncAgentRegistry(self.agent_client, self._registry_path(), get_shared_store())
+        self.coalescer = get_async_coalescer()
+    
+    def _create_project_client(self):
+        if self.backend == "fake":
+            from backends.fake_agents import AsyncFakeProjectClient
+            return AsyncFakeProjectClient()
+        from azure.ai.projects.aio import AIProjectClient as AsyncAIProjectClient
+        # The credential and its token cache are shared process-wide and
+        # closed by the application, not by the agent.
+        return AsyncAIProjectClient(
+            endpoint=self.project_endpoint,
+            credential=get_async_credential()
+        )
+    
+    async def initialize_agent(self):
+        """Initialize the Lumen customer support agent with oneshot configuration."""
+        self.agent = await self.agent_registry.get_or_create(
+            model=self.model_deployment_name,
+            name=AGENT_NAME,
+            instructions=self._build_instructions(),
+            tools=[]
+        )
+        
+        print(f"Using Lumen customer support agent with ID: {self.agent.id}")
+        return self.agent
+    
+    async def create_support_session(self):
+        """Create a new customer support session thread, or take it from thread_source."""
+        if self.thread_source is not None:
+            self.thread = await self.thread_source()
+            return self.thread
+        with stage("thread_create"):
+            self.thread = await self.agent_client.threads.create()
+        print(f"Created support session thread with ID: {self.thread.id}")
+        return self.thread
+    
+    async def close_support_session(self):
+        """Delete the session thread this agent created, for one-off work that keeps no history."""
+        thread, self.thread = self.thread, None
+        if thread is None:
+            return
+        await self.context_window.forget_async(thread.id)
+        try:
+            await self.agent_client.threads.delete(thread.id)
+        except Exception as e:
+            print(f"Could not delete session thread {thread.id}: {e}")
+    
+    async def _cached_response(self, enhanced_query: str, partner_info: dict = None, use_cache: bool = True):
+        """Async counterpart of BaseMagenticOneAgent._cached_response; the shared store is read off the loop."""
+        if self.response_cache is None or not use_cache:
+            self.last_cache_status = "bypass"
+            cache_lookups.inc(result="bypass")
+            return None
+        with stage("cache_lookup"):
+            response, self.last_cache_status = await self.response_cache.lookup_async(
+                enhanced_query, self._cache_scope(partner_info)
+            )
+        cache_lookups.inc(result=self.last_cache_status)
+        return response
+    
+    async def _run_response(self, response_text: str, enhanced_query: str, partner_info: dict = None):
+        """Async counterpart of BaseMagenticOneAgent._run_response; the shared store is written off the loop."""
+        if self.last_run_outcome in ("completed", "incomplete") and response_text is not None:
+            response = self._format_response(response_text)
+            if self.last_run_outcome == "completed" and self.response_cache is not None:
+                await self.response_cache.put_async(enhanced_query, response, self._cache_scope(partner_info))
+            return response
+        return TIMEOUT_RESPONSE if self.last_run_outcome == "timeout" else FALLBACK_RESPONSE
+    
+    async def answer_item(self, item: dict):
+        """Answer one batch or job item; async counterpart of MagenticOneAgent.answer_item."""
+        return self._require_answer(await self._dispatch_batch_item(item))
+    
+    async def handle_customer_query(self, query: str, partner_info: dict = None, urgency: str = "medium", use_cache: bool = True,
+                              endpoint: str = "query"):
+        """
+        Handle a customer support query in oneshot mode without blocking the event loop.
+        
+        Args:
+            query: The customer's question or issue
+            partner_info: Optional partner context information
+            urgency: Poll budget profile used while waiting for the run
+            use_cache: Set to False to skip the response cache lookup
+            endpoint: "query", "technical" or "scaling"; selects the run deadline
+        """
+        enhanced_query = self._enhance_query_with_context(query, partner_info)
+        self.last_run_outcome = None
+        
+        cached_response = await self._cached_response(enhanced_query, partner_info, use_cache)
+        if cached_response is not None:
+            return cached_response
+        
+        # Identical prompts already running elsewhere in the process share that
+        # run. Uncached requests (bypass or explicit sessions) always run alone.
+        if self.coalescer is not None and use_cache:
+            response, shared = await self.coalescer.do(
+                coalescing_key(enhanced_query, self._cache_scope(partner_info)),
+                lambda: self._answer(enhanced_query, partner_info, urgency, endpoint)
+            )
+            if shared:
+                self.last_cache_status = "coalesced"
+            return response
+        
+        return await self._answer(enhanced_query, partner_info, urgency, endpoint)
+    
+    async def _post_prompt(self, prompt: str):
+        """Post the prompt to the session thread, preceded by a summary of older turns when due."""
+        summary = await self.context_window.before_turn_async(self.thread.id, prompt)
+        with stage("message_post"):
+            if summary is not None:
+                await self.agent_client.messages.create(thread_id=self.thread.id, role="user", content=summary)
+            await self.agent_client.messages.create(
                 thread_id=self.thread.id,
-                order=ListSortOrder.DESC
+                role="user",
+                content=prompt
             )
-            
-            for message in messages.data:
-                if message.role == "assistant":
-                    for content_item in message.content:
-                        if isinstance(content_item, MessageTextContent):
-                            return self._format_response(content_item.text.value)
+    
+    async def _answer(self, enhanced_query: str, partner_info: dict = None, urgency: str = "medium", endpoint: str = "query"):
+        """Answer through the agent backend, or from the degraded path while its circuit is open."""
+        if not self.circuit_breaker.allow():
+            return self._degraded_response(enhanced_query, partner_info, urgency, endpoint)
+        started = time.monotonic()
+        try:
+            response = await self._run_answer(enhanced_query, partner_info, urgency, endpoint)
+        except RateLimitExceeded:
+            # Quota pressure is handled by the token budget, not the breaker.
+            self.circuit_breaker.record(None)
+            raise
+        except Exception:
+            self.circuit_breaker.record(False, time.monotonic() - started)
+            raise
+        except BaseException:
+            self.circuit_breaker.record(None)
+            raise
+        self.circuit_breaker.record(self.last_run_outcome not in BACKEND_FAILURE_OUTCOMES, time.monotonic() - started)
+        return response
+    
+    async def _run_answer(self, enhanced_query: str, partner_info: dict = None, urgency: str = "medium", endpoint: str = "query"):
+        """Run the prompt on the session thread and return the formatted answer."""
+        if not self.agent:
+            with stage("agent_init"):
+                await self.initialize_agent()
+        
+        if not self.thread:
+            await self.create_support_session()
+        
+        # Reserve before posting: a shed request must not leave an unanswered question on the thread.
+        reservation = await self._acquire_budget(enhanced_query)
+        await self._post_prompt(enhanced_query)
+        
+        run = await self._run_with_budget(enhanced_query, urgency, endpoint, reservation)
         
-        return "I apologize, but I encountered an issue processing your request. Please try again or contact our support team for assistance."
+        print(f"Run finished with status: {run.status} ({self.last_run_outcome})")
+        
+        response_text = None
+        try:
+            if self.last_run_outcome in ("completed", "incomplete"):
+                with stage("message_fetch"):
+                    response_text = await self._fetch_run_response(run)
+                await self.context_window.after_turn_async(self.thread.id, enhanced_query, response_text, run)
+        finally:
+            await self._close_hedges()
+        
+        return await self._run_response(response_text, enhanced_query, partner_info)
     
-    def _enhance_query_with_context(self, query: str, partner_info: dict = None):
-        """Enhance the query with partner context and Lumen-specific information."""
-        context_parts = [f"Customer Query: {query}"]
+    async def _acquire_budget(self, prompt: str):
+        """Reserve a run's estimated tokens against the shared budget; None without one."""
+        if self.token_budget is None:
+            return None
+        with stage("token_budget"):
+            return await self.token_budget.acquire_async(self._estimate_run_tokens(prompt))
+    
+    async def _run_with_budget(self, prompt: str, urgency: str = "medium", endpoint: str = "query",
+                               reservation: str = None):
+        """
+        Run within the shared token budget and the endpoint's deadline, retrying
+        throttled runs after the service's retry hint and transient failures
+        with backoff.
         
-        if partner_info:
-            context_parts.append("Partner Context:")
-            if partner_info.get("partner_name"):
-                context_parts.append(f"- Partner: {partner_info['partner_name']}")
-            if partner_info.get("partner_tier"):
-                context_parts.append(f"- Tier: {partner_info['partner_tier']}")
-            if partner_info.get("focus_area"):
-                context_parts.append(f"- Focus Area: {partner_info['focus_area']}")
-            if partner_info.get("region"):
-                context_parts.append(f"- Region: {partner_info['region']}")
+        Every run is reserved against the budget: the first with the
+        reservation taken before the prompt was posted, a retry after a
+        transient failure by settling the failed run and reserving again. A
+        throttled run used no tokens, so its retry keeps the reservation.
+        """
         
-        context_parts.append("\nPlease provide a comprehensive response that addresses the query while considering Lumen's technology offerings and the partner's scaling needs.")
+        deadline = self.run_resilience.deadline(endpoint)
+        attempt = 0
+        failures = 0
+        while True:
+            started = time.monotonic()
+            try:
+                with stage("run"):
+                    run = await self._run_to_completion(urgency, deadline, endpoint, prompt)
+            except Exception as e:
+                if not is_rate_limited(e):
+                    raise
+                outcome = e
+            else:
+                self._record_run(run)
+                if not is_rate_limited(run):
+                    self.last_run_outcome = classify_run(run)
+                    self.run_resilience.record(endpoint, self.last_run_outcome, time.monotonic() - started)
+                    delay = None
+                    if self.last_run_outcome == "transient":
+                        delay = self.run_resilience.retry_delay(failures, deadline)
+                    await self._settle_budget(reservation, run)
+                    if delay is None:
+                        return run
+                    run_retries.inc(endpoint=endpoint)
+                    failures += 1
+                    await asyncio.sleep(delay)
+                    reservation = await self._acquire_budget(prompt)
+                    continue
+                outcome = run
+            await asyncio.sleep(self._throttle_delay(outcome, attempt))
+            attempt += 1
+    
+    async def _settle_budget(self, reservation: str, run):
+        """Replace the reserved estimate with the run's reported usage, off the event loop."""
+        total_tokens = self._run_tokens(run)
+        if reservation is not None and total_tokens:
+            await self.token_budget.settle_async(reservation, total_tokens)
+    
+    async def _fetch_run_response(self, run):
+        """Fetch only the latest message written by the completed run."""
+        messages = self.agent_client.messages.list(
+            thread_id=getattr(run, "thread_id", None) or self.thread.id,
+            run_id=run.id,
+            order=NEWEST_FIRST,
+            limit=1
+        )
         
-        return "\n".join(context_parts)
+        # Stop after the first item so no further pages are requested.
+        async for message in messages:
+            if message.role == "assistant":
+                return self._extract_response_text(message)
+            break
+        
+        return None
     
-    def _format_response(self, response_text: str):
-        """Format the response with Lumen branding and structure."""
-        formatted_response = f"""
-{self.brand_config.get_header()}
-
-{response_text}
-
-{self.brand_config.get_footer()}
-        """.strip()
+    async def _run_to_completion(self, urgency: str = "medium", deadline: float = None, endpoint: str = "query",
+                                 prompt: str = None):
+        """
+        Start a run on the session thread and wait for it to reach a terminal
+        status; a run still going at the deadline is cancelled.
+        """
+        if self.completion_mode == "stream":
+            return await self._stream_to_completion(deadline)
+        
+        options = await self.context_window.run_options_async(self.thread.id)
+        run = await self.agent_client.runs.create(thread_id=self.thread.id, agent_id=self.agent.id, **options)
+        thread_id, run_id = self.thread.id, run.id
+        get_run = lambda: self.agent_client.runs.get(thread_id=thread_id, run_id=run_id)
+        hedge_after = self.run_resilience.hedge_after(endpoint, urgency) if prompt is not None else None
+        if hedge_after is None:
+            run, self.last_poll_stats = await self.run_poller.wait_async(run, get_run, urgency, deadline)
+            others = []
+        else:
+            run, others, self.last_poll_stats = await self.run_poller.wait_hedged_async(
+                run, get_run, lambda: self._start_hedge(prompt), hedge_after, urgency, deadline
+            )
+            self._record_hedge(run, others, run_id)
+        for pending in [run] + others:
+            if not is_terminal(pending):
+                await self._cancel_run(pending)
+            await self._settle_budget(self._hedge_reservations.pop(pending.id, None), pending)
+        return run
+    
+    async def _has_history(self):
+        """Whether the session thread holds messages before the prompt just posted."""
+        count = 0
+        async for _ in self.agent_client.messages.list(thread_id=self.thread.id, order=NEWEST_FIRST, limit=2):
+            count += 1
+            if count > 1:
+                return True
+        return False
+    
+    async def _start_hedge(self, prompt: str):
+        """
+        Start a second run of the prompt on a scratch thread; returns it and its
+        poll function, or None when the session thread has earlier turns the
+        scratch thread would not see, or the token budget has no room for it now.
+        """
+        if await self._has_history():
+            return None
+        reservation = None
+        if self.token_budget is not None:
+            reservation, _ = await asyncio.to_thread(self.token_budget.reserve, self._estimate_run_tokens(prompt))
+            if reservation is None:
+                return None
+        thread = await self.agent_client.threads.create()
+        self._hedge_threads.append(thread.id)
+        await self.agent_client.messages.create(thread_id=thread.id, role="user", content=prompt)
+        run = await self.agent_client.runs.create(thread_id=thread.id, agent_id=self.agent.id)
+        self._hedge_reservations[run.id] = reservation
+        run_hedges.inc(result="started")
+        return run, lambda: self.agent_client.runs.get(thread_id=thread.id, run_id=run.id)
+    
+    async def _cancel_run(self, run):
+        """Cancel a run that is no longer waited on so it stops using quota."""
+        try:
+            await self.agent_client.runs.cancel(thread_id=getattr(run, "thread_id", None) or self.thread.id, run_id=run.id)
+        except Exception as e:
+            print(f"Could not cancel run {run.id}: {e}")
+    
+    async def _close_hedges(self):
+        """Delete the scratch threads of hedged runs once their answer has been read."""
+        hedge_threads, self._hedge_threads = self._hedge_threads, []
+        self._hedge_reservations.clear()
+        for thread_id in hedge_threads:
+            try:
+                await self.agent_client.threads.delete(thread_id)
+            except Exception as e:
+                print(f"Could not delete hedge thread {thread_id}: {e}")
+    
+    async def _stream_to_completion(self, deadline: float = None):
+        """
+        Event-driven completion: follow the run's event stream instead of
+        polling. The deadline is checked between events.
+        """
+        run = None
+        options = await self.context_window.run_options_async(self.thread.id)
+        async with await self.agent_client.runs.stream(
+            thread_id=self.thread.id, agent_id=self.agent.id, **options
+        ) as stream:
+            async for event_type, event_data, _ in stream:
+                if self._is_run_event(event_type):
+                    run = event_data
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+        self.last_poll_stats = None
+        if run is not None and not is_terminal(run):
+            await self._cancel_run(run)
+        return run
+    
+    async def stream_customer_query(self, query: str, partner_info: dict = None, events: bool = False, endpoint: str = "query"):
+        """
+        Stream a customer support answer as it is generated.
         
-        return formatted_response
+        Async counterpart of MagenticOneAgent.stream_customer_query.
+        """
+        enhanced_query = self._enhance_query_with_context(query, partner_info)
+        async for event, text in self._stream_prompt(enhanced_query, endpoint):
+            yield (event, text) if events else text
     
-    def get_partner_scaling_recommendations(self, partner_profile: dict):
+    async def _stream_prompt(self, prompt: str, endpoint: str = "query"):
+        """Yield (event, text) pairs for the prompt, from the degraded path while the backend circuit is open."""
+        if not self.circuit_breaker.allow():
+            for event in self._degraded_events(prompt, endpoint):
+                yield event
+            return
+        started = time.monotonic()
+        answered = False
+        try:
+            async for event, text in self._stream_run(prompt, endpoint):
+                answered = answered or event == "delta"
+                yield event, text
+        except RateLimitExceeded:
+            self.circuit_breaker.record(None)
+            raise
+        except Exception:
+            self.circuit_breaker.record(False, time.monotonic() - started)
+            raise
+        except BaseException:
+            self.circuit_breaker.record(None)
+            raise
+        self.circuit_breaker.record(answered, time.monotonic() - started)
+    
+    async def _stream_run(self, prompt: str, endpoint: str = "query"):
+        """
+        Post the prompt and yield (event, text) pairs from the streaming run.
+        
+        The endpoint's run deadline is checked between events; a run still
+        going when it passes is cancelled and the stream ends with the timeout
+        apology as an error event.
+        """
+        if not self.agent:
+            with stage("agent_init"):
+                await self.initialize_agent()
+        
+        if not self.thread:
+            await self.create_support_session()
+        
+        reservation = await self._acquire_budget(prompt)
+        await self._post_prompt(prompt)
+        deadline = self.run_resilience.deadline(endpoint)
+        
+        yield "header", self._stream_header()
+        
+        received_text = []
+        run = None
+        started = time.perf_counter()
+        options = await self.context_window.run_options_async(self.thread.id)
+        async with await self.agent_client.runs.stream(
+            thread_id=self.thread.id, agent_id=self.agent.id, **options
+        ) as stream:
+            async for event_type, event_data, _ in stream:
+                if event_type == MESSAGE_DELTA_EVENT and event_data.text:
+                    if not received_text:
+                        stage_seconds.observe(time.perf_counter() - started, stage="stream_first_token")
+                    received_text.append(event_data.text)
+                    yield "delta", event_data.text
+                elif self._is_run_event(event_type):
+                    run = event_data
+                elif event_type in STREAM_FAILURE_EVENTS:
+                    break
+                if time.monotonic() >= deadline:
+                    break
+        
+        self.last_run_outcome = classify_run(run)
+        self.run_resilience.record(endpoint, self.last_run_outcome)
+        if self.last_run_outcome == "timeout" and run is not None:
+            await self._cancel_run(run)
+        await self._settle_budget(reservation, run)
+        await self.context_window.after_turn_async(self.thread.id, prompt, "".join(received_text), run)
+        if self.last_run_outcome == "timeout":
+            yield "error", TIMEOUT_RESPONSE
+        elif not received_text:
+            yield "error", FALLBACK_RESPONSE
+        
+        yield "footer", self._stream_footer()
+    
+    async def get_partner_scaling_recommendations(self, partner_profile: dict, use_cache: bool = True):
         """Provide specific scaling recommendations for channel partners."""
         scaling_query = self.support_templates.get_scaling_template(partner_profile)
-        return self.handle_customer_query(scaling_query, partner_profile)
+        return await self.handle_customer_query(scaling_query, partner_profile, use_cache=use_cache, endpoint="scaling")
     
-    def handle_technical_support(self, technical_issue: str, urgency: str = "medium"):
+    def stream_partner_scaling_recommendations(self, partner_profile: dict, events: bool = False):
+        """Stream scaling recommendations for channel partners."""
+        scaling_query = self.support_templates.get_scaling_template(partner_profile)
+        return self.stream_customer_query(scaling_query, partner_profile, events=events, endpoint="scaling")
+    
+    async def handle_technical_support(self, technical_issue: str, urgency: str = "medium", use_cache: bool = True):
         """Handle technical support requests with appropriate urgency."""
         tech_query = self.support_templates.get_technical_template(technical_issue, urgency)
-        return self.handle_customer_query(tech_query)
+        return await self.handle_customer_query(tech_query, urgency=urgency, use_cache=use_cache, endpoint="technical")
     
-    def cleanup(self):
+    def stream_technical_support(self, technical_issue: str, urgency: str = "medium", events: bool = False):
+        """Stream a technical support answer with appropriate urgency."""
+        tech_query = self.support_templates.get_technical_template(technical_issue, urgency)
+        return self.stream_customer_query(tech_query, events=events, endpoint="technical")
+    
+    async def handle_batch(self, items: list, max_concurrency: int = 8, job_id: str = None):
+        """
+        Run many partner questions concurrently, each on its own support thread.
+        
+        Args:
+            items: Dicts with a "type" of "query", "technical" or "scaling" plus that type's fields
+            max_concurrency: Maximum number of runs in flight at once
+            job_id: Resume an earlier batch, re-running only items that did not succeed
+        
+        Returns the job ID and per-item status, timing and response in input order.
+        """
+        if not self.agent:
+            await self.initialize_agent()
+        
+        async def handle_item(item):
+            # Workers share this agent's client and definition but get their own
+            # thread, which is deleted once the item is answered.
+            worker = type(self)(project_client=self.project_client, agent=self.agent)
+            try:
+                return await worker.answer_item(item)
+            finally:
+                await worker.close_support_session()
+        
+        return await run_batch_async(items, handle_item, max_concurrency, job_id=job_id)
+    
+    async def cleanup(self):
         """Clean up resources."""
-        if hasattr(self, 'project_client'):
-            self.project_client.close()
+        if hasattr(self, 'project_client') and self._owns_client:
+            await self.project_client.close()
 
 def main():
     """Example usage of the Lumen Magentic-One Agent."""
@@ -200,7 +1321,7 @@ def main():
         
         response = agent.handle_customer_query(query, partner_info)
         print(response)
-        
+    
     except Exception as e:
         print(f"Error: {e}")
     finally:
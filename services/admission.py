@@ -0,0 +1,232 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from services.metrics import registry as metrics_registry
+
+
+# Served strictly in this order; within one priority, tiers share by weight.
+PRIORITIES = ("critical", "high", "medium", "low")
+TIER_WEIGHTS = {"platinum": 8, "gold": 4, "silver": 2, "standard": 1}
+
+admission_decisions = metrics_registry.counter(
+    "support_admission_decisions",
+    "Admission outcomes by priority (admitted, queued, rejected, timed_out).",
+    ("priority", "outcome")
+)
+admission_wait_seconds = metrics_registry.histogram(
+    "support_admission_wait_seconds",
+    "Time requests spent queued before admission.",
+    ("priority",)
+)
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a request is turned away; retry_after is a hint in whole seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def concurrency_for_quota(tpm: float, tokens_per_request: float, avg_run_seconds: float):
+    """
+    Concurrent runs a tokens-per-minute quota sustains.
+
+    Each slot completes 60 / avg_run_seconds runs a minute, each costing
+    tokens_per_request tokens.
+    """
+    return max(1, int(tpm * avg_run_seconds / (60 * tokens_per_request)))
+
+
+class _Ticket:
+    __slots__ = ("priority", "tier", "admitted_at")
+
+    def __init__(self, priority: str, tier: str):
+        self.priority = priority
+        self.tier = tier
+        self.admitted_at = time.monotonic()
+
+
+class _Waiter:
+    __slots__ = ("future", "ticket", "enqueued_at")
+
+    def __init__(self, future, ticket: _Ticket):
+        self.future = future
+        self.ticket = ticket
+        self.enqueued_at = time.monotonic()
+
+
+class AdmissionScheduler:
+    """
+    Admission control in front of the agent calls.
+
+    At most max_concurrency requests run at once. When saturated, requests wait
+    in per-priority queues that are drained strictly by urgency; within one
+    priority, partner tiers are served in proportion to their weight (stride
+    scheduling), so Platinum traffic cannot starve Standard partners outright.
+    Priorities listed in reject_priorities, and requests arriving at a full
+    queue, get an immediate AdmissionRejected with a Retry-After estimate.
+    """
+
+    def __init__(self, max_concurrency: int = None, max_queue: int = None, queue_timeout: float = None,
+                 reject_priorities: tuple = None, tier_weights: dict = None, avg_run_seconds: float = None):
+        self.avg_run_seconds = avg_run_seconds or float(os.environ.get("ADMISSION_AVG_RUN_SECONDS", "10"))
+        self.max_concurrency = max_concurrency or self._concurrency_from_env()
+        self.max_queue = max_queue or int(os.environ.get("ADMISSION_MAX_QUEUE", "256"))
+        self.queue_timeout = queue_timeout or float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "30"))
+        if reject_priorities is None:
+            reject_priorities = tuple(
+                p.strip() for p in os.environ.get("ADMISSION_REJECT_PRIORITIES", "low").split(",") if p.strip()
+            )
+        self.reject_priorities = set(reject_priorities)
+        self.tier_weights = tier_weights or TIER_WEIGHTS
+
+        self._queues = {priority: {tier: deque() for tier in self.tier_weights} for priority in PRIORITIES}
+        self._pass = {priority: {tier: 0.0 for tier in self.tier_weights} for priority in PRIORITIES}
+        self._virtual_time = {priority: 0.0 for priority in PRIORITIES}
+        self._service_time = self.avg_run_seconds
+        self.in_flight = 0
+
+    def _concurrency_from_env(self):
+        explicit = os.environ.get("ADMISSION_MAX_CONCURRENCY")
+        if explicit:
+            return int(explicit)
+        tpm = os.environ.get("ADMISSION_TPM_QUOTA")
+        if tpm:
+            tokens = float(os.environ.get("ADMISSION_TOKENS_PER_REQUEST", "2000"))
+            # The quota is shared by every worker; each admits its share.
+            workers = max(1, int(os.environ.get("WEB_CONCURRENCY", "1")))
+            return max(1, concurrency_for_quota(float(tpm), tokens, self.avg_run_seconds) // workers)
+        return 64
+
+    def normalize_priority(self, priority: str = None):
+        priority = (priority or "medium").lower()
+        return priority if priority in PRIORITIES else "medium"
+
+    def normalize_tier(self, tier: str = None):
+        tier = (tier or "standard").lower()
+        return tier if tier in self.tier_weights else "standard"
+
+    def queue_depth(self, priority: str = None):
+        priorities = (priority,) if priority else PRIORITIES
+        return sum(len(queue) for p in priorities for queue in self._queues[p].values())
+
+    def retry_after(self, priority: str = None):
+        """Seconds until a slot is likely free for a new request at this priority."""
+        served_first = PRIORITIES[:PRIORITIES.index(self.normalize_priority(priority)) + 1]
+        ahead = sum(self.queue_depth(p) for p in served_first)
+        return max(1, math.ceil(self._service_time * (ahead + 1) / self.max_concurrency))
+
+    def _reject(self, ticket: _Ticket, reason: str):
+        admission_decisions.inc(priority=ticket.priority, outcome="rejected")
+        raise AdmissionRejected(reason, self.retry_after(ticket.priority))
+
+    async def acquire(self, priority: str = None, tier: str = None):
+        """Wait for a run slot and return its ticket, or raise AdmissionRejected."""
+        ticket = _Ticket(self.normalize_priority(priority), self.normalize_tier(tier))
+
+        if self.in_flight < self.max_concurrency and self.queue_depth() == 0:
+            self.in_flight += 1
+            admission_decisions.inc(priority=ticket.priority, outcome="admitted")
+            return ticket
+
+        if ticket.priority in self.reject_priorities:
+            self._reject(ticket, f"Server is at capacity; {ticket.priority} priority requests are not queued")
+        if self.queue_depth(ticket.priority) >= self.max_queue:
+            self._reject(ticket, f"The {ticket.priority} priority queue is full")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), ticket)
+        self._enqueue(waiter)
+        admission_decisions.inc(priority=ticket.priority, outcome="queued")
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted a slot just as we gave up; hand it on.
+                self.release(ticket)
+            else:
+                waiter.future.cancel()
+                self._remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                admission_decisions.inc(priority=ticket.priority, outcome="timed_out")
+                raise AdmissionRejected(
+                    f"Timed out after {self.queue_timeout:g}s waiting for capacity", self.retry_after(ticket.priority)
+                )
+            raise
+        admission_wait_seconds.observe(time.monotonic() - waiter.enqueued_at, priority=ticket.priority)
+        ticket.admitted_at = time.monotonic()
+        return ticket
+
+    def release(self, ticket: _Ticket):
+        """Free the ticket's slot and admit the next queued request, if any."""
+        elapsed = time.monotonic() - ticket.admitted_at
+        self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+        self.in_flight -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def admit(self, priority: str = None, tier: str = None):
+        ticket = await self.acquire(priority, tier)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _enqueue(self, waiter: _Waiter):
+        priority, tier = waiter.ticket.priority, waiter.ticket.tier
+        queue = self._queues[priority][tier]
+        if not queue:
+            # A tier returning from idle starts at the current virtual time
+            # instead of cashing in the turns it skipped.
+            self._pass[priority][tier] = max(self._pass[priority][tier], self._virtual_time[priority])
+        queue.append(waiter)
+
+    def _remove(self, waiter: _Waiter):
+        try:
+            self._queues[waiter.ticket.priority][waiter.ticket.tier].remove(waiter)
+        except ValueError:
+            pass
+
+    def _next_waiter(self):
+        for priority in PRIORITIES:
+            candidates = [tier for tier, queue in self._queues[priority].items() if queue]
+            if not candidates:
+                continue
+            tier = min(candidates, key=lambda t: self._pass[priority][t])
+            self._virtual_time[priority] = self._pass[priority][tier]
+            self._pass[priority][tier] += 1.0 / self.tier_weights[tier]
+            return self._queues[priority][tier].popleft()
+        return None
+
+    def _dispatch(self):
+        while self.in_flight < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if waiter.future.done():
+                continue
+            self.in_flight += 1
+            waiter.future.set_result(waiter.ticket)
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queued": {priority: self.queue_depth(priority) for priority in PRIORITIES},
+            "avg_service_seconds": round(self._service_time, 3)
+        }
+
+    def register_metrics(self):
+        """Expose queue depth and in-flight gauges for this scheduler on /metrics."""
+        metrics_registry.gauge(
+            "support_admission_queue_depth", "Requests waiting for admission by priority.", ("priority",),
+            callback=lambda: {priority: self.queue_depth(priority) for priority in PRIORITIES}
+        )
+        metrics_registry.gauge(
+            "support_admission_in_flight", "Requests currently admitted.",
+            callback=lambda: {(): self.in_flight}
+        )
@@ -0,0 +1,236 @@
+import asyncio
+import os
+import queue
+import threading
+from contextlib import asynccontextmanager, contextmanager
+
+
+class AgentPoolExhausted(RuntimeError):
+    """Raised when no pooled agent becomes available within the lease timeout."""
+
+
+class AgentPool:
+    """
+    Process-wide pool of MagenticOneAgent instances.
+
+    The first agent built by the pool owns the project client and credential;
+    every other pooled instance shares that client and the same remote agent
+    definition, so requests only pay for their own thread and run.
+    """
+
+    default_size = 4
+
+    def __init__(self, agent_factory, size: int = None, warm_up: bool = None, lease_timeout: float = None):
+        self.agent_factory = agent_factory
+        self.size = size or int(os.environ.get("AGENT_POOL_SIZE", str(self.default_size)))
+        if warm_up is None:
+            warm_up = os.environ.get("AGENT_POOL_WARMUP", "true").lower() in ("1", "true", "yes")
+        self.warm_up = warm_up
+        if lease_timeout is None:
+            lease_timeout = float(os.environ.get("AGENT_POOL_LEASE_TIMEOUT", "30"))
+        self.lease_timeout = lease_timeout
+
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._primary = None
+        self._agents = []
+        self._agent_definition = None
+        self._started = False
+        self._last_error = None
+
+        self.leases = 0
+        self.lease_waits = 0
+        self.lease_timeouts = 0
+
+    def start(self):
+        """Create the shared client and pooled agents, warming up the remote agent if configured."""
+        with self._lock:
+            if self._started:
+                return
+            try:
+                self._primary = self.agent_factory()
+                self._agents = [self._primary]
+                for _ in range(self.size - 1):
+                    self._agents.append(self.agent_factory(project_client=self._primary.project_client))
+                for agent in self._agents:
+                    self._idle.put(agent)
+                self._started = True
+                self._last_error = None
+            except Exception as e:
+                self._last_error = str(e)
+                raise
+
+        if self.warm_up:
+            self._ensure_agent_definition()
+        print(f"Agent pool started with {self.size} agents")
+
+    def _ensure_agent_definition(self):
+        """Create (once) the remote agent definition shared by every pooled agent."""
+        with self._lock:
+            if self._agent_definition is None:
+                try:
+                    self._agent_definition = self._primary.initialize_agent()
+                    self._last_error = None
+                except Exception as e:
+                    self._last_error = str(e)
+                    raise
+            return self._agent_definition
+
+    @contextmanager
+    def lease(self, ensure_definition: bool = True):
+        """
+        Lease a pooled agent for the duration of one request.
+
+        With ensure_definition=False the remote agent definition is not created
+        if it is missing, for requests answered without the backend.
+        """
+        if not self._started:
+            self.start()
+        agent_definition = self._ensure_agent_definition() if ensure_definition else self._agent_definition
+
+        try:
+            agent = self._idle.get_nowait()
+        except queue.Empty:
+            self.lease_waits += 1
+            try:
+                agent = self._idle.get(timeout=self.lease_timeout)
+            except queue.Empty:
+                self.lease_timeouts += 1
+                raise AgentPoolExhausted(
+                    f"No agent available after {self.lease_timeout}s (pool size {self.size})"
+                )
+
+        self.leases += 1
+        agent.agent = agent_definition
+        try:
+            yield agent
+        finally:
+            agent.reset_session()
+            self._idle.put(agent)
+
+    @property
+    def agent_client(self):
+        """Agents client shared by the pooled agents, once the pool has started."""
+        return self._primary.agent_client if self._primary is not None else None
+
+    def health(self):
+        """Report pool state for the health endpoint."""
+        idle = self._idle.qsize() if self._idle is not None else 0
+        return {
+            "started": self._started,
+            "size": self.size,
+            "idle": idle,
+            "in_use": len(self._agents) - idle if self._started else 0,
+            "agent_id": self._agent_definition.id if self._agent_definition else None,
+            "leases": self.leases,
+            "lease_waits": self.lease_waits,
+            "lease_timeouts": self.lease_timeouts,
+            "last_error": self._last_error
+        }
+
+    def close(self):
+        """Release the shared client owned by the primary agent."""
+        with self._lock:
+            if self._primary is not None:
+                self._primary.cleanup()
+            self._primary = None
+            self._agents = []
+            self._idle = queue.Queue()
+            self._agent_definition = None
+            self._started = False
+
+
+class AsyncAgentPool(AgentPool):
+    """
+    AgentPool for AsyncMagenticOneAgent.
+
+    Pooled async agents are cheap (they share one client), so the default size is
+    large and effectively caps how many runs one worker keeps in flight.
+    """
+
+    default_size = 128
+
+    def __init__(self, agent_factory, size: int = None, warm_up: bool = None, lease_timeout: float = None):
+        super().__init__(agent_factory, size, warm_up, lease_timeout)
+        # Created lazily so they bind to the server's running event loop.
+        self._idle = None
+        self._async_lock = None
+
+    def _ensure_primitives(self):
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+            self._idle = asyncio.Queue()
+
+    async def start(self):
+        """Create the shared client and pooled agents, warming up the remote agent if configured."""
+        self._ensure_primitives()
+        async with self._async_lock:
+            if self._started:
+                return
+            try:
+                self._primary = self.agent_factory()
+                self._agents = [self._primary]
+                for _ in range(self.size - 1):
+                    self._agents.append(self.agent_factory(project_client=self._primary.project_client))
+                for agent in self._agents:
+                    self._idle.put_nowait(agent)
+                self._started = True
+                self._last_error = None
+            except Exception as e:
+                self._last_error = str(e)
+                raise
+
+        if self.warm_up:
+            await self._ensure_agent_definition()
+        print(f"Async agent pool started with {self.size} agents")
+
+    async def _ensure_agent_definition(self):
+        """Create (once) the remote agent definition shared by every pooled agent."""
+        async with self._async_lock:
+            if self._agent_definition is None:
+                try:
+                    self._agent_definition = await self._primary.initialize_agent()
+                    self._last_error = None
+                except Exception as e:
+                    self._last_error = str(e)
+                    raise
+            return self._agent_definition
+
+    @asynccontextmanager
+    async def lease(self, ensure_definition: bool = True):
+        """Lease a pooled agent for the duration of one request; see AgentPool.lease."""
+        if not self._started:
+            await self.start()
+        agent_definition = await self._ensure_agent_definition() if ensure_definition else self._agent_definition
+
+        try:
+            agent = self._idle.get_nowait()
+        except asyncio.QueueEmpty:
+            self.lease_waits += 1
+            try:
+                agent = await asyncio.wait_for(self._idle.get(), timeout=self.lease_timeout)
+            except asyncio.TimeoutError:
+                self.lease_timeouts += 1
+                raise AgentPoolExhausted(
+                    f"No agent available after {self.lease_timeout}s (pool size {self.size})"
+                )
+
+        self.leases += 1
+        agent.agent = agent_definition
+        try:
+            yield agent
+        finally:
+            agent.reset_session()
+            self._idle.put_nowait(agent)
+
+    async def close(self):
+        """Release the shared client owned by the primary agent."""
+        self._ensure_primitives()
+        async with self._async_lock:
+            if self._primary is not None:
+                await self._primary.cleanup()
+            self._primary = None
+            self._agents = []
+            self._idle = asyncio.Queue()
+            self._agent_definition = None
+            self._started = False
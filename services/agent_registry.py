@@ -0,0 +1,282 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+DEFINITION_HASH_KEY = "definition_hash"
+# Pause between attempts to take the cache file lock from a coroutine.
+LOCK_RETRY_SECONDS = 0.05
+
+
+class AgentRegistry:
+    """
+    Reuses remote agent definitions keyed by a hash of (model, instructions, tools).
+
+    Agent IDs are persisted in a local JSON cache so restarts and sibling workers
+    skip `create_agent` entirely. The hash is also stored in the remote agent's
+    metadata, which lets a cold cache recover an existing agent instead of
+    creating a duplicate. With a shared state store (see services.state) the
+    cache lives there instead, so workers on other hosts reuse the IDs too.
+    """
+
+    def __init__(self, agent_client, cache_path: str = None, store=None):
+        self.agent_client = agent_client
+        self.cache_path = cache_path or os.environ.get("AGENT_REGISTRY_PATH", ".agent_registry.json")
+        self.store = store
+        # Keyed by the cache file name so fake-backend IDs stay apart from real ones.
+        self._store_key = f"agent_registry:{os.path.basename(self.cache_path)}"
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def definition_key(model: str, instructions: str, tools: list = None):
+        """Stable hash identifying an agent definition."""
+        payload = json.dumps(
+            {"model": model, "instructions": instructions, "tools": tools or []},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_or_create(self, model: str, name: str, instructions: str, tools: list = None):
+        """Return an existing agent for this definition, creating it only when none exists."""
+        key = self.definition_key(model, instructions, tools)
+
+        with self._lock, self._shared_lock():
+            entries = self._load()
+            entry = entries.get(key)
+            if entry:
+                agent = self._get_remote(entry["agent_id"])
+                if agent is not None:
+                    if self._supersede(entries, key, name):
+                        self._save(entries)
+                    return agent
+                entries.pop(key)
+
+            agent = self._find_remote(name, key)
+            if agent is None:
+                agent = self.agent_client.create_agent(
+                    model=model,
+                    name=name,
+                    instructions=instructions,
+                    tools=tools or [],
+                    tool_resources=None,
+                    metadata={DEFINITION_HASH_KEY: key}
+                )
+                print(f"Created agent definition {agent.id} for hash {key[:12]}")
+
+            self._supersede(entries, key, name)
+            entries[key] = {"agent_id": agent.id, "name": name, "model": model, "updated_at": time.time()}
+            self._save(entries)
+            return agent
+
+    @staticmethod
+    def _supersede(entries: dict, key: str, name: str):
+        """Drop the entries of earlier definitions of the named agent; returns whether any were dropped."""
+        superseded = [other for other, entry in entries.items() if other != key and entry.get("name") == name]
+        for other in superseded:
+            del entries[other]
+        return bool(superseded)
+
+    def known_agent_ids(self):
+        """Agent IDs currently referenced by the local cache."""
+        return {entry["agent_id"] for entry in self._load().values()}
+
+    def collect_garbage(self, name: str, dry_run: bool = False):
+        """
+        Delete remote agents with the given name that the cache no longer references.
+
+        Registering a definition drops the entries of earlier definitions
+        with the same name, so only the current definition's agent is kept.
+
+        Returns the IDs that were (or, with dry_run, would be) deleted.
+        """
+        keep = self.known_agent_ids()
+        stale = [
+            agent.id for agent in self.agent_client.list_agents()
+            if agent.name == name and agent.id not in keep
+        ]
+        if not dry_run:
+            for agent_id in stale:
+                self.agent_client.delete_agent(agent_id)
+        return stale
+
+    def _get_remote(self, agent_id: str):
+        try:
+            return self.agent_client.get_agent(agent_id)
+        except Exception:
+            # Deleted out of band or not visible to this project; recreate.
+            return None
+
+    def _find_remote(self, name: str, key: str):
+        for agent in self.agent_client.list_agents():
+            metadata = getattr(agent, "metadata", None) or {}
+            if agent.name == name and metadata.get(DEFINITION_HASH_KEY) == key:
+                return agent
+        return None
+
+    def _load(self):
+        if self.store is not None:
+            return self.store.get(self._store_key) or {}
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, entries: dict):
+        if self.store is not None:
+            self.store.set(self._store_key, entries)
+            return
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.cache_path)
+
+    @contextmanager
+    def _shared_lock(self):
+        """Serialize lookups across worker processes sharing the cache."""
+        if self.store is not None:
+            with self.store.lock(self._store_key, ttl=120):
+                yield
+            return
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.cache_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class AsyncAgentRegistry(AgentRegistry):
+    """AgentRegistry for the async agents client; shares the same on-disk cache."""
+
+    def __init__(self, agent_client, cache_path: str = None, store=None):
+        super().__init__(agent_client, cache_path, store)
+        self._async_lock = None
+
+    @asynccontextmanager
+    async def _shared_alock(self):
+        """
+        _shared_lock() for coroutines. The cache file lock is tried without
+        blocking and retried after a short sleep, so a sibling worker holding
+        it never stalls the event loop.
+        """
+        if self.store is not None:
+            async with self.store.alock(self._store_key, ttl=120):
+                yield
+            return
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.cache_path}.lock", "a") as lock_file:
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    await asyncio.sleep(LOCK_RETRY_SECONDS)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    async def get_or_create(self, model: str, name: str, instructions: str, tools: list = None):
+        """Return an existing agent for this definition, creating it only when none exists."""
+        key = self.definition_key(model, instructions, tools)
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+
+        async with self._async_lock, self._shared_alock():
+            # The cache is a file or a state store round trip; read and write it off the loop.
+            entries = await asyncio.to_thread(self._load)
+            entry = entries.get(key)
+            if entry:
+                agent = await self._get_remote(entry["agent_id"])
+                if agent is not None:
+                    if self._supersede(entries, key, name):
+                        await asyncio.to_thread(self._save, entries)
+                    return agent
+                entries.pop(key)
+
+            agent = await self._find_remote(name, key)
+            if agent is None:
+                agent = await self.agent_client.create_agent(
+                    model=model,
+                    name=name,
+                    instructions=instructions,
+                    tools=tools or [],
+                    tool_resources=None,
+                    metadata={DEFINITION_HASH_KEY: key}
+                )
+                print(f"Created agent definition {agent.id} for hash {key[:12]}")
+
+            self._supersede(entries, key, name)
+            entries[key] = {"agent_id": agent.id, "name": name, "model": model, "updated_at": time.time()}
+            await asyncio.to_thread(self._save, entries)
+            return agent
+
+    async def collect_garbage(self, name: str, dry_run: bool = False):
+        """Delete remote agents with the given name that the cache no longer references."""
+        keep = await asyncio.to_thread(self.known_agent_ids)
+        stale = []
+        async for agent in self.agent_client.list_agents():
+            if agent.name == name and agent.id not in keep:
+                stale.append(agent.id)
+        if not dry_run:
+            for agent_id in stale:
+                await self.agent_client.delete_agent(agent_id)
+        return stale
+
+    async def _get_remote(self, agent_id: str):
+        try:
+            return await self.agent_client.get_agent(agent_id)
+        except Exception:
+            return None
+
+    async def _find_remote(self, name: str, key: str):
+        async for agent in self.agent_client.list_agents():
+            metadata = getattr(agent, "metadata", None) or {}
+            if agent.name == name and metadata.get(DEFINITION_HASH_KEY) == key:
+                return agent
+        return None
+
+
+def main():
+    """Command line entry point: `python -m services.agent_registry gc [--dry-run]`."""
+    parser = argparse.ArgumentParser(description="Manage cached Lumen agent definitions")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    gc_parser = subparsers.add_parser("gc", help="Delete stale remote agents not referenced by the cache")
+    gc_parser.add_argument("--name", default="lumen-customer-support-agent")
+    gc_parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    from magentic_one_agent import MagenticOneAgent
+
+    agent = MagenticOneAgent()
+    try:
+        # Make sure the current definition is registered so it is never collected.
+        agent.initialize_agent()
+        stale = agent.agent_registry.collect_garbage(args.name, dry_run=args.dry_run)
+        action = "Would delete" if args.dry_run else "Deleted"
+        print(f"{action} {len(stale)} stale agents")
+        for agent_id in stale:
+            print(f"- {agent_id}")
+    finally:
+        agent.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+BATCH_ITEM_FIELDS = {
+    "query": ("query",),
+    "technical": ("technical_issue",),
+    "scaling": ("partner_profile",)
+}
+
+
+class BatchItemError(ValueError):
+    """Raised when a batch item has an unknown type or is missing fields."""
+
+
+def validate_batch_item(item: dict):
+    """Check that a batch item has a known type and its required fields."""
+    item_type = item.get("type")
+    if item_type not in BATCH_ITEM_FIELDS:
+        raise BatchItemError(f"Unknown batch item type: {item_type!r}")
+    missing = [field for field in BATCH_ITEM_FIELDS[item_type] if not item.get(field)]
+    if missing:
+        raise BatchItemError(f"Batch item of type '{item_type}' is missing {', '.join(missing)}")
+
+
+class BatchJobStore:
+    """
+    Persists a batch job's items as one JSON file and its per-item results as
+    an append-only JSON-lines file next to it, so an interrupted batch can be
+    resumed from its job ID and recording a result costs one short append.
+    """
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or os.environ.get("BATCH_JOB_DIR", ".batch_jobs")
+        self._lock = threading.Lock()
+
+    def _path(self, job_id: str, suffix: str = ".json"):
+        if not job_id or not all(c.isalnum() or c in "-_" for c in job_id):
+            raise KeyError(job_id)
+        return os.path.join(self.directory, f"{job_id}{suffix}")
+
+    def create(self, items: list):
+        job_id = uuid.uuid4().hex
+        self._write({
+            "job_id": job_id,
+            "created_at": time.time(),
+            "items": items,
+            "results": [None] * len(items)
+        })
+        return job_id
+
+    def load(self, job_id: str):
+        """Stored job state with the latest result of each item, or None for an unknown job."""
+        try:
+            with open(self._path(job_id), "r") as f:
+                job = json.load(f)
+        except (KeyError, FileNotFoundError):
+            return None
+        try:
+            with open(self._path(job_id, ".results.jsonl"), "r") as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash; that item is simply run again.
+                        continue
+                    job["results"][result["index"]] = result
+        except FileNotFoundError:
+            pass
+        return job
+
+    def save_result(self, job_id: str, index: int, result: dict):
+        """Append one item's result; later lines for the same index replace earlier ones."""
+        line = json.dumps({**result, "index": index}) + "\n"
+        with self._lock:
+            with open(self._path(job_id, ".results.jsonl"), "a") as f:
+                f.write(line)
+
+    def _write(self, job: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(job["job_id"])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, path)
+
+
+def _prepare(items: list, store: BatchJobStore, job_id: str = None):
+    """Resolve the job to run, returning (job_id, items, previous results)."""
+    if job_id:
+        job = store.load(job_id)
+        if job is None:
+            raise KeyError(f"Unknown batch job: {job_id}")
+        if items and items != job["items"]:
+            raise BatchItemError("Items do not match the batch being resumed")
+        return job_id, job["items"], job["results"]
+
+    for item in items:
+        validate_batch_item(item)
+    return store.create(items), items, [None] * len(items)
+
+
+def _result(index: int, item: dict, started: float, response: str = None, error: Exception = None):
+    return {
+        "index": index,
+        "type": item.get("type"),
+        "status": "error" if error is not None else "success",
+        "response": response,
+        "error": str(error) if error is not None else None,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def _summary(job_id: str, results: list, resumed: int):
+    failed = sum(1 for result in results if result["status"] != "success")
+    return {
+        "job_id": job_id,
+        "status": "completed" if failed == 0 else "partial",
+        "total": len(results),
+        "failed": failed,
+        "resumed": resumed,
+        "results": results
+    }
+
+
+def run_batch(items: list, handler, max_concurrency: int = 4, store: BatchJobStore = None, job_id: str = None):
+    """
+    Run batch items through handler(item) on a bounded thread pool.
+
+    Results come back in input order; items that already succeeded in a
+    resumed job are not run again.
+    """
+    store = store or BatchJobStore()
+    job_id, items, previous = _prepare(items, store, job_id)
+    results = list(previous)
+    pending = [i for i, result in enumerate(results) if not result or result["status"] != "success"]
+
+    def run_one(index):
+        started = time.perf_counter()
+        try:
+            result = _result(index, items[index], started, response=handler(items[index]))
+        except Exception as e:
+            result = _result(index, items[index], started, error=e)
+        store.save_result(job_id, index, result)
+        results[index] = result
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        list(executor.map(run_one, pending))
+
+    return _summary(job_id, results, len(items) - len(pending))
+
+
+async def run_batch_async(items: list, handler, max_concurrency: int = 8, store: BatchJobStore = None, job_id: str = None):
+    """Async counterpart of run_batch; handler is a coroutine function. Job files are written off the event loop."""
+    store = store or BatchJobStore()
+    job_id, items, previous = await asyncio.to_thread(_prepare, items, store, job_id)
+    results = list(previous)
+    pending = [i for i, result in enumerate(results) if not result or result["status"] != "success"]
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(index):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result = _result(index, items[index], started, response=await handler(items[index]))
+            except Exception as e:
+                result = _result(index, items[index], started, error=e)
+            await asyncio.to_thread(store.save_result, job_id, index, result)
+            results[index] = result
+
+    await asyncio.gather(*(run_one(index) for index in pending))
+
+    return _summary(job_id, results, len(items) - len(pending))
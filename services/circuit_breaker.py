@@ -0,0 +1,167 @@
+import os
+import threading
+import time
+from collections import deque
+
+from services.metrics import registry as metrics_registry
+
+
+CIRCUIT_STATES = ("closed", "half_open", "open")
+
+circuit_transitions = metrics_registry.counter(
+    "support_circuit_transitions",
+    "Circuit breaker state changes by the state entered.",
+    ("state",)
+)
+degraded_responses = metrics_registry.counter(
+    "support_degraded_responses",
+    "Requests answered without the agent backend while the circuit was open, by source (stale, canned).",
+    ("source",)
+)
+
+
+class CircuitBreaker:
+    """
+    Fails fast while the agent backend is unhealthy.
+
+    Closed: calls go through and their outcomes are kept for `window`
+    seconds. Once at least min_calls were seen and the share of failures
+    reaches failure_rate, or the share of calls slower than slow_call_seconds
+    reaches slow_call_rate, the circuit opens.
+
+    Open: allow() returns False, so callers answer from a degraded path
+    instead of waiting on the backend, for open_seconds.
+
+    Half-open: up to half_open_trials calls are let through as probes. If
+    they all succeed the circuit closes; any failure opens it again.
+
+    State is per process; every worker trips on what it sees.
+    """
+
+    def __init__(self, failure_rate: float = None, slow_call_rate: float = None, slow_call_seconds: float = None,
+                 min_calls: int = None, window: float = None, open_seconds: float = None,
+                 half_open_trials: int = None, enabled: bool = None):
+        if enabled is None:
+            enabled = os.environ.get("CIRCUIT_BREAKER_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.failure_rate = failure_rate if failure_rate is not None else float(os.environ.get("CIRCUIT_FAILURE_RATE", "0.5"))
+        self.slow_call_rate = (slow_call_rate if slow_call_rate is not None
+                               else float(os.environ.get("CIRCUIT_SLOW_CALL_RATE", "0.8")))
+        self.slow_call_seconds = (slow_call_seconds if slow_call_seconds is not None
+                                  else float(os.environ.get("CIRCUIT_SLOW_CALL_SECONDS", "60")))
+        self.min_calls = min_calls if min_calls is not None else int(os.environ.get("CIRCUIT_MIN_CALLS", "10"))
+        self.window = window if window is not None else float(os.environ.get("CIRCUIT_WINDOW", "60"))
+        self.open_seconds = open_seconds if open_seconds is not None else float(os.environ.get("CIRCUIT_OPEN_SECONDS", "30"))
+        self.half_open_trials = (half_open_trials if half_open_trials is not None
+                                 else int(os.environ.get("CIRCUIT_HALF_OPEN_TRIALS", "3")))
+
+        self.state = "closed"
+        self._calls = deque()
+        self._opened_at = None
+        self._trials = 0
+        self._trial_successes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _transition(self, state: str, now: float):
+        """Caller holds self._lock."""
+        self.state = state
+        self._calls.clear()
+        self._trials = self._trial_successes = 0
+        self._opened_at = now if state == "open" else None
+        circuit_transitions.inc(state=state)
+        print(f"Agent backend circuit {state.replace('_', '-')}")
+
+    def allow(self):
+        """Whether a call may go to the backend now; every allowed call must be followed by record()."""
+        if not self.enabled:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            if self.state == "open":
+                if now - self._opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self._transition("half_open", now)
+            if self.state == "half_open":
+                if self._trials >= self.half_open_trials:
+                    self.rejected += 1
+                    return False
+                self._trials += 1
+            return True
+
+    def is_open(self):
+        """Whether allow() would turn a call away now; unlike allow(), takes no half-open probe."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self.state == "open":
+                return time.monotonic() - self._opened_at < self.open_seconds
+            return self.state == "half_open" and self._trials >= self.half_open_trials
+
+    def record(self, success, seconds: float = None):
+        """
+        Outcome of an allowed call. success=None (e.g. the call was shed by a
+        local quota) frees a half-open probe without counting either way.
+        """
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        slow = seconds is not None and seconds >= self.slow_call_seconds
+        with self._lock:
+            if self.state == "half_open":
+                if success is None:
+                    self._trials = max(0, self._trials - 1)
+                elif not success or slow:
+                    self._transition("open", now)
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.half_open_trials:
+                        self._transition("closed", now)
+                return
+            if self.state == "open" or success is None:
+                return
+            self._calls.append((now, bool(success), slow))
+            while self._calls and self._calls[0][0] <= now - self.window:
+                self._calls.popleft()
+            if len(self._calls) < self.min_calls:
+                return
+            failures = sum(1 for _, ok, _ in self._calls if not ok)
+            slow_calls = sum(1 for _, _, was_slow in self._calls if was_slow)
+            if failures / len(self._calls) >= self.failure_rate or slow_calls / len(self._calls) >= self.slow_call_rate:
+                self._transition("open", now)
+
+    def retry_after(self):
+        """Seconds until the circuit lets a probe through, 0 when not open."""
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._calls)
+            failures = sum(1 for _, ok, _ in self._calls if not ok)
+            state = self.state
+            rejected = self.rejected
+        return {
+            "enabled": self.enabled,
+            "state": state,
+            "recent_calls": calls,
+            "recent_failure_rate": round(failures / calls, 4) if calls else 0.0,
+            "rejected": rejected,
+            "retry_after_seconds": round(self.retry_after(), 3)
+        }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_circuit_breaker():
+    """Process-wide breaker around the agent backend, configured from CIRCUIT_* variables."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = CircuitBreaker()
+        return _default
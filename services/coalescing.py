@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+
+from services.metrics import registry as metrics_registry
+
+
+coalesced_requests = metrics_registry.counter(
+    "support_coalesced_requests",
+    "Requests answered by sharing another request's in-flight run (runs saved)."
+)
+
+
+def coalescing_key(prompt: str, scope: str = "default"):
+    """Identical rendered prompts in the same cache scope share a run."""
+    return hashlib.sha256(f"{scope}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "finished_at", "followers", "event", "future")
+
+    def __init__(self):
+        self.done = False
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.followers = 0
+        self.event = None
+        self.future = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one execution.
+
+    The first caller (the leader) runs the function; callers arriving while it
+    is in flight, or within `window` seconds after it succeeded, receive the
+    same result instead of starting another run. Failures are shared with the
+    callers already waiting but never kept for late arrivals.
+    """
+
+    def __init__(self, window: float = None):
+        self.window = window if window is not None else float(os.environ.get("COALESCE_WINDOW", "0"))
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def _join_or_lead(self, key: str):
+        """Return (call, is_leader) for a key; caller holds self._lock."""
+        now = time.monotonic()
+        call = self._calls.get(key)
+        if call is not None and (not call.done or now - call.finished_at <= self.window):
+            call.followers += 1
+            self.coalesced += 1
+            coalesced_requests.inc()
+            return call, False
+        self._prune(now)
+        call = self._calls[key] = self._new_call()
+        self.leaders += 1
+        return call, True
+
+    def _new_call(self):
+        call = _Call()
+        call.event = threading.Event()
+        return call
+
+    def _prune(self, now: float):
+        expired = [key for key, call in self._calls.items() if call.done and now - call.finished_at > self.window]
+        for key in expired:
+            del self._calls[key]
+
+    def _finish(self, key: str, call: _Call, result=None, error: BaseException = None):
+        with self._lock:
+            call.done = True
+            call.result = result
+            call.error = error
+            call.finished_at = time.monotonic()
+            if (error is not None or self.window <= 0) and self._calls.get(key) is call:
+                del self._calls[key]
+
+    def do(self, key: str, fn):
+        """Run fn() once per key in flight; returns (result, shared)."""
+        with self._lock:
+            call, leader = self._join_or_lead(key)
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, call, error=e)
+            call.event.set()
+            raise
+        self._finish(key, call, result=result)
+        call.event.set()
+        return result, False
+
+    def stats(self):
+        with self._lock:
+            in_flight = sum(1 for call in self._calls.values() if not call.done)
+        return {
+            "window_seconds": self.window,
+            "in_flight": in_flight,
+            "leaders": self.leaders,
+            "coalesced": self.coalesced
+        }
+
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight for coroutines on one event loop."""
+
+    def _new_call(self):
+        call = _Call()
+        call.future = asyncio.get_running_loop().create_future()
+        return call
+
+    async def do(self, key: str, fn):
+        """Await fn() once per key in flight; returns (result, shared)."""
+        with self._lock:
+            call, leader = self._join_or_lead(key)
+        if not leader:
+            # shield: one follower going away must not cancel the shared result.
+            return await asyncio.shield(call.future), True
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            error = RuntimeError("The shared run was cancelled by the request that started it")
+            self._finish(key, call, error=error)
+            self._settle(call.future, error=error)
+            raise
+        except Exception as e:
+            self._finish(key, call, error=e)
+            self._settle(call.future, error=e)
+            raise
+        self._finish(key, call, result=result)
+        self._settle(call.future, result=result)
+        return result, False
+
+    @staticmethod
+    def _settle(future, result=None, error: BaseException = None):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+            # Mark retrieved so a leader without followers does not log "never retrieved".
+            future.exception()
+        else:
+            future.set_result(result)
+
+
+def _coalescing_enabled():
+    return os.environ.get("COALESCE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+_default = None
+_default_async = None
+_default_lock = threading.Lock()
+
+
+def get_coalescer():
+    """Process-wide SingleFlight for the sync agent, or None when COALESCE_ENABLED is false."""
+    global _default
+    if not _coalescing_enabled():
+        return None
+    with _default_lock:
+        if _default is None:
+            _default = SingleFlight()
+        return _default
+
+
+def get_async_coalescer():
+    """Process-wide AsyncSingleFlight for the async agent, or None when COALESCE_ENABLED is false."""
+    global _default_async
+    if not _coalescing_enabled():
+        return None
+    with _default_lock:
+        if _default_async is None:
+            _default_async = AsyncSingleFlight()
+        return _default_async
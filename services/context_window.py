@@ -0,0 +1,233 @@
+import asyncio
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from services.metrics import registry as metrics_registry
+from services.state import get_shared_store
+from services.token_budget import estimate_tokens
+
+
+CONTEXT_STRATEGIES = ("none", "truncate", "summarize")
+
+prompt_tokens = metrics_registry.histogram(
+    "support_prompt_tokens",
+    "Prompt tokens processed per run (reported usage, or the local estimate when the service reports none).",
+    ("strategy",),
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+)
+summaries = metrics_registry.counter(
+    "support_context_summaries",
+    "Times older turns of a session thread were folded into a summary message."
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def _first_sentences(text: str, max_chars: int):
+    """Leading sentences of text, cut at a sentence or word boundary within max_chars."""
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    ends = [match.start() for match in _SENTENCE_END.finditer(cut)]
+    if ends:
+        return cut[:ends[-1]]
+    return cut.rsplit(" ", 1)[0] + " ..."
+
+
+def summarize_turns(turns: list, previous_summary: str = None, max_tokens: int = 400):
+    """
+    Compact extractive summary of (question, answer) turns.
+
+    The most recent turns keep the most detail; older ones are shortened
+    until the summary fits max_tokens. Runs locally, without a model call.
+    """
+    header = "Summary of the earlier conversation in this support session:"
+    for chars in (600, 300, 160, 80):
+        lines = [header]
+        if previous_summary:
+            lines.append(f"- Earlier: {_first_sentences(previous_summary.split(':', 1)[-1], chars)}")
+        for number, (question, answer) in enumerate(turns, 1):
+            lines.append(f"- Q{number}: {_first_sentences(question, chars)}")
+            lines.append(f"  A{number}: {_first_sentences(answer, chars)}")
+        summary = "\n".join(lines)
+        if estimate_tokens(summary) <= max_tokens:
+            return summary
+    # Still too long: keep only the most recent turns.
+    while len(lines) > 3 and estimate_tokens("\n".join(lines)) > max_tokens:
+        del lines[1:3]
+    return "\n".join(lines)
+
+
+class _ThreadContext:
+    __slots__ = ("turns", "summary", "tokens", "messages")
+
+    def __init__(self, turns: list = None, summary: str = None, tokens: int = 0, messages: int = 0):
+        self.turns = turns or []
+        self.summary = summary
+        self.tokens = tokens
+        self.messages = messages
+
+    def as_dict(self):
+        return {"turns": self.turns, "summary": self.summary, "tokens": self.tokens, "messages": self.messages}
+
+
+class ContextWindow:
+    """
+    Keeps long session threads from growing the prompt of every run.
+
+    Strategies (CONTEXT_STRATEGY):
+    - "none": the service sees the whole thread, as before.
+    - "truncate": runs only read the last `last_messages` messages.
+    - "summarize": once a thread's estimated history passes
+      max_session_tokens, the turns so far are folded into one summary
+      message and later runs only read from that summary on.
+
+    max_prompt_tokens, when set, is also passed to every run as a hard cap.
+    Per-thread bookkeeping is kept for the most recent max_threads threads.
+    With "summarize" and a shared state store, each thread's turns and
+    summary are also kept in the store under its thread ID for state_ttl
+    seconds, so a follow-up answered by another worker continues them.
+    The *_async variants then run in a worker thread, off the event loop.
+    """
+
+    def __init__(self, strategy: str = None, max_session_tokens: int = None, last_messages: int = None,
+                 summary_tokens: int = None, max_prompt_tokens: int = None, max_threads: int = 10000,
+                 store=None, state_ttl: float = None):
+        self.strategy = (strategy or os.environ.get("CONTEXT_STRATEGY", "none")).lower()
+        if self.strategy not in CONTEXT_STRATEGIES:
+            raise ValueError(f"Unknown CONTEXT_STRATEGY '{self.strategy}'; expected one of {CONTEXT_STRATEGIES}")
+        self.max_session_tokens = max_session_tokens or int(os.environ.get("CONTEXT_MAX_SESSION_TOKENS", "6000"))
+        self.last_messages = last_messages or int(os.environ.get("CONTEXT_LAST_MESSAGES", "10"))
+        self.summary_tokens = summary_tokens or int(os.environ.get("CONTEXT_SUMMARY_TOKENS", "400"))
+        max_prompt = max_prompt_tokens or os.environ.get("CONTEXT_MAX_PROMPT_TOKENS")
+        self.max_prompt_tokens = int(max_prompt) if max_prompt else None
+        self.max_threads = max_threads
+        # Only the summarize strategy reads its bookkeeping back when building runs.
+        self.store = store if self.strategy == "summarize" else None
+        self.state_ttl = state_ttl or float(os.environ.get("SESSION_IDLE_TTL", "1800"))
+        self._threads = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _store_key(thread_id: str):
+        return f"context_window:{thread_id}"
+
+    def _context(self, thread_id: str):
+        """Caller holds self._lock."""
+        if self.store is not None:
+            saved = self.store.get(self._store_key(thread_id))
+            context = self._threads[thread_id] = _ThreadContext(**saved) if saved else _ThreadContext()
+        else:
+            context = self._threads.get(thread_id)
+            if context is None:
+                context = self._threads[thread_id] = _ThreadContext()
+        while len(self._threads) > self.max_threads:
+            self._threads.popitem(last=False)
+        self._threads.move_to_end(thread_id)
+        return context
+
+    def _save(self, thread_id: str, context: _ThreadContext):
+        """Caller holds self._lock."""
+        if self.store is not None:
+            self.store.set(self._store_key(thread_id), context.as_dict(), ttl=self.state_ttl)
+
+    def before_turn(self, thread_id: str, prompt: str):
+        """
+        Summary message to post before the prompt, or None.
+
+        Only returns one with the "summarize" strategy, when the thread's
+        history plus the new prompt would pass max_session_tokens.
+        """
+        if self.strategy != "summarize":
+            return None
+        with self._lock:
+            context = self._context(thread_id)
+            if not context.turns or context.tokens + estimate_tokens(prompt) <= self.max_session_tokens:
+                return None
+            summary = summarize_turns(context.turns, context.summary, self.summary_tokens)
+            context.turns = []
+            context.summary = summary
+            context.tokens = estimate_tokens(summary)
+            context.messages = 1
+            self._save(thread_id, context)
+        summaries.inc()
+        return summary
+
+    def run_options(self, thread_id: str):
+        """Keyword arguments for runs.create/stream once the prompt has been posted."""
+        options = {}
+        if self.max_prompt_tokens:
+            options["max_prompt_tokens"] = self.max_prompt_tokens
+        if self.strategy == "truncate":
+            options["truncation_strategy"] = {"type": "last_messages", "last_messages": self.last_messages}
+        elif self.strategy == "summarize":
+            with self._lock:
+                context = self._context(thread_id)
+                if context.summary is not None:
+                    # The summary, the turns after it and the prompt just posted.
+                    options["truncation_strategy"] = {"type": "last_messages", "last_messages": context.messages + 1}
+        return options
+
+    def after_turn(self, thread_id: str, prompt: str, answer: str, run=None):
+        """Record a finished turn and the prompt tokens its run processed."""
+        usage = getattr(run, "usage", None)
+        processed = getattr(usage, "prompt_tokens", None)
+        with self._lock:
+            context = self._context(thread_id)
+            context.turns.append((prompt, answer or ""))
+            context.tokens += estimate_tokens(prompt) + estimate_tokens(answer or "")
+            context.messages += 2
+            self._save(thread_id, context)
+            if processed is None:
+                processed = context.tokens
+        prompt_tokens.observe(processed, strategy=self.strategy)
+
+    def forget(self, thread_id: str):
+        with self._lock:
+            self._threads.pop(thread_id, None)
+            if self.store is not None:
+                self.store.delete(self._store_key(thread_id))
+
+    async def _off_loop(self, method, *args):
+        """Run method in a worker thread when it uses the shared store, else inline."""
+        if self.store is None:
+            return method(*args)
+        return await asyncio.to_thread(method, *args)
+
+    async def before_turn_async(self, thread_id: str, prompt: str):
+        return await self._off_loop(self.before_turn, thread_id, prompt)
+
+    async def run_options_async(self, thread_id: str):
+        return await self._off_loop(self.run_options, thread_id)
+
+    async def after_turn_async(self, thread_id: str, prompt: str, answer: str, run=None):
+        await self._off_loop(self.after_turn, thread_id, prompt, answer, run)
+
+    async def forget_async(self, thread_id: str):
+        await self._off_loop(self.forget, thread_id)
+
+    def stats(self):
+        with self._lock:
+            tokens = [context.tokens for context in self._threads.values()]
+        return {
+            "strategy": self.strategy,
+            "threads": len(tokens),
+            "max_thread_tokens": max(tokens, default=0),
+            "summaries": summaries.value()
+        }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_context_window():
+    """Process-wide ContextWindow configured from CONTEXT_* variables."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ContextWindow(store=get_shared_store())
+        return _default
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from services.metrics import registry as metrics_registry, TimedCredential, AsyncTimedCredential
+
+
+# Same shape as azure.core.credentials.AccessToken, which is all the SDK's
+# bearer token policy reads; used for tokens loaded from the shared file.
+CachedAccessToken = namedtuple("CachedAccessToken", ["token", "expires_on"])
+
+token_requests = metrics_registry.counter(
+    "support_credential_tokens",
+    "Access tokens handed to the SDK by source (memory, file, chain).",
+    ("source",)
+)
+chain_walks = metrics_registry.counter(
+    "support_credential_chain_walks",
+    "Times the credential chain was asked for a new token, by result and trigger.",
+    ("result", "trigger")
+)
+
+
+class _TokenFile:
+    """
+    Tokens shared between uvicorn workers on one host, in a JSON file readable
+    only by the service user and guarded by an flock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def get(self, key: str):
+        with self._file_lock():
+            entry = self._load().get(key)
+        if entry is None:
+            return None
+        return CachedAccessToken(entry["token"], int(entry["expires_on"]))
+
+    def put(self, key: str, token):
+        with self._file_lock():
+            entries = {
+                name: entry for name, entry in self._load().items()
+                if entry["expires_on"] > time.time()
+            }
+            entries[key] = {"token": token.token, "expires_on": int(token.expires_on)}
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class _TokenCache:
+    """Token bookkeeping shared by the sync and async credentials."""
+
+    def __init__(self, credential, refresh_margin: float = None, min_validity: float = 30.0, cache_path: str = None):
+        self._credential = credential
+        self.refresh_margin = refresh_margin if refresh_margin is not None else float(
+            os.environ.get("CREDENTIAL_REFRESH_MARGIN", "300")
+        )
+        self.min_validity = min_validity
+        cache_path = cache_path or os.environ.get("CREDENTIAL_CACHE_PATH")
+        self._file = _TokenFile(cache_path) if cache_path else None
+        self._tokens = {}
+        self._refreshing = set()
+        self.chain_walks = 0
+
+    @staticmethod
+    def _key(scopes: tuple, kwargs: dict):
+        return "|".join(sorted(scopes)) + f"#{kwargs.get('tenant_id') or ''}#{bool(kwargs.get('enable_cae'))}"
+
+    def _usable(self, token):
+        return token is not None and token.expires_on - time.time() > self.min_validity
+
+    def _due(self, token):
+        return token.expires_on - time.time() < self.refresh_margin
+
+    def _lookup(self, key: str):
+        """Cached token that is still usable, and where it came from; prefers a newer one from another worker."""
+        token = self._tokens.get(key)
+        source = "memory" if self._usable(token) else None
+        if self._file is not None and (source is None or self._due(token)):
+            shared = self._file.get(key)
+            if self._usable(shared) and (source is None or shared.expires_on > token.expires_on):
+                self._tokens[key] = token = shared
+                source = "file"
+        return (token, source) if source else (None, None)
+
+    def _remember(self, key: str, token):
+        self._tokens[key] = token
+        if self._file is not None:
+            self._file.put(key, token)
+
+    def stats(self):
+        now = time.time()
+        return {
+            "cached_scopes": len(self._tokens),
+            "seconds_to_expiry": min((round(t.expires_on - now) for t in self._tokens.values()), default=None),
+            "chain_walks": self.chain_walks,
+            "shared_file": self._file.path if self._file is not None else None
+        }
+
+
+class SharedCredential(_TokenCache):
+    """
+    Caching front for an azure-identity credential, shared by every agent in
+    the process.
+
+    Tokens are reused until refresh_margin seconds before expiry, at which
+    point a background thread fetches the next one while callers keep using
+    the current token; the chain is only walked inline when nothing usable is
+    cached. With CREDENTIAL_CACHE_PATH set, tokens are also shared with the
+    other workers on the host. Requests carrying a claims challenge always
+    go to the chain.
+    """
+
+    def __init__(self, credential, **kwargs):
+        super().__init__(credential, **kwargs)
+        self._lock = threading.Lock()
+
+    def get_token(self, *scopes, **kwargs):
+        key = self._key(scopes, kwargs)
+        if kwargs.get("claims"):
+            return self._fetch(key, scopes, kwargs, "claims")
+        token, source = self._lookup(key)
+        if token is None:
+            with self._lock:
+                token, source = self._lookup(key)
+                if token is None:
+                    token, source = self._fetch(key, scopes, kwargs, "miss"), "chain"
+        elif self._due(token):
+            self._refresh_in_background(key, scopes, kwargs)
+        token_requests.inc(source=source)
+        return token
+
+    def _fetch(self, key: str, scopes: tuple, kwargs: dict, trigger: str):
+        try:
+            token = self._credential.get_token(*scopes, **kwargs)
+        except Exception:
+            chain_walks.inc(result="error", trigger=trigger)
+            raise
+        chain_walks.inc(result="ok", trigger=trigger)
+        self.chain_walks += 1
+        self._remember(key, token)
+        return token
+
+    def _refresh_in_background(self, key: str, scopes: tuple, kwargs: dict):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self._fetch(key, scopes, kwargs, "refresh")
+            except Exception as e:
+                # The current token is still valid; the next call retries.
+                print(f"Background token refresh failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="credential-refresh", daemon=True).start()
+
+    def close(self):
+        self._credential.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncSharedCredential(_TokenCache):
+    """
+    SharedCredential for azure.identity.aio credentials; refreshes run as
+    event loop tasks. The shared token file and its flock are only touched
+    from worker threads, so a sibling worker holding the lock never stalls
+    the event loop.
+    """
+
+    def __init__(self, credential, **kwargs):
+        super().__init__(credential, **kwargs)
+        self._lock = None
+        self._tasks = set()
+
+    async def get_token(self, *scopes, **kwargs):
+        key = self._key(scopes, kwargs)
+        if kwargs.get("claims"):
+            return await self._fetch(key, scopes, kwargs, "claims")
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        token, source = await self._lookup_async(key)
+        if token is None:
+            async with self._lock:
+                token, source = await self._lookup_async(key)
+                if token is None:
+                    token, source = await self._fetch(key, scopes, kwargs, "miss"), "chain"
+        elif self._due(token) and key not in self._refreshing:
+            self._refreshing.add(key)
+            task = asyncio.get_running_loop().create_task(self._refresh(key, scopes, kwargs))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        token_requests.inc(source=source)
+        return token
+
+    async def _fetch(self, key: str, scopes: tuple, kwargs: dict, trigger: str):
+        try:
+            token = await self._credential.get_token(*scopes, **kwargs)
+        except Exception:
+            chain_walks.inc(result="error", trigger=trigger)
+            raise
+        chain_walks.inc(result="ok", trigger=trigger)
+        self.chain_walks += 1
+        await self._remember_async(key, token)
+        return token
+
+    async def _lookup_async(self, key: str):
+        token = self._tokens.get(key)
+        if self._file is None or (self._usable(token) and not self._due(token)):
+            return self._lookup(key)
+        return await asyncio.to_thread(self._lookup, key)
+
+    async def _remember_async(self, key: str, token):
+        self._tokens[key] = token
+        if self._file is not None:
+            await asyncio.to_thread(self._file.put, key, token)
+
+    async def _refresh(self, key: str, scopes: tuple, kwargs: dict):
+        try:
+            await self._fetch(key, scopes, kwargs, "refresh")
+        except Exception as e:
+            print(f"Background token refresh failed: {e}")
+        finally:
+            self._refreshing.discard(key)
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self._credential.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+
+_default = None
+_default_async = None
+_default_lock = threading.Lock()
+
+
+def get_credential():
+    """Process-wide SharedCredential over DefaultAzureCredential for the sync agent."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            from azure.identity import DefaultAzureCredential
+            _default = SharedCredential(TimedCredential(DefaultAzureCredential()))
+        return _default
+
+
+def get_async_credential():
+    """Process-wide AsyncSharedCredential over the aio DefaultAzureCredential for the async agent."""
+    global _default_async
+    with _default_lock:
+        if _default_async is None:
+            from azure.identity.aio import DefaultAzureCredential as AsyncDefaultAzureCredential
+            _default_async = AsyncSharedCredential(AsyncTimedCredential(AsyncDefaultAzureCredential()))
+        return _default_async
+
+
+def credential_stats():
+    """Stats of the async credential, or None if no Azure client has been created."""
+    return _default_async.stats() if _default_async is not None else None
+
+
+async def close_async_credential():
+    global _default_async
+    with _default_lock:
+        credential, _default_async = _default_async, None
+    if credential is not None:
+        await credential.close()
@@ -0,0 +1,359 @@
+import asyncio
+import http.client
+import ipaddress
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+
+from services.metrics import registry as metrics_registry
+
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+job_outcomes = metrics_registry.counter(
+    "support_jobs",
+    "Background jobs by final status.",
+    ("status",)
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    webhook_url TEXT,
+    webhook_status TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+_PUBLIC_FIELDS = (
+    "id", "type", "status", "result", "error", "webhook_status", "attempts",
+    "created_at", "started_at", "finished_at"
+)
+
+
+def _allowed_webhook_hosts():
+    """Hosts from JOB_WEBHOOK_ALLOWED_HOSTS; when set, webhooks may only go to these."""
+    hosts = os.environ.get("JOB_WEBHOOK_ALLOWED_HOSTS", "")
+    return {host.strip().lower() for host in hosts.split(",") if host.strip()}
+
+
+def _check_webhook_address(address: str, url: str):
+    """Reject loopback, private, link-local (cloud metadata) and other non-public addresses."""
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if getattr(ip, "ipv4_mapped", None):
+        ip = ip.ipv4_mapped
+    if not ip.is_global or ip.is_multicast:
+        raise ValueError(f"Webhook URL {url!r} resolves to a non-public address ({ip})")
+
+
+def validate_webhook_url(url: str):
+    """
+    Webhooks must be absolute http(s) URLs on a public host.
+
+    With JOB_WEBHOOK_ALLOWED_HOSTS set, the host must be one of those (which
+    may then be internal); otherwise every address the host resolves to must
+    be public, so job results cannot be sent to the server's own network.
+    Returns whether the host was allowlisted.
+    """
+    parsed = urllib.parse.urlparse(url or "")
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError(f"Invalid webhook URL: {url!r}")
+    host = parsed.hostname.lower()
+    allowed = _allowed_webhook_hosts()
+    if allowed:
+        if host not in allowed:
+            raise ValueError(f"Webhook host {host!r} is not in JOB_WEBHOOK_ALLOWED_HOSTS")
+        return True
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Could not resolve webhook host {host!r}: {e}")
+    for address in addresses:
+        _check_webhook_address(address, url)
+    return False
+
+
+class _PublicPeerMixin:
+    """Re-check the connected address, so a host re-resolving after validation cannot reach internal addresses."""
+
+    def connect(self):
+        super().connect()
+        try:
+            _check_webhook_address(self.sock.getpeername()[0], self.host)
+        except ValueError:
+            self.sock.close()
+            raise
+
+
+class _PublicHTTPConnection(_PublicPeerMixin, http.client.HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicPeerMixin, http.client.HTTPSConnection):
+    pass
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req)
+
+
+class _NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """Redirects are errors: a webhook could otherwise bounce the POST to an internal address."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def _webhook_opener(allowlisted: bool):
+    """Opener that never follows redirects or proxies and, unless allowlisted, only connects to public addresses."""
+    handlers = [urllib.request.ProxyHandler({}), _NoRedirectHandler()]
+    if not allowlisted:
+        handlers += [_PublicHTTPHandler(), _PublicHTTPSHandler()]
+    return urllib.request.build_opener(*handlers)
+
+
+class JobStore:
+    """
+    SQLite-backed job records, so queued and finished jobs survive restarts and
+    are visible to every worker on the host.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.environ.get("JOB_DB_PATH", ".jobs.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def create(self, job_type: str, payload: dict, webhook_url: str = None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, type, payload, status, webhook_url, webhook_status, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (job_id, job_type, json.dumps(payload), webhook_url, "pending" if webhook_url else None, now, now)
+        )
+        return self.get(job_id)
+
+    def get(self, job_id: str, public: bool = False):
+        """Job record as a dict, or None for an unknown job."""
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        if public:
+            return {field: job[field] for field in _PUBLIC_FIELDS}
+        return job
+
+    def claim(self, job_id: str, owner: str):
+        """Atomically move a queued job to running; False if another worker got it first."""
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE jobs SET status = 'running', owner = ?, attempts = attempts + 1, started_at = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'queued'",
+            (owner, now, now, job_id)
+        )
+        return cursor.rowcount == 1
+
+    def requeue(self, job_id: str):
+        self._execute(
+            "UPDATE jobs SET status = 'queued', owner = NULL, updated_at = ? WHERE id = ?",
+            (time.time(), job_id)
+        )
+
+    def finish(self, job_id: str, result: str = None, error: str = None):
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, updated_at = ? WHERE id = ?",
+            ("failed" if error is not None else "succeeded", result, error, now, now, job_id)
+        )
+
+    def set_webhook_status(self, job_id: str, status: str):
+        self._execute("UPDATE jobs SET webhook_status = ?, updated_at = ? WHERE id = ?", (status, time.time(), job_id))
+
+    def recover(self, stale_after: float):
+        """Requeue running jobs whose worker stopped updating them; returns queued job IDs, oldest first."""
+        self._execute(
+            "UPDATE jobs SET status = 'queued', owner = NULL WHERE status = 'running' AND updated_at < ?",
+            (time.time() - stale_after,)
+        )
+        rows = self._execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at").fetchall()
+        return [row["id"] for row in rows]
+
+    def touch(self, job_id: str):
+        self._execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time(), job_id))
+
+    def counts(self):
+        rows = self._execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({row["status"]: row["n"] for row in rows})
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobRunner:
+    """
+    Runs stored jobs in the background with at most max_concurrency at a time.
+
+    handler(job) is a coroutine function returning the job's text result. If it
+    raises an error carrying a retry_after hint (admission or rate limiting),
+    the job goes back to the queue and is retried after that delay, up to
+    max_attempts. Jobs left behind by a stopped worker are picked up again on
+    start().
+    """
+
+    def __init__(self, store: JobStore, handler, max_concurrency: int = None, max_attempts: int = None,
+                 stale_after: float = None, heartbeat_interval: float = 30.0):
+        self.store = store
+        self.handler = handler
+        self.max_concurrency = max_concurrency or int(os.environ.get("JOB_MAX_CONCURRENCY", "4"))
+        self.max_attempts = max_attempts or int(os.environ.get("JOB_MAX_ATTEMPTS", "5"))
+        self.stale_after = stale_after or float(os.environ.get("JOB_STALE_SECONDS", "600"))
+        self.heartbeat_interval = heartbeat_interval
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._semaphore = None
+        self._tasks = set()
+        self.running = 0
+
+    def _spawn(self, job_id: str, delay: float = 0):
+        task = asyncio.get_running_loop().create_task(self._run(job_id, delay))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def start(self):
+        """Resume jobs that were queued or interrupted before this worker started."""
+        self._semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+        for job_id in self.store.recover(self.stale_after):
+            self._spawn(job_id)
+
+    def submit(self, job_type: str, payload: dict, webhook_url: str = None):
+        """Store a job and schedule it; returns the queued job record."""
+        if webhook_url:
+            validate_webhook_url(webhook_url)
+        return self._enqueue(job_type, payload, webhook_url)
+
+    async def submit_async(self, job_type: str, payload: dict, webhook_url: str = None):
+        """submit() that resolves the webhook host in a worker thread instead of on the loop."""
+        if webhook_url:
+            await asyncio.to_thread(validate_webhook_url, webhook_url)
+        return self._enqueue(job_type, payload, webhook_url)
+
+    def _enqueue(self, job_type: str, payload: dict, webhook_url: str = None):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+        job = self.store.create(job_type, payload, webhook_url)
+        self._spawn(job["id"])
+        return job
+
+    async def _heartbeat(self, job_id: str):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            self.store.touch(job_id)
+
+    async def _run(self, job_id: str, delay: float = 0):
+        if delay:
+            await asyncio.sleep(delay)
+        async with self._semaphore:
+            if not self.store.claim(job_id, self.owner):
+                return
+            job = self.store.get(job_id)
+            self.running += 1
+            heartbeat = asyncio.get_running_loop().create_task(self._heartbeat(job_id))
+            try:
+                result = await self.handler(job)
+            except asyncio.CancelledError:
+                # Shutting down: leave it for the next worker to resume.
+                self.store.requeue(job_id)
+                raise
+            except Exception as e:
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is not None and job["attempts"] < self.max_attempts:
+                    self.store.requeue(job_id)
+                    self._spawn(job_id, retry_after)
+                    return
+                self.store.finish(job_id, error=str(e))
+            else:
+                self.store.finish(job_id, result=result)
+            finally:
+                heartbeat.cancel()
+                self.running -= 1
+
+        job = self.store.get(job_id)
+        job_outcomes.inc(status=job["status"])
+        if job["webhook_url"]:
+            await self._deliver_webhook(job)
+
+    async def _deliver_webhook(self, job: dict, attempts: int = 3):
+        """POST the public job record to its webhook, retrying with backoff."""
+        # Checked again at delivery: the host may resolve differently by now.
+        try:
+            allowlisted = await asyncio.to_thread(validate_webhook_url, job["webhook_url"])
+            opener = _webhook_opener(allowlisted)
+        except ValueError as e:
+            print(f"Webhook for job {job['id']} not delivered: {e}")
+            self.store.set_webhook_status(job["id"], "failed")
+            return
+        body = json.dumps(self.store.get(job["id"], public=True)).encode("utf-8")
+        request = urllib.request.Request(
+            job["webhook_url"], data=body, method="POST",
+            headers={"Content-Type": "application/json", "User-Agent": "lumen-support-jobs"}
+        )
+        for attempt in range(attempts):
+            try:
+                response = await asyncio.to_thread(opener.open, request, timeout=10)
+                response.close()
+                self.store.set_webhook_status(job["id"], "delivered")
+                return
+            except Exception as e:
+                print(f"Webhook delivery for job {job['id']} failed: {e}")
+                if attempt + 1 < attempts:
+                    await asyncio.sleep(2 ** attempt)
+        self.store.set_webhook_status(job["id"], "failed")
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "jobs": self.store.counts()
+        }
+
+    async def close(self):
+        """Cancel in-flight jobs; they are requeued and resumed by the next worker start."""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,310 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover - optional dependency
+    trace = None
+
+
+# Seconds; spans sub-10ms cache hits up to multi-minute runs.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0, 120.0, 300.0)
+
+
+def _label_key(labelnames: tuple, labels: dict):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _format_labels(labelnames: tuple, key: tuple, extra: str = ""):
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, key)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    """Value that can go up and down, or be read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+    def samples(self):
+        if self.callback is not None:
+            for key, value in sorted(self.callback().items()):
+                key = key if isinstance(key, tuple) else (key,)
+                yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            return
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus exposition model."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        with self._lock:
+            series = self._series.get(_label_key(self.labelnames, labels))
+            return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+class MetricsRegistry:
+    """Holds the process's metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = (), callback=None):
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "support_stage_duration_seconds",
+    "Time spent in each stage of handling a support request.",
+    ("stage",)
+)
+stage_errors = registry.counter(
+    "support_stage_errors",
+    "Stages that raised an exception.",
+    ("stage",)
+)
+run_status = registry.counter(
+    "support_runs",
+    "Agent runs by terminal status.",
+    ("status",)
+)
+cache_lookups = registry.counter(
+    "support_cache_lookups",
+    "Response cache lookups by result (exact, shared, similar, miss, bypass).",
+    ("result",)
+)
+http_seconds = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route and status code.",
+    ("method", "route", "status")
+)
+
+
+_tracer = None
+
+
+def configure_tracing(service_name: str = "lumen-support-api"):
+    """
+    Export stage spans over OTLP when METRICS_OTEL_ENABLED is true.
+
+    Needs the optional opentelemetry-sdk and opentelemetry-exporter-otlp
+    packages; the collector address comes from the standard
+    OTEL_EXPORTER_OTLP_ENDPOINT variable (default http://localhost:4317).
+    Returns whether tracing was enabled.
+    """
+    global _tracer
+    if os.environ.get("METRICS_OTEL_ENABLED", "false").lower() != "true":
+        return False
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    except ImportError:
+        print("METRICS_OTEL_ENABLED is set but the OpenTelemetry SDK/exporter is not installed")
+        return False
+
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("lumen.support")
+    return True
+
+
+def shutdown_tracing():
+    global _tracer
+    if _tracer is not None and trace is not None:
+        provider = trace.get_tracer_provider()
+        if hasattr(provider, "shutdown"):
+            provider.shutdown()
+    _tracer = None
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """
+    Time a stage of the request path into support_stage_duration_seconds.
+
+    Works around awaits inside async code as well, and opens an OpenTelemetry
+    span of the same name when tracing is configured.
+    """
+    span = _tracer.start_as_current_span(f"support.{name}", attributes=attributes) if _tracer else None
+    if span is not None:
+        span.__enter__()
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        stage_errors.inc(stage=name)
+        if span is not None:
+            span.__exit__(type(e), e, e.__traceback__)
+            span = None
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, stage=name)
+        if span is not None:
+            span.__exit__(None, None, None)
+
+
+class TimedCredential:
+    """Proxy for an azure-identity credential that times token acquisition as the "credential" stage."""
+
+    def __init__(self, credential):
+        self._credential = credential
+
+    def get_token(self, *scopes, **kwargs):
+        with stage("credential"):
+            return self._credential.get_token(*scopes, **kwargs)
+
+    def _timed(self, method):
+        def timed(*args, **kwargs):
+            with stage("credential"):
+                return method(*args, **kwargs)
+        return timed
+
+    def __getattr__(self, name):
+        # get_token_info is only proxied when the wrapped credential has it, so
+        # azure-core's capability check still sees the real credential.
+        attribute = getattr(self._credential, name)
+        return self._timed(attribute) if name == "get_token_info" else attribute
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._credential.close()
+
+
+class AsyncTimedCredential(TimedCredential):
+    """TimedCredential for azure.identity.aio credentials."""
+
+    async def get_token(self, *scopes, **kwargs):
+        with stage("credential"):
+            return await self._credential.get_token(*scopes, **kwargs)
+
+    def _timed(self, method):
+        async def timed(*args, **kwargs):
+            with stage("credential"):
+                return await method(*args, **kwargs)
+        return timed
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._credential.close()
@@ -0,0 +1,202 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from services.metrics import registry as metrics_registry
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+
+response_bytes = metrics_registry.counter(
+    "support_response_body_bytes",
+    "JSON response body bytes sent, by content encoding (identity, gzip, br).",
+    ("encoding",)
+)
+
+
+def encode_json(content):
+    """
+    Compact UTF-8 JSON bytes, through orjson when it is installed. Falls back
+    to the standard encoder for what orjson refuses (e.g. lone surrogates).
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(content)
+        except TypeError:
+            pass
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _accepted_encodings(accept_encoding: str):
+    """{coding: q} from an Accept-Encoding header."""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate_encoding(accept_encoding: str, available: tuple = None):
+    """
+    The content coding to answer with, or None for identity.
+
+    Picks the client's highest-q coding among `available` (br before gzip on
+    a tie); "*" covers codings the header does not name.
+    """
+    if available is None:
+        available = ("br", "gzip") if brotli is not None else ("gzip",)
+    accepted = _accepted_encodings(accept_encoding)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def etag_matches(if_none_match: str, etag: str):
+    """
+    Whether an If-None-Match header value names etag.
+
+    Uses the weak comparison HTTP specifies for If-None-Match, so a W/
+    prefix added by a proxy still matches, and "*" matches anything.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseEncoder:
+    """
+    Serializes trusted JSON responses straight to bytes and compresses
+    bodies of at least min_bytes with the best coding the client accepts.
+
+    Brotli is offered only when the `brotli` package is installed. Levels
+    favour speed, since answers are compressed once per request.
+    """
+
+    def __init__(self, min_bytes: int = None, gzip_level: int = None, brotli_quality: int = None, enabled: bool = None):
+        if enabled is None:
+            enabled = os.environ.get("RESPONSE_COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.min_bytes = min_bytes if min_bytes is not None else int(os.environ.get("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+        self.gzip_level = gzip_level if gzip_level is not None else int(os.environ.get("RESPONSE_GZIP_LEVEL", "6"))
+        self.brotli_quality = (brotli_quality if brotli_quality is not None
+                               else int(os.environ.get("RESPONSE_BROTLI_QUALITY", "4")))
+
+    def compress(self, body: bytes, encoding: str):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        if encoding == "gzip":
+            # mtime=0 keeps the output stable for equal bodies.
+            return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        return body
+
+    def compresses(self, size: int):
+        """Whether a body of size bytes is compressed for clients that accept it."""
+        return self.enabled and size >= self.min_bytes
+
+    def encode(self, body: bytes, accept_encoding: str = None):
+        """(body, headers) for the wire; Vary is set whenever the answer depends on Accept-Encoding."""
+        if not self.compresses(len(body)):
+            response_bytes.inc(len(body), encoding="identity")
+            return body, {}
+        encoding = negotiate_encoding(accept_encoding)
+        headers = {"Vary": "Accept-Encoding"}
+        if encoding is not None:
+            body = self.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+        response_bytes.inc(len(body), encoding=encoding or "identity")
+        return body, headers
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "min_bytes": self.min_bytes,
+            "json_encoder": "orjson" if orjson is not None else "json",
+            "encodings": ["br", "gzip"] if brotli is not None else ["gzip"],
+            "bytes_sent": {encoding: response_bytes.value(encoding=encoding) for encoding in ("identity", "gzip", "br")}
+        }
+
+
+class PrecomputedPayload:
+    """
+    A static JSON body serialized once into immutable bytes, with a strong
+    ETag over those bytes, for endpoints whose content only changes on deploy.
+    Compressed variants are built on first request and kept.
+    """
+
+    __slots__ = ("body", "etag", "media_type", "cache_control", "_variants")
+
+    def __init__(self, content, max_age: int = 3600, media_type: str = "application/json"):
+        self.body = encode_json(content)
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.media_type = media_type
+        self.cache_control = f"public, max-age={max_age}"
+        self._variants = {}
+
+    def headers(self):
+        return {"ETag": self.etag, "Cache-Control": self.cache_control}
+
+    def not_modified(self, if_none_match: str = None):
+        """Whether the client's cached copy is current and a 304 can be sent instead of the body."""
+        return etag_matches(if_none_match, self.etag)
+
+    def encoded(self, encoder: ResponseEncoder, accept_encoding: str = None):
+        """
+        (body, headers) in the coding negotiated by encoder. The compressed
+        bytes of each coding are computed once; each variant gets its own
+        ETag so caches never mix them up, and If-None-Match should be
+        checked against the returned ETag.
+        """
+        if not encoder.compresses(len(self.body)):
+            return self.body, self.headers()
+        encoding = negotiate_encoding(accept_encoding)
+        if encoding is None:
+            return self.body, {**self.headers(), "Vary": "Accept-Encoding"}
+        variant = self._variants.get(encoding)
+        if variant is None:
+            variant = self._variants[encoding] = encoder.compress(self.body, encoding)
+        return variant, {
+            "ETag": f'{self.etag[:-1]}-{encoding}"',
+            "Cache-Control": self.cache_control,
+            "Content-Encoding": encoding,
+            "Vary": "Accept-Encoding"
+        }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_response_encoder():
+    """Process-wide ResponseEncoder configured from RESPONSE_COMPRESSION_* and level variables."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ResponseEncoder()
+        return _default
@@ -0,0 +1,316 @@
+import hashlib
+import itertools
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from services.state import get_shared_store
+
+
+_WHITESPACE = re.compile(r"\s+")
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_prompt(prompt: str):
+    """Canonical form of an enhanced prompt used as the exact-match cache key."""
+    return _WHITESPACE.sub(" ", prompt.strip().lower())
+
+
+class HashingEmbedder:
+    """
+    Dependency-free local embedding: word unigrams, bigrams and character
+    trigrams hashed into a fixed-size, L2-normalized vector. Good enough to
+    match reworded partner questions without calling a remote model.
+    """
+
+    def __init__(self, dimensions: int = 1024):
+        self.dimensions = dimensions
+
+    def _features(self, text: str):
+        words = _TOKEN.findall(text.lower())
+        for word in words:
+            yield word, 1.0
+            padded = f"#{word}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.5
+        for first, second in zip(words, words[1:]):
+            yield f"{first} {second}", 1.0
+
+    def __call__(self, text: str):
+        vector = [0.0] * self.dimensions
+        for feature, weight in self._features(text):
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[bucket] += sign * weight
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+
+def cosine_similarity(first, second):
+    """Cosine similarity of two L2-normalized vectors."""
+    return sum(a * b for a, b in zip(first, second))
+
+
+def sparse_vector(vector):
+    """(index, value) pairs of the non-zero components; hashed embeddings are mostly zeros."""
+    return tuple((index, value) for index, value in enumerate(vector) if value)
+
+
+def sparse_similarity(dense, sparse):
+    """Cosine similarity of a normalized dense vector and a normalized sparse_vector()."""
+    return sum(value * dense[index] for index, value in sparse)
+
+
+class _CacheEntry:
+    __slots__ = ("response", "expires_at", "embedding")
+
+    def __init__(self, response: str, expires_at: float, embedding):
+        self.response = response
+        self.expires_at = expires_at
+        self.embedding = embedding
+
+
+class ResponseCache:
+    """
+    Two-tier cache of formatted agent responses.
+
+    The exact tier matches the normalized enhanced prompt; the optional
+    similarity tier compares local embeddings within the same scope (partner
+    tier) and returns the closest entry above the threshold. Entries expire
+    after a TTL and the least recently used entry is evicted at capacity.
+
+    Entries are indexed per scope and a similarity lookup compares against
+    at most similarity_scan most recently used entries of its scope, so a
+    miss costs the same at any max_entries. Embeddings are computed before
+    the lock is taken and stored sparse.
+
+    With a shared state store, exact entries are also written there and a
+    local miss is looked up in it ("shared" tier), so an answer computed by
+    one worker is reused by the others.
+
+    Expired entries are kept for another stale_ttl seconds. lookup() never
+    returns them; lookup_stale() does, for answering while the agent
+    backend is unavailable.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600.0, similarity_threshold: float = 0.0, embedder=None,
+                 store=None, stale_ttl: float = 0.0, similarity_scan: int = 256):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder or (HashingEmbedder() if similarity_threshold > 0 else None)
+        self.similarity_scan = similarity_scan
+
+        self.store = store
+        self._entries = OrderedDict()
+        self._stale = OrderedDict()
+        # scope -> OrderedDict of that scope's keys in recency order, for the similarity tier.
+        self._scopes = {}
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.shared_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", "1000")),
+            ttl=float(os.environ.get("RESPONSE_CACHE_TTL", "3600")),
+            similarity_threshold=float(os.environ.get("RESPONSE_CACHE_SIMILARITY_THRESHOLD", "0")),
+            similarity_scan=int(os.environ.get("RESPONSE_CACHE_SIMILARITY_SCAN", "256")),
+            store=get_shared_store(),
+            stale_ttl=float(os.environ.get("RESPONSE_CACHE_STALE_TTL", "86400"))
+        )
+
+    @staticmethod
+    def _store_key(key: tuple):
+        return "response:" + hashlib.sha256("\0".join(key).encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, scope: str = "default"):
+        """
+        Return (response, tier) for a cached answer, or (None, "miss").
+
+        tier is "exact", "shared" or "similar".
+        """
+        key = (scope, normalize_prompt(prompt))
+        now = time.monotonic()
+        found = self._lookup_exact(key, now)
+        if found is None and self.store is not None:
+            found = self._shared_hit(key, self.store.get(self._store_key(key)))
+        return found or self._lookup_similar(key, now)
+
+    async def lookup_async(self, prompt: str, scope: str = "default"):
+        """lookup() for coroutines; the shared store is read in a worker thread."""
+        key = (scope, normalize_prompt(prompt))
+        now = time.monotonic()
+        found = self._lookup_exact(key, now)
+        if found is None and self.store is not None:
+            found = self._shared_hit(key, await self.store.get_async(self._store_key(key)))
+        return found or self._lookup_similar(key, now)
+
+    def _lookup_exact(self, key: tuple, now: float):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._touch(key)
+                    self.exact_hits += 1
+                    return entry.response, "exact"
+                self._expire(key)
+        return None
+
+    def _shared_hit(self, key: tuple, response):
+        """Keep an answer found in the shared store locally; None when there was none."""
+        if response is None:
+            return None
+        self._put_local(key, response)
+        with self._lock:
+            self.shared_hits += 1
+        return response, "shared"
+
+    def _lookup_similar(self, key: tuple, now: float):
+        embedding = self.embedder(key[1]) if self.embedder is not None else None
+        with self._lock:
+            if embedding is not None:
+                match = self._closest(key[0], embedding, now)
+                if match is not None:
+                    self._touch(match)
+                    self.similar_hits += 1
+                    return self._entries[match].response, "similar"
+
+            self.misses += 1
+            return None, "miss"
+
+    def lookup_stale(self, prompt: str, scope: str = "default"):
+        """Exact answer for the prompt even if expired within stale_ttl, or None."""
+        key = (scope, normalize_prompt(prompt))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key) or self._stale.get(key)
+            if entry is not None and entry.expires_at + self.stale_ttl > now:
+                return entry.response
+        return None
+
+    def _touch(self, key: tuple):
+        """Mark an entry most recently used. Caller holds self._lock."""
+        self._entries.move_to_end(key)
+        scope_keys = self._scopes.get(key[0])
+        if scope_keys is not None and key in scope_keys:
+            scope_keys.move_to_end(key)
+
+    def _unindex(self, key: tuple):
+        """Caller holds self._lock."""
+        scope_keys = self._scopes.get(key[0])
+        if scope_keys is not None:
+            scope_keys.pop(key, None)
+            if not scope_keys:
+                del self._scopes[key[0]]
+
+    def _expire(self, key: tuple):
+        """Move an expired entry to the stale tier. Caller holds self._lock."""
+        entry = self._entries.pop(key)
+        self._unindex(key)
+        self.expirations += 1
+        if self.stale_ttl > 0:
+            self._stale[key] = entry
+            self._stale.move_to_end(key)
+            while len(self._stale) > self.max_entries:
+                self._stale.popitem(last=False)
+
+    def get(self, prompt: str, scope: str = "default"):
+        """Cached response for the prompt, or None."""
+        return self.lookup(prompt, scope)[0]
+
+    def put(self, prompt: str, response: str, scope: str = "default"):
+        """Store a response for the prompt within a scope."""
+        key = (scope, normalize_prompt(prompt))
+        self._put_local(key, response)
+        if self.store is not None:
+            self.store.set(self._store_key(key), response, ttl=self.ttl)
+
+    async def put_async(self, prompt: str, response: str, scope: str = "default"):
+        """put() for coroutines; the shared store is written in a worker thread."""
+        key = (scope, normalize_prompt(prompt))
+        self._put_local(key, response)
+        if self.store is not None:
+            await self.store.set_async(self._store_key(key), response, ttl=self.ttl)
+
+    def _put_local(self, key: tuple, response: str):
+        embedding = sparse_vector(self.embedder(key[1])) if self.embedder is not None else None
+        with self._lock:
+            self._stale.pop(key, None)
+            self._entries[key] = _CacheEntry(response, time.monotonic() + self.ttl, embedding)
+            if embedding is not None:
+                self._scopes.setdefault(key[0], OrderedDict())[key] = None
+            self._touch(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._unindex(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stale.clear()
+            self._scopes.clear()
+
+    def _closest(self, scope: str, embedding, now: float):
+        """
+        Closest live entry of the scope above the threshold, among its
+        similarity_scan most recently used entries. Caller holds self._lock.
+        """
+        best_key, best_score = None, self.similarity_threshold
+        expired = []
+        for key in itertools.islice(reversed(self._scopes.get(scope, ())), self.similarity_scan):
+            entry = self._entries[key]
+            if entry.expires_at <= now:
+                expired.append(key)
+                continue
+            score = sparse_similarity(embedding, entry.embedding)
+            # Newest first, so on a tie the most recently used entry wins.
+            if score > best_score or (best_key is None and score >= best_score):
+                best_key, best_score = key, score
+        for key in expired:
+            self._expire(key)
+        return best_key
+
+    def stats(self):
+        """Hit/miss counters for health and metrics reporting."""
+        with self._lock:
+            hits = self.exact_hits + self.shared_hits + self.similar_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "stale_entries": len(self._stale),
+                "exact_hits": self.exact_hits,
+                "shared_hits": self.shared_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """Process-wide response cache, or None when RESPONSE_CACHE_ENABLED is false."""
+    global _default_cache
+    if os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache.from_env()
+        return _default_cache
@@ -0,0 +1,308 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+
+TERMINAL_RUN_STATUSES = {"completed", "failed", "cancelled", "expired", "incomplete", "requires_action"}
+
+# Poll cadence per technical-support urgency: critical runs are checked often,
+# low-priority runs back off quickly so they do not eat the shared poll budget.
+URGENCY_POLL_PROFILES = {
+    "critical": {"initial_interval": 0.2, "max_interval": 1.0, "max_polls": 900},
+    "high": {"initial_interval": 0.4, "max_interval": 2.0, "max_polls": 600},
+    "medium": {"initial_interval": 0.75, "max_interval": 4.0, "max_polls": 400},
+    "low": {"initial_interval": 1.0, "max_interval": 8.0, "max_polls": 240}
+}
+
+
+def _status_value(run):
+    status = getattr(run, "status", None)
+    return getattr(status, "value", status)
+
+
+def is_terminal(run):
+    """Whether a run has reached a status it will not leave on its own."""
+    return _status_value(run) in TERMINAL_RUN_STATUSES
+
+
+class PollRateLimiter:
+    """
+    Token bucket shared by every in-flight run in the process, so a burst of
+    long runs cannot flood the service with status calls.
+    """
+
+    def __init__(self, rate: float = None, burst: int = None):
+        self.rate = rate or float(os.environ.get("RUN_POLL_RATE_LIMIT", "20"))
+        self.burst = burst or int(os.environ.get("RUN_POLL_BURST", str(max(1, int(self.rate)))))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def _reserve(self):
+        """Take a token and return how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            self.throttled += 1
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+class PollingStrategy:
+    """Yields the delay before each status poll of a run."""
+
+    def delays(self, urgency: str = "medium"):
+        raise NotImplementedError
+
+
+class FixedIntervalPolling(PollingStrategy):
+    """Constant cadence, equivalent to the SDK's create_and_poll behaviour."""
+
+    def __init__(self, interval: float = 1.0, max_polls: int = 600):
+        self.interval = interval
+        self.max_polls = max_polls
+
+    def delays(self, urgency: str = "medium"):
+        for _ in range(self.max_polls):
+            yield self.interval
+
+
+class ExponentialBackoffPolling(PollingStrategy):
+    """
+    Exponential backoff with full jitter, starting from a per-urgency interval.
+
+    Short runs are picked up quickly while long runs settle at the profile's
+    maximum interval instead of being polled at a fixed high rate.
+    """
+
+    def __init__(self, multiplier: float = 1.6, jitter: float = 0.2, profiles: dict = None):
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.profiles = profiles or URGENCY_POLL_PROFILES
+
+    def delays(self, urgency: str = "medium"):
+        profile = self.profiles.get(urgency, self.profiles["medium"])
+        interval = profile["initial_interval"]
+        for _ in range(profile["max_polls"]):
+            spread = interval * self.jitter
+            yield max(0.0, interval + random.uniform(-spread, spread))
+            interval = min(profile["max_interval"], interval * self.multiplier)
+
+
+class PollStats:
+    """Poll calls and wall time spent waiting on a single run."""
+
+    def __init__(self, run_id: str, urgency: str):
+        self.run_id = run_id
+        self.urgency = urgency
+        self.polls = 0
+        self.waited = 0.0
+        self.status = None
+
+    def as_dict(self):
+        return {
+            "run_id": self.run_id,
+            "urgency": self.urgency,
+            "polls": self.polls,
+            "waited_seconds": round(self.waited, 3),
+            "status": self.status
+        }
+
+
+class PollMetrics:
+    """Process-wide counters of poll calls per run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.polls = 0
+        self.max_polls_per_run = 0
+        self.polls_by_urgency = {}
+
+    def record(self, stats: PollStats):
+        with self._lock:
+            self.runs += 1
+            self.polls += stats.polls
+            self.max_polls_per_run = max(self.max_polls_per_run, stats.polls)
+            self.polls_by_urgency[stats.urgency] = self.polls_by_urgency.get(stats.urgency, 0) + stats.polls
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "polls": self.polls,
+                "avg_polls_per_run": round(self.polls / self.runs, 2) if self.runs else 0.0,
+                "max_polls_per_run": self.max_polls_per_run,
+                "polls_by_urgency": dict(self.polls_by_urgency)
+            }
+
+
+poll_metrics = PollMetrics()
+default_rate_limiter = PollRateLimiter()
+
+
+def default_polling_strategy():
+    """Strategy selected by RUN_POLL_STRATEGY ("backoff" or "fixed")."""
+    if os.environ.get("RUN_POLL_STRATEGY", "backoff").lower() == "fixed":
+        return FixedIntervalPolling(float(os.environ.get("RUN_POLL_INTERVAL", "1.0")))
+    return ExponentialBackoffPolling()
+
+
+class RunPoller:
+    """Waits for a run to reach a terminal status using a polling strategy."""
+
+    def __init__(self, strategy: PollingStrategy = None, rate_limiter: PollRateLimiter = None, metrics: PollMetrics = None):
+        self.strategy = strategy or default_polling_strategy()
+        self.rate_limiter = rate_limiter or default_rate_limiter
+        self.metrics = metrics or poll_metrics
+
+    @staticmethod
+    def _bounded(delay: float, deadline: float = None):
+        """delay shortened to end at the deadline, or None once the deadline has passed."""
+        if deadline is None:
+            return delay
+        remaining = deadline - time.monotonic()
+        return min(delay, remaining) if remaining > 0 else None
+
+    def wait(self, run, get_run, urgency: str = "medium", deadline: float = None):
+        """
+        Poll get_run() until the run is terminal, the urgency's poll budget is
+        spent or the monotonic deadline passes.
+
+        Returns the latest run and its PollStats.
+        """
+        stats = PollStats(run.id, urgency)
+        started = time.monotonic()
+        for delay in self.strategy.delays(urgency):
+            if is_terminal(run):
+                break
+            delay = self._bounded(delay, deadline)
+            if delay is None:
+                break
+            time.sleep(delay)
+            self.rate_limiter.acquire()
+            run = get_run()
+            stats.polls += 1
+        return run, self._finish(stats, run, started)
+
+    async def wait_async(self, run, get_run, urgency: str = "medium", deadline: float = None):
+        """Async counterpart of wait(); get_run is a coroutine function."""
+        stats = PollStats(run.id, urgency)
+        started = time.monotonic()
+        for delay in self.strategy.delays(urgency):
+            if is_terminal(run):
+                break
+            delay = self._bounded(delay, deadline)
+            if delay is None:
+                break
+            await asyncio.sleep(delay)
+            await self.rate_limiter.acquire_async()
+            run = await get_run()
+            stats.polls += 1
+        return run, self._finish(stats, run, started)
+
+    @staticmethod
+    def _hedge_result(runs: list):
+        """(winner, others) once a run completed or every run is terminal, else None."""
+        for index, (run, _) in enumerate(runs):
+            if _status_value(run) == "completed":
+                return run, [other for position, (other, _) in enumerate(runs) if position != index]
+        if all(is_terminal(run) for run, _ in runs):
+            return runs[0][0], [run for run, _ in runs[1:]]
+        return None
+
+    def wait_hedged(self, run, get_run, start_hedge, hedge_after: float, urgency: str = "medium", deadline: float = None):
+        """
+        wait() that starts a second run when the first is still going after
+        hedge_after seconds and settles on whichever completes first.
+
+        start_hedge() starts the hedged run and returns (run, get_run) for it,
+        or None when no hedge should be started; the first run is then waited
+        on alone.
+        Returns the winning run (the first one if none completed), the other
+        runs, which may still be in flight, and the PollStats.
+        """
+        stats = PollStats(run.id, urgency)
+        started = time.monotonic()
+        runs = [(run, get_run)]
+        result = None
+        hedging = True
+        for delay in self.strategy.delays(urgency):
+            result = self._hedge_result(runs)
+            if result is not None:
+                break
+            if hedging and len(runs) == 1:
+                if time.monotonic() - started < hedge_after:
+                    delay = min(delay, started + hedge_after - time.monotonic())
+                else:
+                    hedge = start_hedge()
+                    hedging = hedge is not None
+                    if hedging:
+                        runs.append(hedge)
+                        continue
+            delay = self._bounded(delay, deadline)
+            if delay is None:
+                break
+            time.sleep(max(0.0, delay))
+            for index, (current, get_current) in enumerate(runs):
+                if not is_terminal(current):
+                    self.rate_limiter.acquire()
+                    runs[index] = (get_current(), get_current)
+                    stats.polls += 1
+        winner, others = result or self._hedge_result(runs) or (runs[0][0], [other for other, _ in runs[1:]])
+        return winner, others, self._finish(stats, winner, started)
+
+    async def wait_hedged_async(self, run, get_run, start_hedge, hedge_after: float, urgency: str = "medium",
+                                deadline: float = None):
+        """Async counterpart of wait_hedged(); get_run and start_hedge are coroutine functions."""
+        stats = PollStats(run.id, urgency)
+        started = time.monotonic()
+        runs = [(run, get_run)]
+        result = None
+        hedging = True
+        for delay in self.strategy.delays(urgency):
+            result = self._hedge_result(runs)
+            if result is not None:
+                break
+            if hedging and len(runs) == 1:
+                if time.monotonic() - started < hedge_after:
+                    delay = min(delay, started + hedge_after - time.monotonic())
+                else:
+                    hedge = await start_hedge()
+                    hedging = hedge is not None
+                    if hedging:
+                        runs.append(hedge)
+                        continue
+            delay = self._bounded(delay, deadline)
+            if delay is None:
+                break
+            await asyncio.sleep(max(0.0, delay))
+            for index, (current, get_current) in enumerate(runs):
+                if not is_terminal(current):
+                    await self.rate_limiter.acquire_async()
+                    runs[index] = (await get_current(), get_current)
+                    stats.polls += 1
+        winner, others = result or self._hedge_result(runs) or (runs[0][0], [other for other, _ in runs[1:]])
+        return winner, others, self._finish(stats, winner, started)
+
+    def _finish(self, stats: PollStats, run, started: float):
+        stats.waited = time.monotonic() - started
+        stats.status = _status_value(run)
+        self.metrics.record(stats)
+        return stats
@@ -0,0 +1,173 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from services.metrics import registry as metrics_registry
+from services.run_polling import is_terminal
+
+
+RUN_ENDPOINTS = ("query", "technical", "scaling")
+
+# Error codes of failed runs worth another attempt; everything else (content
+# filter, invalid prompt, ...) would fail the same way again. Throttled runs
+# are retried by the token budget loop instead.
+TRANSIENT_ERROR_CODES = {"server_error", "internal_error", "service_unavailable", "timeout", "gateway_timeout"}
+
+run_outcomes = metrics_registry.counter(
+    "support_run_outcomes",
+    "Agent run attempts by outcome (completed, incomplete, transient, failed, cancelled, timeout).",
+    ("endpoint", "outcome")
+)
+run_retries = metrics_registry.counter(
+    "support_run_retries",
+    "Runs restarted after a transient failure.",
+    ("endpoint",)
+)
+run_hedges = metrics_registry.counter(
+    "support_run_hedges",
+    "Hedged runs by result: started, won (answered first) or lost (cancelled).",
+    ("result",)
+)
+
+
+def _field(obj, name: str):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def classify_run(run):
+    """
+    Outcome of a run that is no longer being waited on.
+
+    - "completed": the run answered
+    - "incomplete": the run stopped early (e.g. a token limit) and may have a partial answer
+    - "transient": failed or expired for a reason a new run may not hit
+    - "failed": failed in a way a retry would repeat, or needs tool calls this agent does not make
+    - "cancelled": cancelled by someone else
+    - "timeout": still queued or in progress when its deadline or poll budget ran out
+    """
+    if run is None:
+        return "failed"
+    if not is_terminal(run):
+        return "timeout"
+    status = _field(run, "status")
+    status = getattr(status, "value", status)
+    if status in ("completed", "incomplete", "cancelled"):
+        return status
+    if status == "expired":
+        return "transient"
+    if status == "failed" and _field(_field(run, "last_error"), "code") in TRANSIENT_ERROR_CODES:
+        return "transient"
+    return "failed"
+
+
+class RunResilience:
+    """
+    Deadlines, retries and hedging for agent runs.
+
+    Every endpoint gets a deadline (RUN_DEADLINE_<ENDPOINT>, falling back to
+    RUN_DEADLINE) covering all attempts of one request; a run still going
+    when it passes is cancelled. Transient failures are retried up to
+    max_retries times with jittered exponential backoff while time remains.
+
+    For urgencies listed in RUN_HEDGE_URGENCIES a second run is started when
+    the first has not finished after the endpoint's recent p95 run time
+    (hedge_delay until enough runs were seen); the first to complete wins
+    and the other is cancelled.
+    """
+
+    def __init__(self, deadlines: dict = None, max_retries: int = None, retry_base_delay: float = None,
+                 retry_max_delay: float = None, hedge_urgencies: tuple = None, hedge_delay: float = None,
+                 hedge_quantile: float = 0.95, min_samples: int = 20, window: int = 200):
+        default_deadline = float(os.environ.get("RUN_DEADLINE", "120"))
+        self.deadlines = {
+            endpoint: float(os.environ.get(f"RUN_DEADLINE_{endpoint.upper()}", default_deadline))
+            for endpoint in RUN_ENDPOINTS
+        }
+        self.deadlines.update(deadlines or {})
+        self.max_retries = max_retries if max_retries is not None else int(os.environ.get("RUN_MAX_RETRIES", "2"))
+        self.retry_base_delay = (retry_base_delay if retry_base_delay is not None
+                                 else float(os.environ.get("RUN_RETRY_BASE_DELAY", "1")))
+        self.retry_max_delay = (retry_max_delay if retry_max_delay is not None
+                                else float(os.environ.get("RUN_RETRY_MAX_DELAY", "10")))
+        if hedge_urgencies is None:
+            hedge_urgencies = tuple(
+                urgency.strip().lower() for urgency in os.environ.get("RUN_HEDGE_URGENCIES", "").split(",")
+                if urgency.strip()
+            )
+        self.hedge_urgencies = tuple(hedge_urgencies)
+        self.hedge_delay = hedge_delay if hedge_delay is not None else float(os.environ.get("RUN_HEDGE_DELAY", "8"))
+        self.hedge_quantile = hedge_quantile
+        self.min_samples = min_samples
+        self._durations = {endpoint: deque(maxlen=window) for endpoint in RUN_ENDPOINTS}
+        self._lock = threading.Lock()
+
+    def deadline(self, endpoint: str = "query"):
+        """Monotonic time by which a request to endpoint must have its answer."""
+        return time.monotonic() + self.deadlines.get(endpoint, self.deadlines["query"])
+
+    def retry_delay(self, attempt: int, deadline: float):
+        """
+        Seconds to wait before retrying a transient failure, or None when
+        retries are used up or the wait would run past the deadline.
+        """
+        if attempt >= self.max_retries:
+            return None
+        delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+        if time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def record(self, endpoint: str, outcome: str, seconds: float = None):
+        """Count an attempt's outcome; completed run times feed the hedge delay."""
+        run_outcomes.inc(endpoint=endpoint, outcome=outcome)
+        if outcome == "completed" and seconds is not None:
+            with self._lock:
+                self._durations.setdefault(endpoint, deque(maxlen=200)).append(seconds)
+
+    def _quantile(self, endpoint: str):
+        """Caller holds self._lock."""
+        durations = sorted(self._durations.get(endpoint, ()))
+        if len(durations) < self.min_samples:
+            return None
+        return durations[min(len(durations) - 1, int(self.hedge_quantile * len(durations)))]
+
+    def hedge_after(self, endpoint: str, urgency: str):
+        """Seconds after which to start a hedged run, or None when this request is not hedged."""
+        if str(urgency).lower() not in self.hedge_urgencies:
+            return None
+        with self._lock:
+            quantile = self._quantile(endpoint)
+        return quantile if quantile is not None else self.hedge_delay
+
+    def stats(self):
+        with self._lock:
+            p95 = {endpoint: self._quantile(endpoint) for endpoint in self._durations}
+        return {
+            "deadlines": dict(self.deadlines),
+            "max_retries": self.max_retries,
+            "hedge_urgencies": list(self.hedge_urgencies),
+            "hedge_after_seconds": {
+                endpoint: round(value, 3) if value is not None else self.hedge_delay
+                for endpoint, value in p95.items()
+            },
+            "hedges": {result: run_hedges.value(result=result) for result in ("started", "won", "lost")}
+        }
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_run_resilience():
+    """Process-wide RunResilience configured from RUN_DEADLINE*, RUN_*RETRY* and RUN_HEDGE_* variables."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = RunResilience()
+        return _default
@@ -0,0 +1,451 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+
+from services.metrics import stage
+
+
+# A thread created by another worker, known only by its ID.
+SharedThread = namedtuple("SharedThread", ["id"])
+
+
+@asynccontextmanager
+async def _unlocked():
+    yield
+
+
+class _Session:
+    """A session key's remote thread plus the lock that serializes its runs."""
+
+    __slots__ = ("thread", "last_used", "in_use", "lock")
+
+    def __init__(self, lock):
+        self.thread = None
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self.lock = lock
+
+
+class _Claim:
+    """A held session key (None for a one-off request) and the thread resolved for it, if any."""
+
+    __slots__ = ("key", "session", "thread")
+
+    def __init__(self, key: str = None, session: _Session = None):
+        self.key = key
+        self.session = session
+        self.thread = None
+
+
+class SessionManager:
+    """
+    Maps partner/session keys to remote threads so follow-up questions reuse them.
+
+    Idle sessions expire after idle_ttl seconds and their threads are deleted in
+    the background. A small pool of empty threads is pre-created off the request
+    path; requests without a session key take one of those and the thread is
+    deleted once the request finishes.
+
+    claim() holds a key without touching its thread; thread_for() resolves the
+    thread only when a run needs it, so requests answered without a run (from
+    the response cache, say) never create one.
+
+    With a shared state store, the key-to-thread mapping is published there so
+    a follow-up landing on another worker continues the same thread, and runs
+    on one key are serialized across workers with a store lock.
+    """
+
+    def __init__(self, agent_client, idle_ttl: float = None, prewarm: int = None, cleanup_interval: float = None,
+                 store=None):
+        self.agent_client = agent_client
+        self.store = store
+        self.run_lock_ttl = float(os.environ.get("SESSION_LOCK_TTL", "600"))
+        self.idle_ttl = idle_ttl if idle_ttl is not None else float(os.environ.get("SESSION_IDLE_TTL", "1800"))
+        self.prewarm = prewarm if prewarm is not None else int(os.environ.get("SESSION_PREWARM_THREADS", "4"))
+        self.cleanup_interval = cleanup_interval if cleanup_interval is not None else float(
+            os.environ.get("SESSION_CLEANUP_INTERVAL", "60")
+        )
+
+        self._sessions = {}
+        self._spare = deque()
+        self._lock = threading.Lock()
+        self._refilling = False
+
+        self.reused = 0
+        self.shared_reused = 0
+        self.created = 0
+        self.prewarmed_used = 0
+        self.expired = 0
+        self.deleted = 0
+        self.delete_failures = 0
+
+        self._executor = None
+        self._stop = threading.Event()
+        self._cleaner = None
+
+    def _new_session(self):
+        return _Session(threading.Lock())
+
+    def start(self):
+        """Pre-create spare threads and start the background expiry loop."""
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="session-manager")
+        self._schedule_refill()
+        self._cleaner = threading.Thread(target=self._cleanup_loop, name="session-cleanup", daemon=True)
+        self._cleaner.start()
+
+    @contextmanager
+    def session(self, key: str = None):
+        """
+        Yield the remote thread for a session key, creating or reusing it.
+
+        Requests sharing a key are serialized, since a thread can only have one
+        active run at a time.
+        """
+        with self.claim(key) as claim:
+            yield self.thread_for(claim)
+
+    @contextmanager
+    def claim(self, key: str = None):
+        """
+        Hold a session key, waiting for other requests on it, without resolving
+        its thread. A one-off request's thread (key None) is deleted on exit.
+        """
+        if key is None:
+            claim = _Claim()
+            try:
+                yield claim
+            finally:
+                self._release_one_off(claim)
+            return
+
+        session = self._checkout(key)
+        try:
+            with session.lock, self._run_lock(key):
+                claim = _Claim(key, session)
+                try:
+                    yield claim
+                finally:
+                    if claim.thread is not None:
+                        self._publish(key, claim.thread)
+        finally:
+            self._checkin(session)
+
+    def thread_for(self, claim: _Claim):
+        """The claimed session's thread, taken or reused on first call."""
+        if claim.thread is None:
+            session = claim.session
+            if session is None:
+                claim.thread = self._take_thread()
+            elif session.thread is not None:
+                self.reused += 1
+                claim.thread = session.thread
+            else:
+                session.thread = claim.thread = self._shared_thread(claim.key) or self._take_thread()
+        return claim.thread
+
+    def _release_one_off(self, claim: _Claim):
+        if claim.thread is not None:
+            self._delete_later(claim.thread.id)
+
+    def _run_lock(self, key: str):
+        if self.store is None:
+            return nullcontext()
+        return self.store.lock(f"session:{key}", ttl=self.run_lock_ttl)
+
+    def _shared_entry(self, key: str):
+        """The published mapping for a key if it was used within the idle TTL."""
+        if self.store is None:
+            return None
+        entry = self.store.get(f"session:{key}")
+        if entry is None or time.time() - entry["last_used"] > self.idle_ttl:
+            return None
+        return entry
+
+    def _shared_thread(self, key: str):
+        entry = self._shared_entry(key)
+        if entry is None:
+            return None
+        self.shared_reused += 1
+        return SharedThread(entry["thread_id"])
+
+    def _publish(self, key: str, thread):
+        if self.store is not None:
+            self.store.set(
+                f"session:{key}", {"thread_id": thread.id, "last_used": time.time()}, ttl=self.idle_ttl * 2
+            )
+
+    def _checkout(self, key: str):
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None or self._is_expired(session):
+                if session is not None:
+                    self._expire(key, session)
+                session = self._new_session()
+                self._sessions[key] = session
+            session.in_use += 1
+            return session
+
+    def _checkin(self, session: _Session):
+        with self._lock:
+            session.in_use -= 1
+            session.last_used = time.monotonic()
+
+    def _is_expired(self, session: _Session):
+        return session.in_use == 0 and time.monotonic() - session.last_used > self.idle_ttl
+
+    def _expire(self, key: str, session: _Session):
+        """Drop an idle session; caller holds self._lock."""
+        del self._sessions[key]
+        self.expired += 1
+        if session.thread is not None:
+            self._retire(key, session.thread.id)
+
+    def _retire(self, key: str, thread_id: str):
+        if self._release_shared(key, thread_id):
+            self._delete_later(thread_id)
+
+    def _release_shared(self, key: str, thread_id: str):
+        """Unpublish an expired session's thread; False if another worker used it recently and expires it later."""
+        if self.store is None:
+            return True
+        entry = self._shared_entry(key)
+        if entry is not None and entry["thread_id"] == thread_id:
+            return False
+        self.store.delete(f"session:{key}")
+        return True
+
+    def expire_idle(self):
+        """Expire every idle session past its TTL."""
+        with self._lock:
+            for key, session in list(self._sessions.items()):
+                if self._is_expired(session):
+                    self._expire(key, session)
+
+    def _take_thread(self):
+        with self._lock:
+            thread = self._spare.popleft() if self._spare else None
+        if thread is not None:
+            self.prewarmed_used += 1
+        else:
+            with stage("thread_create"):
+                thread = self.agent_client.threads.create()
+            self.created += 1
+        self._schedule_refill()
+        return thread
+
+    def _schedule_refill(self):
+        with self._lock:
+            if self._executor is None or self._refilling or len(self._spare) >= self.prewarm:
+                return
+            self._refilling = True
+        self._executor.submit(self._refill)
+
+    def _refill(self):
+        try:
+            while len(self._spare) < self.prewarm and not self._stop.is_set():
+                thread = self.agent_client.threads.create()
+                with self._lock:
+                    self._spare.append(thread)
+        except Exception as e:
+            print(f"Failed to pre-create support thread: {e}")
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def _delete_later(self, thread_id: str):
+        if self._executor is None:
+            self._delete(thread_id)
+        else:
+            self._executor.submit(self._delete, thread_id)
+
+    def _delete(self, thread_id: str):
+        try:
+            self.agent_client.threads.delete(thread_id)
+            self.deleted += 1
+        except Exception:
+            self.delete_failures += 1
+
+    def _cleanup_loop(self):
+        while not self._stop.wait(self.cleanup_interval):
+            self.expire_idle()
+
+    def stats(self):
+        with self._lock:
+            active = len(self._sessions)
+            spare = len(self._spare)
+        return {
+            "active_sessions": active,
+            "spare_threads": spare,
+            "reused": self.reused,
+            "shared_reused": self.shared_reused,
+            "created": self.created,
+            "prewarmed_used": self.prewarmed_used,
+            "expired": self.expired,
+            "deleted": self.deleted,
+            "delete_failures": self.delete_failures
+        }
+
+    def close(self):
+        """Stop background work and delete unused pre-created threads."""
+        self._stop.set()
+        with self._lock:
+            spare, self._spare = list(self._spare), deque()
+        for thread in spare:
+            self._delete(thread.id)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+class AsyncSessionManager(SessionManager):
+    """SessionManager for the async agents client, using asyncio tasks for background work."""
+
+    def __init__(self, agent_client, idle_ttl: float = None, prewarm: int = None, cleanup_interval: float = None,
+                 store=None):
+        super().__init__(agent_client, idle_ttl, prewarm, cleanup_interval, store)
+        self._tasks = set()
+        self._cleaner_task = None
+
+    def _new_session(self):
+        return _Session(asyncio.Lock())
+
+    async def start(self):
+        """Pre-create spare threads and start the background expiry loop."""
+        self._stop.clear()
+        self._schedule_refill()
+        self._cleaner_task = asyncio.create_task(self._cleanup_loop())
+
+    @asynccontextmanager
+    async def session(self, key: str = None):
+        """Yield the remote thread for a session key, creating or reusing it."""
+        async with self.claim(key) as claim:
+            yield await self.thread_for(claim)
+
+    @asynccontextmanager
+    async def claim(self, key: str = None):
+        """Hold a session key without resolving its thread; see SessionManager.claim."""
+        if key is None:
+            claim = _Claim()
+            try:
+                yield claim
+            finally:
+                self._release_one_off(claim)
+            return
+
+        session = self._checkout(key)
+        try:
+            async with session.lock, self._run_lock(key):
+                claim = _Claim(key, session)
+                try:
+                    yield claim
+                finally:
+                    if claim.thread is not None:
+                        await self._publish(key, claim.thread)
+        finally:
+            self._checkin(session)
+
+    async def thread_for(self, claim: _Claim):
+        """The claimed session's thread, taken or reused on first call."""
+        if claim.thread is None:
+            session = claim.session
+            if session is None:
+                claim.thread = await self._take_thread()
+            elif session.thread is not None:
+                self.reused += 1
+                claim.thread = session.thread
+            else:
+                session.thread = claim.thread = await self._shared_thread(claim.key) or await self._take_thread()
+        return claim.thread
+
+    def _run_lock(self, key: str):
+        if self.store is None:
+            return _unlocked()
+        return self.store.alock(f"session:{key}", ttl=self.run_lock_ttl)
+
+    # The store is SQLite or Redis: its calls run in worker threads, off the event loop.
+
+    async def _shared_thread(self, key: str):
+        if self.store is None:
+            return None
+        return await asyncio.to_thread(super()._shared_thread, key)
+
+    async def _publish(self, key: str, thread):
+        if self.store is not None:
+            await asyncio.to_thread(super()._publish, key, thread)
+
+    def _retire(self, key: str, thread_id: str):
+        """Called under self._lock, so the shared mapping is checked in a background task."""
+        if self.store is None:
+            self._delete_later(thread_id)
+        else:
+            self._spawn(self._retire_shared(key, thread_id))
+
+    async def _retire_shared(self, key: str, thread_id: str):
+        if await asyncio.to_thread(self._release_shared, key, thread_id):
+            await self._delete(thread_id)
+
+    async def _take_thread(self):
+        thread = self._spare.popleft() if self._spare else None
+        if thread is not None:
+            self.prewarmed_used += 1
+        else:
+            with stage("thread_create"):
+                thread = await self.agent_client.threads.create()
+            self.created += 1
+        self._schedule_refill()
+        return thread
+
+    def _spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _schedule_refill(self):
+        if self._refilling or len(self._spare) >= self.prewarm or self._stop.is_set():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._refilling = True
+        self._spawn(self._refill())
+
+    async def _refill(self):
+        try:
+            while len(self._spare) < self.prewarm and not self._stop.is_set():
+                self._spare.append(await self.agent_client.threads.create())
+        except Exception as e:
+            print(f"Failed to pre-create support thread: {e}")
+        finally:
+            self._refilling = False
+
+    def _delete_later(self, thread_id: str):
+        self._spawn(self._delete(thread_id))
+
+    async def _delete(self, thread_id: str):
+        try:
+            await self.agent_client.threads.delete(thread_id)
+            self.deleted += 1
+        except Exception:
+            self.delete_failures += 1
+
+    async def _cleanup_loop(self):
+        while not self._stop.is_set():
+            await asyncio.sleep(self.cleanup_interval)
+            self.expire_idle()
+
+    async def close(self):
+        """Stop background work and delete unused pre-created threads."""
+        self._stop.set()
+        if self._cleaner_task is not None:
+            self._cleaner_task.cancel()
+            self._cleaner_task = None
+        spare, self._spare = list(self._spare), deque()
+        for thread in spare:
+            await self._delete(thread.id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,284 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+
+class StateStore:
+    """
+    Small key/value store for state that uvicorn workers must agree on.
+
+    Values are anything JSON-serializable and may carry a TTL in seconds.
+    Backends implement get/set/delete, add (set only if absent) and
+    _release (delete only if the value still matches); the cross-worker
+    locks are built on those. `shared` tells callers whether other worker
+    processes see the same data.
+
+    The sqlite and redis backends block on file locks or network round
+    trips, so coroutines use the *_async variants, which run the call in a
+    worker thread.
+    """
+
+    backend = None
+    shared = True
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float = None):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def add(self, key: str, value, ttl: float = None):
+        """Store value only if the key is absent or expired; returns whether it was stored."""
+        raise NotImplementedError
+
+    def _release(self, key: str, value):
+        """Delete key only if it still holds value."""
+        raise NotImplementedError
+
+    async def get_async(self, key: str):
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, value, ttl: float = None):
+        await asyncio.to_thread(self.set, key, value, ttl)
+
+    async def delete_async(self, key: str):
+        await asyncio.to_thread(self.delete, key)
+
+    def _try_lock(self, name: str, ttl: float):
+        token = uuid.uuid4().hex
+        return token if self.add(f"lock:{name}", token, ttl) else None
+
+    @contextmanager
+    def lock(self, name: str, ttl: float = 30.0, timeout: float = None):
+        """
+        Mutual exclusion across every worker using the store.
+
+        The lock expires after ttl seconds in case its holder dies; waiting
+        longer than timeout (default ttl) raises TimeoutError.
+        """
+        deadline = time.monotonic() + (timeout if timeout is not None else ttl)
+        delay = 0.005
+        while (token := self._try_lock(name, ttl)) is None:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for shared lock '{name}'")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            self._release(f"lock:{name}", token)
+
+    @asynccontextmanager
+    async def alock(self, name: str, ttl: float = 30.0, timeout: float = None):
+        """lock() for coroutines; each attempt and the release run in a worker thread."""
+        deadline = time.monotonic() + (timeout if timeout is not None else ttl)
+        delay = 0.005
+        while (token := await asyncio.to_thread(self._try_lock, name, ttl)) is None:
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Timed out waiting for shared lock '{name}'")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.1)
+        try:
+            yield
+        finally:
+            await asyncio.to_thread(self._release, f"lock:{name}", token)
+
+    def stats(self):
+        return {"backend": self.backend, "shared": self.shared}
+
+    def close(self):
+        pass
+
+
+class MemoryStateStore(StateStore):
+    """Process-local store; the default for a single worker."""
+
+    backend = "memory"
+    shared = False
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float):
+        item = self._values.get(key)
+        if item is not None and item[1] is not None and item[1] <= now:
+            del self._values[key]
+            return None
+        return item
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._live(key, time.time())
+        # Stored as JSON so callers never share mutable objects, as with the other backends.
+        return json.loads(item[0]) if item is not None else None
+
+    def set(self, key: str, value, ttl: float = None):
+        with self._lock:
+            self._values[key] = (json.dumps(value), time.time() + ttl if ttl else None)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def add(self, key: str, value, ttl: float = None):
+        now = time.time()
+        with self._lock:
+            if self._live(key, now) is not None:
+                return False
+            self._values[key] = (json.dumps(value), now + ttl if ttl else None)
+            return True
+
+    def _release(self, key: str, value):
+        with self._lock:
+            item = self._values.get(key)
+            if item is not None and item[0] == json.dumps(value):
+                del self._values[key]
+
+
+class SQLiteStateStore(StateStore):
+    """Store in a SQLite file shared by the workers on one host."""
+
+    backend = "sqlite"
+
+    _SCHEMA = "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)"
+
+    def __init__(self, path: str = None):
+        self.path = path or os.environ.get("STATE_DB_PATH", ".state.sqlite3")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._writes = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(self._SCHEMA)
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def set(self, key: str, value, ttl: float = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None)
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._conn.execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def add(self, key: str, value, ttl: float = None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "DELETE FROM state WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?", (key, now)
+                )
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), now + ttl if ttl else None)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount == 1
+
+    def _release(self, key: str, value):
+        with self._lock:
+            self._conn.execute("DELETE FROM state WHERE key = ? AND value = ?", (key, json.dumps(value)))
+
+    def stats(self):
+        return {**super().stats(), "path": self.path}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisStateStore(StateStore):
+    """
+    Store on a Redis-protocol server (Redis, Valkey, KeyDB, ...), shared across
+    hosts. Needs the optional `redis` package, or any client with the same
+    get/set/delete/eval methods (fakeredis works as a local stand-in).
+    """
+
+    backend = "redis"
+
+    _RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, url: str = None, client=None, prefix: str = None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("STATE_BACKEND=redis needs the redis package (pip install redis)")
+            client = redis.Redis.from_url(url or os.environ.get("STATE_REDIS_URL", "redis://localhost:6379/0"))
+        self.client = client
+        self.prefix = prefix if prefix is not None else os.environ.get("STATE_KEY_PREFIX", "lumen-support:")
+
+    def get(self, key: str):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value, ttl: float = None):
+        self.client.set(self.prefix + key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def add(self, key: str, value, ttl: float = None):
+        return bool(self.client.set(self.prefix + key, json.dumps(value), nx=True, px=int(ttl * 1000) if ttl else None))
+
+    def _release(self, key: str, value):
+        self.client.eval(self._RELEASE, 1, self.prefix + key, json.dumps(value))
+
+    def close(self):
+        self.client.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def get_state_store():
+    """Process-wide store selected by STATE_BACKEND (memory, sqlite or redis)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            backend = os.environ.get("STATE_BACKEND", "memory").lower()
+            if backend == "sqlite":
+                _default = SQLiteStateStore()
+            elif backend == "redis":
+                _default = RedisStateStore()
+            elif backend == "memory":
+                _default = MemoryStateStore()
+            else:
+                raise ValueError(f"Unknown STATE_BACKEND '{backend}'; expected memory, sqlite or redis")
+        return _default
+
+
+def get_shared_store():
+    """The configured store if other workers see it, else None (per-process state)."""
+    store = get_state_store()
+    return store if store.shared else None
@@ -0,0 +1,294 @@
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+from services.metrics import registry as metrics_registry
+from services.state import get_shared_store
+
+
+budget_tokens = metrics_registry.counter(
+    "support_token_budget_reserved_tokens",
+    "Estimated tokens reserved against the shared TPM budget."
+)
+budget_outcomes = metrics_registry.counter(
+    "support_token_budget_decisions",
+    "Budget reservations by outcome (immediate, delayed, shed).",
+    ("outcome",)
+)
+rate_limit_retries = metrics_registry.counter(
+    "support_rate_limit_retries",
+    "Runs or calls retried after the service reported throttling."
+)
+
+
+class RateLimitExceeded(RuntimeError):
+    """The model quota is exhausted; retry_after is a hint in whole seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBudgetExceeded(RateLimitExceeded):
+    """Work was shed locally because the shared budget would not free up in time."""
+
+
+_encoding = None
+
+
+def estimate_tokens(text: str):
+    """
+    Local prompt token estimate.
+
+    Uses tiktoken's cl100k_base encoding when installed, otherwise roughly four
+    characters per token, which tracks GPT tokenizers closely for English prose.
+    """
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    return max(1, math.ceil(len(text) / 4))
+
+
+_RETRY_IN = re.compile(r"(?:try again|retry) (?:in|after) (\d+(?:\.\d+)?)\s*(ms|milliseconds?|s|sec|seconds?)?", re.I)
+_RETRY_HEADERS = (("retry-after-ms", 0.001), ("x-ms-retry-after-ms", 0.001), ("retry-after", 1.0))
+
+
+def _field(obj, name: str):
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def is_rate_limited(outcome):
+    """Whether a finished run or a raised error means the service throttled us."""
+    if isinstance(outcome, BaseException):
+        status = getattr(outcome, "status_code", None) or _field(getattr(outcome, "response", None), "status_code")
+        return status == 429 or "rate limit" in str(outcome).lower()
+    error = _field(outcome, "last_error")
+    return _field(error, "code") == "rate_limit_exceeded"
+
+
+def retry_after_hint(outcome):
+    """Seconds the service asked us to wait, from Retry-After headers or the error message."""
+    if isinstance(outcome, BaseException):
+        headers = _field(getattr(outcome, "response", None), "headers") or {}
+        headers = {str(name).lower(): value for name, value in headers.items()}
+        for header, scale in _RETRY_HEADERS:
+            value = headers.get(header)
+            if value:
+                try:
+                    return float(value) * scale
+                except ValueError:
+                    pass
+        message = str(outcome)
+    else:
+        message = _field(_field(outcome, "last_error"), "message") or ""
+    match = _RETRY_IN.search(message)
+    if not match:
+        return None
+    unit = (match.group(2) or "s").lower()
+    return float(match.group(1)) / (1000 if unit.startswith("m") else 1)
+
+
+def retry_delay(outcome, attempt: int, max_wait: float = 60.0):
+    """Server hint when given, otherwise jittered exponential backoff, capped at max_wait."""
+    hint = retry_after_hint(outcome)
+    if hint is None:
+        hint = min(max_wait, 2 ** attempt) * random.uniform(0.5, 1.0)
+    return min(max_wait, hint)
+
+
+class TokenBudget:
+    """
+    Sliding-window TPM/RPM budget shared by every worker on the host.
+
+    Reservations live in a small JSON file guarded by an flock, or in the
+    shared state store when one is configured, so uvicorn workers (and, with
+    Redis, other hosts) see each other's usage. A request that does not fit waits for old
+    reservations to leave the window; if that would take longer than max_wait
+    it is shed with TokenBudgetExceeded instead of running into the quota.
+    """
+
+    def __init__(self, tpm: float = None, rpm: float = None, state_path: str = None,
+                 window: float = 60.0, max_wait: float = None, store=None):
+        self.tpm = tpm
+        self.rpm = rpm
+        self.state_path = state_path or os.environ.get("TOKEN_BUDGET_STATE_PATH", ".token_budget.json")
+        self.window = window
+        self.max_wait = max_wait if max_wait is not None else float(os.environ.get("TOKEN_BUDGET_MAX_WAIT", "10"))
+        self.store = store
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        tpm = os.environ.get("TOKEN_BUDGET_TPM")
+        rpm = os.environ.get("TOKEN_BUDGET_RPM")
+        if not tpm and not rpm:
+            return None
+        return cls(tpm=float(tpm) if tpm else None, rpm=float(rpm) if rpm else None, store=get_shared_store())
+
+    def _live(self, entries: list, now: float):
+        return [entry for entry in entries if now - entry["at"] < self.window]
+
+    def _delay_for(self, entries: list, tokens: int, now: float):
+        """Seconds until a reservation of `tokens` fits, 0 if it fits now."""
+        delays = [0.0]
+        if self.tpm:
+            excess = sum(entry["tokens"] for entry in entries) + tokens - self.tpm
+            for entry in entries:
+                if excess <= 0:
+                    break
+                excess -= entry["tokens"]
+                delays.append(entry["at"] + self.window - now)
+        if self.rpm and len(entries) + 1 > self.rpm:
+            delays.append(entries[int(len(entries) + 1 - self.rpm) - 1]["at"] + self.window - now)
+        return max(delays)
+
+    def reserve(self, tokens: int):
+        """Try to reserve tokens now; returns (reservation_id, 0) or (None, seconds to wait)."""
+        if self.tpm:
+            tokens = min(tokens, int(self.tpm))
+        with self._lock, self._shared_lock():
+            now = time.time()
+            entries = self._live(self._load(), now)
+            delay = self._delay_for(entries, tokens, now)
+            if delay > 0:
+                return None, delay
+            reservation = uuid.uuid4().hex[:12]
+            entries.append({"id": reservation, "at": now, "tokens": tokens})
+            self._save(entries)
+        budget_tokens.inc(tokens)
+        return reservation, 0.0
+
+    def settle(self, reservation: str, actual_tokens: int):
+        """Replace a reservation's estimate with the tokens the run actually used."""
+        with self._lock, self._shared_lock():
+            entries = self._live(self._load(), time.time())
+            for entry in entries:
+                if entry["id"] == reservation:
+                    entry["tokens"] = actual_tokens
+            self._save(entries)
+
+    async def settle_async(self, reservation: str, actual_tokens: int):
+        await asyncio.to_thread(self.settle, reservation, actual_tokens)
+
+    def _shed(self, delay: float):
+        budget_outcomes.inc(outcome="shed")
+        raise TokenBudgetExceeded(
+            "Model token budget exhausted; try again shortly", max(1, math.ceil(delay))
+        )
+
+    def acquire(self, tokens: int):
+        """Reserve tokens, sleeping until they fit; sheds work that would wait past max_wait."""
+        deadline = time.monotonic() + self.max_wait
+        delayed = False
+        while True:
+            reservation, delay = self.reserve(tokens)
+            if reservation is not None:
+                budget_outcomes.inc(outcome="delayed" if delayed else "immediate")
+                return reservation
+            if time.monotonic() + delay > deadline:
+                self._shed(delay)
+            delayed = True
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: int):
+        """
+        acquire() for coroutines. The process and cross-worker locks block,
+        so each reservation attempt runs in a worker thread, never on the loop.
+        """
+        deadline = time.monotonic() + self.max_wait
+        delayed = False
+        while True:
+            reservation, delay = await asyncio.to_thread(self.reserve, tokens)
+            if reservation is not None:
+                budget_outcomes.inc(outcome="delayed" if delayed else "immediate")
+                return reservation
+            if time.monotonic() + delay > deadline:
+                self._shed(delay)
+            delayed = True
+            await asyncio.sleep(delay)
+
+    def stats(self):
+        with self._lock, self._shared_lock():
+            entries = self._live(self._load(), time.time())
+        return {
+            "tpm_limit": self.tpm,
+            "rpm_limit": self.rpm,
+            "tokens_in_window": sum(entry["tokens"] for entry in entries),
+            "requests_in_window": len(entries)
+        }
+
+    async def stats_async(self):
+        return await asyncio.to_thread(self.stats)
+
+    def _load(self):
+        if self.store is not None:
+            return self.store.get("token_budget") or []
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+
+    def _save(self, entries: list):
+        if self.store is not None:
+            self.store.set("token_budget", entries, ttl=self.window)
+            return
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.state_path)
+
+    @contextmanager
+    def _shared_lock(self):
+        """Serialize budget updates across worker processes."""
+        if self.store is not None:
+            with self.store.lock("token_budget", ttl=10):
+                yield
+            return
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.state_path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_default_budget = None
+_default_budget_lock = threading.Lock()
+
+
+def get_token_budget():
+    """Process-wide budget, or None when neither TOKEN_BUDGET_TPM nor TOKEN_BUDGET_RPM is set."""
+    global _default_budget
+    with _default_budget_lock:
+        if _default_budget is None:
+            _default_budget = TokenBudget.from_env()
+        return _default_budget
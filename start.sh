@@ -1,3 +1,21 @@
 #!/bin/bash
 cd /app
-exec /app/.venv/bin/python -m uvicorn app:app --host 0.0.0.0 --port ${PORT:-8000}
+
+# One worker per core unless WEB_CONCURRENCY is set. Several workers share
+# agent IDs, session threads, cached answers and the token budget through
+# STATE_BACKEND, so default it to the host-local SQLite store.
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-$(nproc)}
+if [ "$WEB_CONCURRENCY" -gt 1 ]; then
+    export STATE_BACKEND=${STATE_BACKEND:-sqlite}
+    export CREDENTIAL_CACHE_PATH=${CREDENTIAL_CACHE_PATH:-/tmp/lumen-support-tokens.json}
+fi
+
+# gunicorn restarts crashed workers; fall back to uvicorn's own supervisor.
+if /app/.venv/bin/python -c "import gunicorn" 2>/dev/null; then
+    exec /app/.venv/bin/python -m gunicorn app:app \
+        --worker-class uvicorn.workers.UvicornWorker \
+        --workers "$WEB_CONCURRENCY" \
+        --bind 0.0.0.0:${PORT:-8000} \
+        --graceful-timeout 30
+fi
+exec /app/.venv/bin/python -m uvicorn app:app --host 0.0.0.0 --port ${PORT:-8000} --workers "$WEB_CONCURRENCY"
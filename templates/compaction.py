@@ -0,0 +1,121 @@
+import os
+import re
+import textwrap
+
+
+_LIST_MARKER = re.compile(r"^(?:[-*]|\d+[.)])\s+")
+_SPACES = re.compile(r"[ \t]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+_WORD = re.compile(r"[a-z0-9]+")
+_STOP_WORDS = frozenset(
+    "a an and are as at be by for from in into is it its of on or our please that the their this "
+    "to when which with your".split()
+)
+
+
+def compaction_enabled():
+    return os.environ.get("PROMPT_COMPACTION", "true").lower() in ("1", "true", "yes")
+
+
+def compact_whitespace(text: str):
+    """
+    Dedent, drop trailing spaces and collapse runs of blank lines and inner
+    spaces. Relative indentation is kept so nested lists stay nested.
+    """
+    lines = []
+    for line in textwrap.dedent(text.expandtabs(4)).splitlines():
+        content = _SPACES.sub(" ", line.strip())
+        if not content:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        lines.append(" " * (len(line) - len(line.lstrip(" "))) + content)
+    return "\n".join(lines).strip()
+
+
+def _content_words(text: str):
+    """Lower-cased words of text without list markers, stop words and common suffixes."""
+    text = _LIST_MARKER.sub("", text.strip().lower()).replace("'s", "")
+    return frozenset(_stem(word) for word in _WORD.findall(text) if word not in _STOP_WORDS)
+
+
+def _stem(word: str):
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)]
+    return word
+
+
+def _sentences(line: str):
+    return [sentence for sentence in _SENTENCE_END.split(line.strip()) if sentence]
+
+
+class PromptCompactor:
+    """
+    Shrinks prompt templates before they are compiled.
+
+    Whitespace is normalized with compact_whitespace, and guidance the agent
+    already gets from its instructions (the reference) is removed. Template
+    lines are compared a sentence at a time: a sentence is dropped when the
+    Dice similarity of its content words and those of some reference sentence
+    reaches threshold, so "Please provide specific, actionable recommendations
+    tailored to ..." matches "Provide specific, actionable recommendations".
+    Sentences with template slots, headings (upper case, or ending in a colon
+    that introduces a list) and sentences of fewer than min_words content words
+    are always kept.
+    """
+
+    def __init__(self, reference: str = "", min_words: int = 3, threshold: float = 0.5):
+        self.min_words = min_words
+        self.threshold = threshold
+        self._reference = [
+            words for line in reference.splitlines() for words in map(_content_words, _sentences(line))
+            if len(words) >= min_words
+        ]
+
+    def similarity(self, sentence: str):
+        """Best Dice similarity between the sentence's content words and a reference sentence."""
+        words = _content_words(sentence)
+        return max(
+            (2 * len(words & reference) / (len(words) + len(reference)) for reference in self._reference),
+            default=0.0
+        )
+
+    def is_redundant(self, sentence: str):
+        sentence = sentence.strip()
+        if "{" in sentence or sentence.endswith(":") or sentence.isupper():
+            return False
+        if len(_content_words(sentence)) < self.min_words:
+            return False
+        return self.similarity(sentence) >= self.threshold
+
+    def _compact_line(self, line: str):
+        """The line without its redundant sentences, or None when none are left."""
+        stripped = line.lstrip(" ")
+        marker = _LIST_MARKER.match(stripped)
+        prefix = line[:len(line) - len(stripped)] + (marker.group(0) if marker else "")
+        sentences = _sentences(line[len(prefix):])
+        kept = [sentence for sentence in sentences if not self.is_redundant(sentence)]
+        if len(kept) == len(sentences):
+            return line
+        return prefix + " ".join(kept) if kept else None
+
+    def compact(self, text: str):
+        kept = [line for line in map(self._compact_line, compact_whitespace(text).splitlines()) if line is not None]
+        return compact_whitespace("\n".join(kept))
+
+    def report(self, sources: dict):
+        """Estimated tokens per template before and after compaction."""
+        from services.token_budget import estimate_tokens
+
+        report = {}
+        for name, source in sources.items():
+            before = estimate_tokens(source.strip())
+            after = estimate_tokens(self.compact(source))
+            report[name] = {
+                "tokens_before": before,
+                "tokens_after": after,
+                "tokens_saved": before - after,
+                "saved_percent": round(100 * (before - after) / before, 1) if before else 0.0
+            }
+        return report
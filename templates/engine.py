@@ -0,0 +1,139 @@
+import os
+import string
+import threading
+import time
+
+
+class TemplateError(ValueError):
+    """Raised when a template file is missing, malformed or has the wrong fields."""
+
+
+class CompiledTemplate:
+    """
+    A template split once into static segments and named slots.
+
+    Rendering copies the precompiled parts list, drops the values into the
+    slot positions and performs a single join.
+    """
+
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self._parts = []
+        self._slots = []
+
+        try:
+            parsed = list(string.Formatter().parse(source.strip()))
+        except ValueError as e:
+            raise TemplateError(f"Template '{name}' is malformed: {e}")
+
+        for literal, field, format_spec, conversion in parsed:
+            if literal:
+                self._parts.append(literal)
+            if field is None:
+                continue
+            if not field.isidentifier() or format_spec or conversion:
+                raise TemplateError(f"Template '{name}' slot '{{{field}}}' must be a plain field name")
+            self._slots.append((len(self._parts), field))
+            self._parts.append("")
+
+        self.fields = frozenset(field for _, field in self._slots)
+
+    def render(self, **values):
+        """Render the template; every field must be supplied."""
+        parts = self._parts.copy()
+        try:
+            for index, field in self._slots:
+                value = values[field]
+                parts[index] = value if type(value) is str else str(value)
+        except KeyError as e:
+            raise TemplateError(f"Template '{self.name}' is missing value for {e}")
+        return "".join(parts)
+
+
+class TemplateRegistry:
+    """
+    Loads `<name>.txt` templates from a directory once and serves compiled copies.
+
+    Each template's slots are checked at load time against the fields declared
+    for it. With hot_reload enabled, modified files are recompiled at most once
+    per reload_interval seconds. A compactor (see templates.compaction) is
+    applied to each source before it is compiled.
+    """
+
+    def __init__(self, directory: str, required_fields: dict, hot_reload: bool = None, reload_interval: float = 1.0,
+                 compactor=None):
+        self.directory = directory
+        self.required_fields = {name: frozenset(fields) for name, fields in required_fields.items()}
+        if hot_reload is None:
+            hot_reload = os.environ.get("TEMPLATE_HOT_RELOAD", "false").lower() in ("1", "true", "yes")
+        self.hot_reload = hot_reload
+        self.reload_interval = reload_interval
+        self.compactor = compactor
+
+        self._sources = {}
+        self._templates = {}
+        self._mtimes = {}
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+        for name in self.required_fields:
+            self._load(name)
+
+    def _path(self, name: str):
+        return os.path.join(self.directory, f"{name}.txt")
+
+    def _load(self, name: str):
+        path = self._path(name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                source = f.read()
+            mtime = os.path.getmtime(path)
+        except OSError as e:
+            raise TemplateError(f"Template '{name}' could not be loaded from {path}: {e}")
+
+        compacted = self.compactor.compact(source) if self.compactor is not None else source
+        template = CompiledTemplate(name, compacted)
+        expected = self.required_fields[name]
+        if template.fields != expected:
+            missing = sorted(expected - template.fields)
+            unknown = sorted(template.fields - expected)
+            raise TemplateError(f"Template '{name}' fields do not match: missing {missing}, unknown {unknown}")
+
+        self._sources[name] = source
+        self._templates[name] = template
+        self._mtimes[name] = mtime
+
+    def reload_if_changed(self):
+        """Recompile templates whose files changed since they were loaded."""
+        with self._lock:
+            for name in self.required_fields:
+                try:
+                    changed = os.path.getmtime(self._path(name)) != self._mtimes.get(name)
+                except OSError:
+                    continue
+                if not changed:
+                    continue
+                try:
+                    self._load(name)
+                    print(f"Reloaded template '{name}'")
+                except TemplateError as e:
+                    # Keep serving the last good version until the file changes again.
+                    self._mtimes[name] = os.path.getmtime(self._path(name))
+                    print(f"Template reload failed: {e}")
+
+    def get(self, name: str):
+        if self.hot_reload:
+            now = time.monotonic()
+            if now - self._last_check >= self.reload_interval:
+                self._last_check = now
+                self.reload_if_changed()
+        return self._templates[name]
+
+    def render(self, template_name: str, /, **values):
+        return self.get(template_name).render(**values)
+
+    def compaction_report(self):
+        """Estimated token savings per template, or None without a compactor."""
+        if self.compactor is None:
+            return None
+        return self.compactor.report(self._sources)
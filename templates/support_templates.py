@@ -1,7 +1,61 @@
+import os
+from templates.engine import TemplateRegistry
+from templates.compaction import PromptCompactor, compaction_enabled
+
+TEMPLATE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+
+TEMPLATE_FIELDS = {
+    "scaling": ("partner_name", "partner_tier", "focus_area", "region"),
+    "technical": ("technical_issue", "priority_level", "context"),
+    "product_inquiry": ("product_category", "use_case"),
+    "onboarding": ("partner_type", "business_focus")
+}
+
+URGENCY_CONTEXT = {
+    "low": "Standard technical inquiry - no immediate business impact",
+    "medium": "Moderate priority - affecting some operations",
+    "high": "High priority - significant business impact",
+    "critical": "Critical issue - major service disruption"
+}
+
+# Words that place a request in a technical or scaling template category
+# when the agent is unavailable and a canned answer is sent instead.
+CATEGORY_KEYWORDS = {
+    "connectivity": ("connect", "link", "latency", "packet", "outage", "bandwidth", "circuit", "vpn", "wan", "down"),
+    "integration": ("integrat", "api", "webhook", "sso", "crm", "sdk"),
+    "troubleshooting": ("error", "fail", "broken", "crash", "alarm"),
+    "configuration": ("config", "setting", "setup", "firewall", "routing", "policy", "provision"),
+    "cloud_infrastructure": ("cloud", "compute", "storage", "edge", "data center", "hosting"),
+    "network_services": ("network", "sd-wan", "fiber", "ethernet", "wavelength", "internet"),
+    "security_solutions": ("security", "ddos", "firewall", "threat", "zero trust", "sase"),
+    "managed_services": ("managed", "msp", "outsourc", "operations")
+}
+
+DEGRADED_NOTICE = (
+    "Our support assistant is temporarily unavailable, so this is a standard response "
+    "rather than an answer tailored to your request."
+)
+
+_registries = {}
+
+def get_template_registry(reference: str = ""):
+    """
+    Process-wide registry per reference text; template files are read and
+    compiled once. Unless PROMPT_COMPACTION is false, templates are compacted
+    and lines repeating the reference (the agent instructions) are dropped.
+    """
+    registry = _registries.get(reference)
+    if registry is None:
+        compactor = PromptCompactor(reference) if compaction_enabled() else None
+        registry = _registries[reference] = TemplateRegistry(TEMPLATE_DIRECTORY, TEMPLATE_FIELDS, compactor=compactor)
+    return registry
+
 class CustomerSupportTemplates:
     """Pre-built templates for common customer support scenarios."""
     
-    def __init__(self):
+    def __init__(self, reference: str = ""):
+        self.registry = get_template_registry(reference)
+        
         self.scaling_templates = {
             "cloud_infrastructure": "How can we help partners scale their cloud infrastructure offerings?",
             "network_services": "What network services solutions support rapid partner growth?",
@@ -18,188 +72,62 @@ class CustomerSupportTemplates:
     
     def get_scaling_template(self, partner_profile: dict):
         """Generate a scaling-focused query template."""
-        partner_name = partner_profile.get("partner_name", "Partner")
-        focus_area = partner_profile.get("focus_area", "technology solutions")
-        partner_tier = partner_profile.get("partner_tier", "Standard")
-        region = partner_profile.get("region", "their region")
-        
-        template = f"""
-PARTNER SCALING CONSULTATION REQUEST
-
-Partner Information:
-- Name: {partner_name}
-- Tier: {partner_tier}
-- Focus Area: {focus_area}
-- Region: {region}
-
-Request: Please provide comprehensive scaling recommendations including:
-
-1. GROWTH OPPORTUNITIES
-   - Market expansion strategies for {focus_area}
-   - New service offerings that align with current capabilities
-   - Revenue growth potential and timelines
-
-2. OPERATIONAL SCALING
-   - Infrastructure requirements for growth
-   - Staffing and training recommendations
-   - Process optimization strategies
-
-3. LUMEN SOLUTION ALIGNMENT
-   - Specific Lumen products/services that support scaling
-   - Partnership program benefits for {partner_tier} tier
-   - Technical resources and support available
-
-4. IMPLEMENTATION ROADMAP
-   - 90-day quick wins
-   - 6-month strategic initiatives
-   - 12-month transformation goals
-
-5. SUCCESS METRICS
-   - KPIs to track scaling progress
-   - Benchmarks for {focus_area} in {region}
-   - ROI expectations and measurement
-
-Please provide specific, actionable recommendations tailored to this partner's profile and scaling objectives.
-        """.strip()
-        
-        return template
+        return self.registry.render(
+            "scaling",
+            partner_name=partner_profile.get("partner_name", "Partner"),
+            focus_area=partner_profile.get("focus_area", "technology solutions"),
+            partner_tier=partner_profile.get("partner_tier", "Standard"),
+            region=partner_profile.get("region", "their region")
+        )
     
     def get_technical_template(self, technical_issue: str, urgency: str = "medium"):
         """Generate a technical support query template."""
-        urgency_context = {
-            "low": "Standard technical inquiry - no immediate business impact",
-            "medium": "Moderate priority - affecting some operations",
-            "high": "High priority - significant business impact",
-            "critical": "Critical issue - major service disruption"
-        }
-        
-        context = urgency_context.get(urgency, urgency_context["medium"])
-        
-        template = f"""
-TECHNICAL SUPPORT REQUEST
-
-Issue Description: {technical_issue}
-Priority Level: {urgency.upper()}
-Context: {context}
-
-Please provide:
-
-1. IMMEDIATE ASSESSMENT
-   - Root cause analysis
-   - Impact assessment
-   - Immediate mitigation steps
-
-2. TECHNICAL SOLUTION
-   - Step-by-step resolution process
-   - Required tools and resources
-   - Estimated resolution time
-
-3. PREVENTION STRATEGIES
-   - Best practices to prevent recurrence
-   - Monitoring and alerting recommendations
-   - Maintenance schedules
-
-4. ESCALATION PATH
-   - When to escalate to engineering
-   - Required information for escalation
-   - Emergency contact procedures
-
-5. FOLLOW-UP ACTIONS
-   - Post-resolution verification steps
-   - Documentation requirements
-   - Knowledge base updates
-
-Please provide detailed technical guidance appropriate for the urgency level.
-        """.strip()
-        
-        return template
+        return self.registry.render(
+            "technical",
+            technical_issue=technical_issue,
+            priority_level=urgency.upper(),
+            context=URGENCY_CONTEXT.get(urgency, URGENCY_CONTEXT["medium"])
+        )
+    
+    @staticmethod
+    def match_category(templates: dict, text: str):
+        """(category, description) from templates whose keywords best match text; the first on a tie."""
+        text = text.lower()
+        return max(
+            templates.items(),
+            key=lambda item: sum(keyword in text for keyword in CATEGORY_KEYWORDS.get(item[0], ()))
+        )
+    
+    def get_degraded_message(self, kind: str, text: str = "", urgency: str = "medium"):
+        """Canned guidance for a query, technical or scaling request while the agent is unavailable."""
+        if kind == "technical":
+            category, description = self.match_category(self.technical_templates, text)
+            if urgency in ("high", "critical"):
+                next_step = "For high and critical issues, contact your dedicated partner manager now so the issue can be escalated to engineering."
+            else:
+                next_step = "Please try again in a few minutes, or open a ticket with your partner manager."
+            return f"{DEGRADED_NOTICE}\n\nTopic: {description} ({category.replace('_', ' ')})\n{next_step}"
+        if kind == "scaling":
+            category, description = self.match_category(self.scaling_templates, text)
+            return (
+                f"{DEGRADED_NOTICE}\n\nTopic: {description}\n"
+                f"Your partner manager can review {category.replace('_', ' ')} options with you; "
+                "tailored scaling recommendations will be available again shortly."
+            )
+        return f"{DEGRADED_NOTICE}\n\nPlease try again in a few minutes, or contact your dedicated partner manager."
     
     def get_product_inquiry_template(self, product_category: str, use_case: str):
         """Generate a product inquiry template."""
-        template = f"""
-PRODUCT CONSULTATION REQUEST
-
-Product Category: {product_category}
-Use Case: {use_case}
-
-Please provide comprehensive product guidance including:
-
-1. SOLUTION OVERVIEW
-   - Relevant Lumen products for {product_category}
-   - Key features and capabilities
-   - Competitive advantages
-
-2. USE CASE ALIGNMENT
-   - How solutions address {use_case}
-   - Implementation considerations
-   - Integration requirements
-
-3. BUSINESS VALUE
-   - ROI potential and metrics
-   - Cost-benefit analysis
-   - Time to value expectations
-
-4. TECHNICAL SPECIFICATIONS
-   - System requirements
-   - Performance characteristics
-   - Scalability considerations
-
-5. PARTNER ENABLEMENT
-   - Training and certification requirements
-   - Sales tools and resources
-   - Marketing support available
-
-6. NEXT STEPS
-   - Evaluation process
-   - Pilot program opportunities
-   - Implementation timeline
-
-Please provide detailed product information tailored to this specific use case.
-        """.strip()
-        
-        return template
+        return self.registry.render(
+            "product_inquiry",
+            product_category=product_category,
+            use_case=use_case
+        )
     
     def get_onboarding_template(self, partner_type: str, business_focus: str):
         """Generate a partner onboarding template."""
-        template = f"""
-PARTNER ONBOARDING CONSULTATION
-
-Partner Type: {partner_type}
-Business Focus: {business_focus}
-
-Please provide comprehensive onboarding guidance including:
-
-1. PARTNERSHIP OVERVIEW
-   - Lumen partner program benefits
-   - Tier progression opportunities
-   - Program requirements and commitments
-
-2. BUSINESS ENABLEMENT
-   - Go-to-market strategies for {business_focus}
-   - Sales process and methodologies
-   - Customer targeting and segmentation
-
-3. TECHNICAL ENABLEMENT
-   - Product training requirements
-   - Certification pathways
-   - Technical resources and documentation
-
-4. OPERATIONAL SETUP
-   - Partner portal access and navigation
-   - Order management processes
-   - Support and escalation procedures
-
-5. MARKETING SUPPORT
-   - Co-marketing opportunities
-   - Lead generation programs
-   - Brand guidelines and assets
-
-6. SUCCESS PLANNING
-   - 30-60-90 day milestones
-   - Performance metrics and tracking
-   - Regular review and optimization
-
-Please provide a detailed onboarding roadmap for this partner profile.
-        """.strip()
-        
-        return template
+        return self.registry.render(
+            "onboarding",
+            partner_type=partner_type,
+            business_focus=business_focus
+        )
@@ -0,0 +1,94 @@
+"""
+Tests for the priority admission scheduler.
+"""
+
+import asyncio
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.admission import AdmissionRejected, AdmissionScheduler, concurrency_for_quota
+
+class TestAdmissionScheduler(unittest.IsolatedAsyncioTestCase):
+    """Test admission order, fairness and rejection."""
+
+    def scheduler(self, **overrides):
+        options = dict(max_concurrency=1, max_queue=10, queue_timeout=5, reject_priorities=("low",), avg_run_seconds=2)
+        options.update(overrides)
+        return AdmissionScheduler(**options)
+
+    async def _drain(self, scheduler, requests):
+        """Queue requests behind a held slot, release it and return the admission order."""
+        order = []
+        blocker = await scheduler.acquire("critical")
+
+        async def request(label, priority, tier):
+            async with scheduler.admit(priority, tier):
+                order.append(label)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(request(*r)) for r in requests]
+        await asyncio.sleep(0)
+        scheduler.release(blocker)
+        await asyncio.gather(*tasks)
+        return order
+
+    async def test_higher_urgency_first(self):
+        """Test that queued critical work is admitted before medium work."""
+        order = await self._drain(self.scheduler(), [
+            ("medium", "medium", None),
+            ("high", "high", None),
+            ("critical", "critical", None)
+        ])
+        self.assertEqual(order, ["critical", "high", "medium"])
+
+    async def test_tiers_share_by_weight(self):
+        """Test that Gold gets about twice the Silver share within one priority."""
+        requests = [(f"gold-{i}", "medium", "Gold") for i in range(6)]
+        requests += [(f"silver-{i}", "medium", "Silver") for i in range(6)]
+        order = await self._drain(self.scheduler(max_queue=50), requests)
+        first_six = [label.split("-")[0] for label in order[:6]]
+        self.assertEqual(first_six.count("gold"), 4)
+        self.assertEqual(first_six.count("silver"), 2)
+
+    async def test_low_priority_rejected_when_saturated(self):
+        """Test that low priority work gets a 429-style rejection with Retry-After."""
+        scheduler = self.scheduler()
+        ticket = await scheduler.acquire("medium")
+        with self.assertRaises(AdmissionRejected) as rejected:
+            await scheduler.acquire("low")
+        self.assertGreaterEqual(rejected.exception.retry_after, 1)
+        scheduler.release(ticket)
+        scheduler.release(await scheduler.acquire("low"))
+
+    async def test_full_queue_rejected(self):
+        """Test that requests beyond max_queue are rejected immediately."""
+        scheduler = self.scheduler(max_queue=1)
+        ticket = await scheduler.acquire("medium")
+        waiter = asyncio.create_task(scheduler.acquire("medium"))
+        await asyncio.sleep(0)
+        with self.assertRaises(AdmissionRejected):
+            await scheduler.acquire("medium")
+        scheduler.release(ticket)
+        scheduler.release(await waiter)
+        self.assertEqual(scheduler.in_flight, 0)
+
+    async def test_queue_timeout_frees_queue_position(self):
+        """Test that a request timing out in the queue is removed from it."""
+        scheduler = self.scheduler(queue_timeout=0.01)
+        ticket = await scheduler.acquire("medium")
+        with self.assertRaises(AdmissionRejected):
+            await scheduler.acquire("high")
+        self.assertEqual(scheduler.queue_depth(), 0)
+        scheduler.release(ticket)
+
+    def test_concurrency_for_quota(self):
+        """Test deriving the concurrency cap from a TPM quota."""
+        # 240k TPM, 2k tokens per run, 10s runs: 120 runs/min over 6 runs/min/slot.
+        self.assertEqual(concurrency_for_quota(240000, 2000, 10), 20)
+        self.assertEqual(concurrency_for_quota(1000, 2000, 10), 1)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
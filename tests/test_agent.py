@@ -58,6 +58,13 @@ class TestLumenBrandConfig(unittest.TestCase):
         css = self.brand_config.get_css_variables()
         self.assertIn("--lumen-primary: #3b82f6", css)
     
+    def test_wrappers_memoized(self):
+        """Test that the header and footer are built once and wrap answers as before."""
+        self.assertIs(self.brand_config.get_header(), self.brand_config.get_header())
+        prefix, suffix = self.brand_config.get_response_wrappers()
+        expected = f"{self.brand_config.get_header()}\n\nAnswer\n\n{self.brand_config.get_footer()}"
+        self.assertEqual(prefix + "Answer" + suffix, expected)
+    
     def test_styled_message(self):
         """Test that styled messages are formatted correctly."""
         message = self.brand_config.get_styled_message("Test message", "info")
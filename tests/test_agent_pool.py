@@ -0,0 +1,114 @@
+"""
+Tests for the process-wide agent pool.
+"""
+
+import asyncio
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.agent_pool import AgentPool, AsyncAgentPool, AgentPoolExhausted
+
+class FakeAgent:
+    """Minimal stand-in for MagenticOneAgent."""
+
+    created = 0
+
+    def __init__(self, project_client=None, agent=None):
+        FakeAgent.created += 1
+        self.project_client = project_client or object()
+        self.agent = agent
+        self.thread = None
+        self.initialized = 0
+        self.cleaned_up = False
+
+    def initialize_agent(self):
+        self.initialized += 1
+        self.agent = type("AgentDefinition", (), {"id": "asst_shared"})()
+        return self.agent
+
+    def reset_session(self):
+        self.thread = None
+
+    def cleanup(self):
+        self.cleaned_up = True
+
+class TestAgentPool(unittest.TestCase):
+    """Test leasing and sharing behaviour of the agent pool."""
+
+    def setUp(self):
+        FakeAgent.created = 0
+        self.pool = AgentPool(FakeAgent, size=2, warm_up=True, lease_timeout=0.01)
+
+    def test_agents_share_client_and_definition(self):
+        """Test that pooled agents share one client and one remote agent."""
+        self.pool.start()
+        with self.pool.lease() as first:
+            with self.pool.lease() as second:
+                self.assertIs(first.project_client, second.project_client)
+                self.assertEqual(first.agent.id, "asst_shared")
+                self.assertIs(first.agent, second.agent)
+        self.assertEqual(FakeAgent.created, 2)
+
+    def test_lease_resets_session(self):
+        """Test that a released agent forgets its thread."""
+        with self.pool.lease() as agent:
+            agent.thread = "thread_1"
+        self.assertIsNone(agent.thread)
+
+    def test_exhausted_pool_raises(self):
+        """Test that leasing beyond the pool size times out."""
+        with self.pool.lease(), self.pool.lease():
+            with self.assertRaises(AgentPoolExhausted):
+                with self.pool.lease():
+                    pass
+        self.assertEqual(self.pool.health()["lease_timeouts"], 1)
+
+    def test_close_cleans_up_primary(self):
+        """Test that closing the pool releases the shared client."""
+        self.pool.start()
+        primary = self.pool._primary
+        self.pool.close()
+        self.assertTrue(primary.cleaned_up)
+        self.assertFalse(self.pool.health()["started"])
+
+class FakeAsyncAgent(FakeAgent):
+    """Minimal stand-in for AsyncMagenticOneAgent."""
+
+    async def initialize_agent(self):
+        return super().initialize_agent()
+
+    async def cleanup(self):
+        super().cleanup()
+
+class TestAsyncAgentPool(unittest.IsolatedAsyncioTestCase):
+    """Test the asyncio agent pool."""
+
+    async def test_concurrent_leases_share_definition(self):
+        """Test that concurrent requests lease distinct agents sharing one definition."""
+        pool = AsyncAgentPool(FakeAsyncAgent, size=3, warm_up=True, lease_timeout=1)
+        seen = []
+
+        async def request():
+            async with pool.lease() as agent:
+                seen.append(agent)
+                await asyncio.sleep(0.01)
+                return agent.agent.id
+
+        ids = await asyncio.gather(*(request() for _ in range(3)))
+        self.assertEqual(set(ids), {"asst_shared"})
+        self.assertEqual(len({id(agent) for agent in seen}), 3)
+        await pool.close()
+
+    async def test_exhausted_pool_raises(self):
+        """Test that leasing beyond the pool size times out."""
+        pool = AsyncAgentPool(FakeAsyncAgent, size=1, warm_up=False, lease_timeout=0.01)
+        async with pool.lease():
+            with self.assertRaises(AgentPoolExhausted):
+                async with pool.lease():
+                    pass
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,163 @@
+"""
+Tests for the remote agent definition registry.
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+import tempfile
+import sys
+import os
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.agent_registry import AgentRegistry, AsyncAgentRegistry
+
+class FakeAgentClient:
+    """In-memory stand-in for the agents client."""
+
+    def __init__(self):
+        self.agents = {}
+        self.created = 0
+
+    def create_agent(self, model, name, instructions, tools, tool_resources, metadata):
+        self.created += 1
+        agent = SimpleNamespace(id=f"asst_{self.created}", name=name, model=model, metadata=metadata)
+        self.agents[agent.id] = agent
+        return agent
+
+    def get_agent(self, agent_id):
+        if agent_id not in self.agents:
+            raise KeyError(agent_id)
+        return self.agents[agent_id]
+
+    def list_agents(self):
+        return list(self.agents.values())
+
+    def delete_agent(self, agent_id):
+        del self.agents[agent_id]
+
+class AsyncFakeAgentClient(FakeAgentClient):
+    """Async variant of FakeAgentClient."""
+
+    async def create_agent(self, *args, **kwargs):
+        return FakeAgentClient.create_agent(self, *args, **kwargs)
+
+    async def get_agent(self, agent_id):
+        return FakeAgentClient.get_agent(self, agent_id)
+
+    async def list_agents(self):
+        for agent in FakeAgentClient.list_agents(self):
+            yield agent
+
+    async def delete_agent(self, agent_id):
+        FakeAgentClient.delete_agent(self, agent_id)
+
+class TestAgentRegistry(unittest.TestCase):
+    """Test lookup, persistence and garbage collection of agent definitions."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_path = os.path.join(self.tmp.name, "registry.json")
+        self.client = FakeAgentClient()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _get(self, registry, instructions="Help partners scale."):
+        return registry.get_or_create(model="gpt-4", name="lumen-agent", instructions=instructions, tools=[])
+
+    def test_reuses_cached_agent(self):
+        """Test that identical definitions create only one agent."""
+        registry = AgentRegistry(self.client, self.cache_path)
+        first = self._get(registry)
+        second = self._get(AgentRegistry(self.client, self.cache_path))
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(self.client.created, 1)
+
+    def test_changed_instructions_create_new_agent(self):
+        """Test that a new definition hash creates a new agent."""
+        registry = AgentRegistry(self.client, self.cache_path)
+        first = self._get(registry)
+        second = self._get(registry, instructions="Different guidance.")
+        self.assertNotEqual(first.id, second.id)
+
+    def test_recovers_from_remote_metadata(self):
+        """Test that a cold cache finds the existing agent by its metadata hash."""
+        self._get(AgentRegistry(self.client, self.cache_path))
+        os.remove(self.cache_path)
+        self._get(AgentRegistry(self.client, self.cache_path))
+        self.assertEqual(self.client.created, 1)
+
+    def test_recreates_deleted_agent(self):
+        """Test that a cached ID deleted remotely is replaced."""
+        registry = AgentRegistry(self.client, self.cache_path)
+        first = self._get(registry)
+        self.client.delete_agent(first.id)
+        second = self._get(registry)
+        self.assertNotEqual(first.id, second.id)
+
+    def test_collect_garbage(self):
+        """Test that unreferenced duplicates are deleted."""
+        registry = AgentRegistry(self.client, self.cache_path)
+        self.client.create_agent("gpt-4", "lumen-agent", "old", [], None, {})
+        current = self._get(registry)
+        self.assertEqual(registry.collect_garbage("lumen-agent", dry_run=True), ["asst_1"])
+        self.assertEqual(registry.collect_garbage("lumen-agent"), ["asst_1"])
+        self.assertEqual(list(self.client.agents), [current.id])
+
+    def test_collect_superseded_definition(self):
+        """Test that the agent of an earlier definition is collected once the instructions change."""
+        registry = AgentRegistry(self.client, self.cache_path)
+        old = self._get(registry)
+        current = self._get(registry, instructions="Different guidance.")
+        self.assertEqual(registry.collect_garbage("lumen-agent"), [old.id])
+        self.assertEqual(list(self.client.agents), [current.id])
+        self.assertEqual(self._get(AgentRegistry(self.client, self.cache_path), "Different guidance.").id, current.id)
+
+class TestAsyncAgentRegistry(unittest.IsolatedAsyncioTestCase):
+    """Test the async registry's cross-worker lock and garbage collection."""
+
+    async def test_collect_superseded_definition(self):
+        """Test that the agent of an earlier definition is collected once the instructions change."""
+        with tempfile.TemporaryDirectory() as tmp:
+            client = AsyncFakeAgentClient()
+            registry = AsyncAgentRegistry(client, cache_path=os.path.join(tmp, "registry.json"))
+            old = await registry.get_or_create("gpt-4", "lumen-agent", "Help partners scale.")
+            current = await registry.get_or_create("gpt-4", "lumen-agent", "Different guidance.")
+            self.assertEqual(await registry.collect_garbage("lumen-agent"), [old.id])
+            self.assertEqual(list(client.agents), [current.id])
+
+    async def test_file_lock_wait_leaves_loop_free(self):
+        """Test that waiting for another worker's cache lock does not block the event loop."""
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = os.path.join(tmp, "registry.json")
+            registry = AsyncAgentRegistry(AsyncFakeAgentClient(), cache_path=cache_path)
+            sibling = AgentRegistry(FakeAgentClient(), cache_path=cache_path)
+            locked = threading.Event()
+            ticks = []
+
+            def hold_lock():
+                with sibling._shared_lock():
+                    locked.set()
+                    time.sleep(0.3)
+
+            async def tick():
+                while True:
+                    ticks.append(time.monotonic())
+                    await asyncio.sleep(0.01)
+
+            holder = threading.Thread(target=hold_lock)
+            holder.start()
+            locked.wait()
+            ticker = asyncio.create_task(tick())
+            agent = await registry.get_or_create("gpt-4o", "support", "Be helpful")
+            ticker.cancel()
+            holder.join()
+            self.assertGreater(len(ticks), 10)
+            self.assertEqual(agent.id, "asst_1")
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,188 @@
+"""
+Tests for batch execution and resumption.
+"""
+
+import asyncio
+import unittest
+import tempfile
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends.fake_agents import AsyncFakeProjectClient, FakeAgentsConfig, FakeAgentsService, FakeProjectClient
+from services.batch import BatchItemError, BatchJobStore, run_batch, run_batch_async
+from services.circuit_breaker import CircuitBreaker
+from services.run_resilience import RunResilience
+
+ITEMS = [
+    {"type": "query", "query": "What cloud solutions fit SMBs?"},
+    {"type": "technical", "technical_issue": "SD-WAN packet loss", "urgency": "high"},
+    {"type": "scaling", "partner_profile": {"partner_name": "Acme"}}
+]
+
+class TestRunBatch(unittest.TestCase):
+    """Test the thread-pool batch runner."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = BatchJobStore(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_results_in_input_order(self):
+        """Test that results keep input order with per-item status and timing."""
+        summary = run_batch(ITEMS, lambda item: item["type"], max_concurrency=3, store=self.store)
+        self.assertEqual([r["response"] for r in summary["results"]], ["query", "technical", "scaling"])
+        self.assertEqual(summary["status"], "completed")
+        self.assertTrue(all("duration_ms" in r for r in summary["results"]))
+
+    def test_resume_reruns_only_failures(self):
+        """Test that resuming a job only re-runs items that did not succeed."""
+        def flaky(item):
+            if item["type"] == "technical":
+                raise RuntimeError("run failed")
+            return "ok"
+
+        first = run_batch(ITEMS, flaky, store=self.store)
+        self.assertEqual(first["status"], "partial")
+        self.assertEqual(first["results"][1]["error"], "run failed")
+
+        calls = []
+        def recorder(item):
+            calls.append(item["type"])
+            return "ok"
+
+        resumed = run_batch([], recorder, store=self.store, job_id=first["job_id"])
+        self.assertEqual(calls, ["technical"])
+        self.assertEqual(resumed["status"], "completed")
+        self.assertEqual(resumed["resumed"], 2)
+
+    def test_invalid_item_rejected(self):
+        """Test that items with unknown types or missing fields are rejected up front."""
+        with self.assertRaises(BatchItemError):
+            run_batch([{"type": "technical"}], lambda item: "", store=self.store)
+        with self.assertRaises(BatchItemError):
+            run_batch([{"type": "unknown"}], lambda item: "", store=self.store)
+
+    def test_results_appended_per_item(self):
+        """Test that each result is one appended line and the latest line for an item wins."""
+        first = run_batch(ITEMS, lambda item: "ok", store=self.store)
+        job_id = first["job_id"]
+        self.store.save_result(job_id, 1, {"status": "error", "response": None, "error": "retry"})
+        with open(os.path.join(self.tmp.name, f"{job_id}.results.jsonl"), "a") as f:
+            f.write('{"index": 2, "status": "err')
+        job = self.store.load(job_id)
+        self.assertEqual([r["status"] for r in job["results"]], ["success", "error", "success"])
+        with open(os.path.join(self.tmp.name, f"{job_id}.json")) as f:
+            self.assertEqual(f.read().count('"success"'), 0)
+
+    def test_unknown_job(self):
+        """Test that resuming an unknown job raises KeyError."""
+        with self.assertRaises(KeyError):
+            run_batch([], lambda item: "", store=self.store, job_id="missing")
+
+class TestRunBatchAsync(unittest.IsolatedAsyncioTestCase):
+    """Test the asyncio batch runner."""
+
+    async def test_bounded_concurrency(self):
+        """Test that no more than max_concurrency items run at once."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        in_flight = 0
+        peak = 0
+
+        async def handler(item):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return item["type"]
+
+        summary = await run_batch_async(ITEMS * 3, handler, max_concurrency=2, store=BatchJobStore(tmp.name))
+        self.assertEqual(peak, 2)
+        self.assertEqual(summary["total"], 9)
+        self.assertEqual(summary["failed"], 0)
+
+class TestAgentBatchThreads(unittest.IsolatedAsyncioTestCase):
+    """Test that batch items do not leave their threads behind on the backend."""
+
+    def setUp(self):
+        self.service = FakeAgentsService(FakeAgentsConfig(
+            call_latency=0, run_seconds=0, run_jitter=0, token_delay=0, failure_rate=0, response_words=5, seed=1
+        ))
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.env = {
+            "AGENT_BACKEND": "fake",
+            "RUN_POLL_STRATEGY": "fixed",
+            "RUN_POLL_INTERVAL": "0.001",
+            "RESPONSE_CACHE_ENABLED": "false",
+            "COALESCE_ENABLED": "false",
+            "BATCH_JOB_DIR": os.path.join(tmp.name, "jobs"),
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(tmp.name, "registry.json")
+        }
+        # Failed runs must not open the process-wide circuit for other tests.
+        breaker = mock.patch("magentic_one_agent.get_circuit_breaker", return_value=CircuitBreaker(enabled=False))
+        breaker.start()
+        self.addCleanup(breaker.stop)
+
+    def test_sync_batch_deletes_item_threads(self):
+        """Test that every item's thread is deleted after the batch."""
+        from magentic_one_agent import MagenticOneAgent
+
+        with mock.patch.dict(os.environ, self.env):
+            agent = MagenticOneAgent(project_client=FakeProjectClient(self.service))
+            summary = agent.handle_batch(ITEMS * 2, max_concurrency=3)
+        self.assertEqual(summary["failed"], 0)
+        self.assertEqual(len(self.service.runs), 6)
+        self.assertEqual(self.service.threads, {})
+
+    def test_failed_runs_are_item_errors(self):
+        """Test that items whose run failed are errors, not the apology marked as success, and are resumed."""
+        from magentic_one_agent import MagenticOneAgent
+
+        self.service.config.failure_rate = 1.0
+        with mock.patch.dict(os.environ, self.env), \
+                mock.patch("magentic_one_agent.get_run_resilience", return_value=RunResilience(max_retries=0)):
+            agent = MagenticOneAgent(project_client=FakeProjectClient(self.service))
+            first = agent.handle_batch(ITEMS, max_concurrency=3)
+            self.assertEqual(first["status"], "partial")
+            self.assertEqual([r["status"] for r in first["results"]], ["error"] * 3)
+            self.assertIsNone(first["results"][0]["response"])
+
+            self.service.config.failure_rate = 0
+            resumed = agent.handle_batch([], job_id=first["job_id"])
+        self.assertEqual(resumed["status"], "completed")
+        self.assertEqual(resumed["resumed"], 0)
+
+    def test_open_circuit_items_are_errors(self):
+        """Test that canned replies sent while the circuit is open are item errors, so a resume runs them."""
+        from magentic_one_agent import MagenticOneAgent
+
+        circuit = CircuitBreaker(min_calls=1, failure_rate=0.5, open_seconds=30, enabled=True)
+        circuit.record(False)
+        with mock.patch.dict(os.environ, self.env), \
+                mock.patch("magentic_one_agent.get_circuit_breaker", return_value=circuit):
+            agent = MagenticOneAgent(project_client=FakeProjectClient(self.service))
+            summary = agent.handle_batch(ITEMS, max_concurrency=3)
+        self.assertEqual([r["status"] for r in summary["results"]], ["error"] * 3)
+        self.assertIn("circuit_open", summary["results"][0]["error"])
+        self.assertEqual(self.service.runs, {})
+
+    async def test_async_batch_deletes_item_threads(self):
+        """Test that every item's thread is deleted, including items whose run failed."""
+        from magentic_one_agent import AsyncMagenticOneAgent
+
+        self.service.config.failure_rate = 0.5
+        with mock.patch.dict(os.environ, self.env):
+            agent = AsyncMagenticOneAgent(project_client=AsyncFakeProjectClient(self.service))
+            await agent.handle_batch(ITEMS * 2, max_concurrency=3)
+        self.assertGreaterEqual(len(self.service.runs), 6)
+        self.assertEqual(self.service.threads, {})
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
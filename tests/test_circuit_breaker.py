@@ -0,0 +1,198 @@
+"""
+Tests for the agent backend circuit breaker and degraded responses.
+"""
+
+import tempfile
+import time
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends.fake_agents import FakeAgentsConfig, FakeAgentsService, FakeProjectClient
+from services.circuit_breaker import CircuitBreaker
+from services.response_cache import ResponseCache
+
+try:
+    from fastapi.testclient import TestClient
+except ImportError:  # pragma: no cover - optional dependency
+    TestClient = None
+
+def breaker(**overrides):
+    settings = dict(failure_rate=0.5, slow_call_rate=0.8, slow_call_seconds=10, min_calls=4, window=60,
+                    open_seconds=0.05, half_open_trials=2, enabled=True)
+    settings.update(overrides)
+    return CircuitBreaker(**settings)
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test the closed, open and half-open states."""
+
+    def test_trips_on_failure_rate(self):
+        """Test that the circuit opens once enough calls failed, and not before min_calls."""
+        circuit = breaker()
+        for success in (True, False, False):
+            self.assertTrue(circuit.allow())
+            circuit.record(success, 0.1)
+        self.assertEqual(circuit.state, "closed")
+        circuit.record(True, 0.1)
+        self.assertEqual(circuit.state, "open")
+        self.assertFalse(circuit.allow())
+        self.assertEqual(circuit.stats()["rejected"], 1)
+
+    def test_trips_on_slow_calls(self):
+        """Test that successful but slow calls also open the circuit."""
+        circuit = breaker()
+        for _ in range(4):
+            circuit.record(True, 30)
+        self.assertEqual(circuit.state, "open")
+
+    def test_half_open_probes(self):
+        """Test that probes are limited, close the circuit on success and reopen it on failure."""
+        circuit = breaker(min_calls=1)
+        circuit.record(False)
+        time.sleep(0.06)
+        self.assertTrue(circuit.allow())
+        self.assertEqual(circuit.state, "half_open")
+        self.assertTrue(circuit.allow())
+        self.assertFalse(circuit.allow())
+        circuit.record(None)
+        self.assertTrue(circuit.allow())
+        circuit.record(True, 0.1)
+        circuit.record(True, 0.1)
+        self.assertEqual(circuit.state, "closed")
+
+        circuit.record(False)
+        time.sleep(0.06)
+        circuit.allow()
+        circuit.record(False)
+        self.assertEqual(circuit.state, "open")
+
+    def test_disabled(self):
+        """Test that a disabled breaker never rejects."""
+        circuit = breaker(enabled=False, min_calls=1)
+        circuit.record(False)
+        self.assertTrue(circuit.allow())
+
+    def test_is_open_takes_no_probe(self):
+        """Test that is_open() reports rejection without using up half-open probes."""
+        circuit = breaker(min_calls=1, half_open_trials=1)
+        self.assertFalse(circuit.is_open())
+        circuit.record(False)
+        self.assertTrue(circuit.is_open())
+        time.sleep(0.06)
+        self.assertFalse(circuit.is_open())
+        self.assertFalse(circuit.is_open())
+        self.assertTrue(circuit.allow())
+        self.assertTrue(circuit.is_open())
+
+class TestDegradedResponses(unittest.TestCase):
+    """Test that an open circuit answers without calling the backend."""
+
+    def setUp(self):
+        from magentic_one_agent import MagenticOneAgent
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.service = FakeAgentsService(FakeAgentsConfig(
+            call_latency=0, run_seconds=0, run_jitter=0, token_delay=0, failure_rate=0, response_words=5, seed=1
+        ))
+        with mock.patch.dict(os.environ, {
+            "AGENT_BACKEND": "fake",
+            "RUN_POLL_STRATEGY": "fixed",
+            "RUN_POLL_INTERVAL": "0.001",
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(self.tmp.name, "registry.json")
+        }):
+            self.agent = MagenticOneAgent(project_client=FakeProjectClient(self.service))
+        self.agent.response_cache = ResponseCache(ttl=0, stale_ttl=60)
+        self.agent.coalescer = None
+        self.agent.circuit_breaker = breaker(min_calls=1, open_seconds=60)
+
+    def test_failures_open_circuit_and_canned_answer_is_branded(self):
+        """Test that failed runs trip the breaker and later requests get the category's canned answer."""
+        self.service.config.failure_rate = 1.0
+        self.agent.run_resilience.max_retries = 0
+        self.agent.handle_technical_support("VPN tunnel down at HQ", urgency="critical")
+        self.assertEqual(self.agent.circuit_breaker.state, "open")
+
+        calls = self.service.calls
+        response = self.agent.handle_technical_support("VPN tunnel down at HQ", urgency="critical")
+        self.assertEqual(self.service.calls, calls)
+        self.assertEqual(self.agent.last_run_outcome, "circuit_open")
+        self.assertIn(self.agent.brand_config.get_header(), response)
+        self.assertIn("connectivity", response)
+        self.assertIn("partner manager now", response)
+
+    def test_stale_answer_served_while_open(self):
+        """Test that an expired cached answer is preferred over the canned one."""
+        answer = self.agent.handle_customer_query("What is SD-WAN?")
+        self.agent.circuit_breaker.record(False)
+        self.assertEqual(self.agent.handle_customer_query("What is SD-WAN?"), answer)
+        self.assertEqual(self.agent.last_cache_status, "stale")
+
+    def test_stream_degraded(self):
+        """Test that streaming answers with the canned message while the circuit is open."""
+        self.agent.circuit_breaker.record(False)
+        events = list(self.agent.stream_partner_scaling_recommendations({"focus_area": "cloud hosting"}, events=True))
+        self.assertEqual([event for event, _ in events], ["header", "delta", "footer"])
+        self.assertIn("cloud infrastructure", events[1][1])
+
+@unittest.skipUnless(TestClient is not None, "fastapi is not installed")
+class TestDegradedEndpoints(unittest.TestCase):
+    """Test that the API fails fast, before leasing or opening a session, while the circuit is open."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.env = mock.patch.dict(os.environ, {
+            "AGENT_BACKEND": "fake",
+            "STARTUP_MODE": "eager",
+            "FAKE_AGENTS_CALL_LATENCY_MS": "0",
+            "FAKE_AGENTS_RUN_SECONDS": "0",
+            "FAKE_AGENTS_TOKEN_DELAY_MS": "0",
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(cls.tmp.name, "registry.json"),
+            "JOB_DB_PATH": os.path.join(cls.tmp.name, "jobs.sqlite3")
+        })
+        cls.env.start()
+        import app
+
+        cls.app = app
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        self.circuit = breaker(min_calls=1, open_seconds=60)
+        patcher = mock.patch("services.circuit_breaker._default", self.circuit)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_open_circuit_skips_backend_setup(self):
+        """Test that no agent definition, session thread or admission slot is used while open."""
+        with TestClient(self.app.app) as client:
+            self.circuit.record(False)
+            definition = mock.AsyncMock(side_effect=AssertionError("agent definition requested"))
+            sessions = self.app.session_manager
+            with mock.patch.object(self.app.agent_pool, "_ensure_agent_definition", definition), \
+                    mock.patch.object(sessions, "session", side_effect=AssertionError("session opened")), \
+                    mock.patch.object(self.app.admission, "acquire", side_effect=AssertionError("admitted")):
+                response = client.post("/query", json={
+                    "query": "Is the portal down?", "partner_info": {"partner_name": "Open Circuit Ltd"}
+                })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Run-Outcome"], "circuit_open")
+
+    def test_setup_failures_count_against_circuit(self):
+        """Test that a failing agent definition call is recorded as a backend failure."""
+        with TestClient(self.app.app) as client:
+            definition = mock.AsyncMock(side_effect=RuntimeError("backend unreachable"))
+            with mock.patch.object(self.app.agent_pool, "_ensure_agent_definition", definition):
+                response = client.post("/query", json={"query": "Is the portal down?"})
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.circuit.state, "open")
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,103 @@
+"""
+Tests for single-flight request coalescing.
+"""
+
+import asyncio
+import threading
+import time
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.coalescing import AsyncSingleFlight, SingleFlight, coalescing_key
+
+class TestSingleFlight(unittest.TestCase):
+    """Test the thread-based single-flight group."""
+
+    def test_concurrent_calls_share_one_run(self):
+        """Test that callers arriving while a run is in flight get its result."""
+        flight = SingleFlight(window=0)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def run():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return "answer"
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do("k", run)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=lambda: results.append(flight.do("k", run))) for _ in range(3)]
+        for follower in followers:
+            follower.start()
+        while flight.stats()["coalesced"] < 3:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertTrue(all(result == "answer" for result, _ in results))
+
+    def test_window_reuses_recent_result(self):
+        """Test that a finished result is shared within the window and not after it."""
+        flight = SingleFlight(window=60)
+        self.assertEqual(flight.do("k", lambda: "first"), ("first", False))
+        self.assertEqual(flight.do("k", lambda: "second"), ("first", True))
+        flight.window = 0
+        self.assertEqual(flight.do("k", lambda: "third"), ("third", False))
+
+    def test_errors_are_not_kept(self):
+        """Test that a failed run is not reused by later callers."""
+        flight = SingleFlight(window=60)
+
+        def fail():
+            raise RuntimeError("run failed")
+
+        with self.assertRaises(RuntimeError):
+            flight.do("k", fail)
+        self.assertEqual(flight.do("k", lambda: "ok"), ("ok", False))
+
+    def test_key_includes_scope(self):
+        """Test that the same prompt in different cache scopes does not coalesce."""
+        self.assertNotEqual(coalescing_key("prompt", "gold"), coalescing_key("prompt", "silver"))
+
+class TestAsyncSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Test the asyncio single-flight group."""
+
+    async def test_concurrent_coroutines_share_one_run(self):
+        """Test that concurrent awaits of one key trigger a single run."""
+        flight = AsyncSingleFlight(window=0)
+        calls = 0
+
+        async def run():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.do("k", run) for _ in range(5)))
+        self.assertEqual(calls, 1)
+        self.assertEqual([shared for _, shared in results].count(False), 1)
+        self.assertEqual(flight.stats()["coalesced"], 4)
+
+    async def test_leader_failure_propagates(self):
+        """Test that followers receive the leader's error."""
+        flight = AsyncSingleFlight(window=0)
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("run failed")
+
+        results = await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in results))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
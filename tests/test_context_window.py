@@ -0,0 +1,132 @@
+"""
+Tests for session thread truncation and rolling summaries.
+"""
+
+import tempfile
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends.fake_agents import FakeAgentsConfig, FakeAgentsService, FakeProjectClient
+from services.context_window import ContextWindow, prompt_tokens, summarize_turns
+from services.state import SQLiteStateStore
+from services.token_budget import estimate_tokens
+
+LONG_ANSWER = "Check the tunnel status on the edge device and confirm the overlay routes. " * 40
+
+class TestContextWindow(unittest.TestCase):
+    """Test the per-thread bookkeeping and the run options it produces."""
+
+    def test_none_strategy_passes_nothing(self):
+        """Test that the default strategy leaves runs unchanged."""
+        window = ContextWindow(strategy="none")
+        self.assertIsNone(window.before_turn("thread_1", "Hello"))
+        self.assertEqual(window.run_options("thread_1"), {})
+
+    def test_truncate_options(self):
+        """Test that truncation asks runs to read only the last messages."""
+        window = ContextWindow(strategy="truncate", last_messages=6, max_prompt_tokens=2000)
+        self.assertEqual(window.run_options("thread_1"), {
+            "max_prompt_tokens": 2000,
+            "truncation_strategy": {"type": "last_messages", "last_messages": 6}
+        })
+
+    def test_unknown_strategy_rejected(self):
+        """Test that a misspelled strategy fails at startup instead of being ignored."""
+        with self.assertRaises(ValueError):
+            ContextWindow(strategy="sumarize")
+
+    def test_summarize_past_the_cap(self):
+        """Test that older turns are folded into a summary once the thread passes the cap."""
+        window = ContextWindow(strategy="summarize", max_session_tokens=500, summary_tokens=150)
+        self.assertIsNone(window.before_turn("thread_1", "How do I check SD-WAN tunnels?"))
+        window.after_turn("thread_1", "How do I check SD-WAN tunnels?", LONG_ANSWER)
+        self.assertNotIn("truncation_strategy", window.run_options("thread_1"))
+
+        summary = window.before_turn("thread_1", "And the overlay routes?")
+        self.assertIn("Q1: How do I check SD-WAN tunnels?", summary)
+        self.assertLessEqual(estimate_tokens(summary), 150)
+        # The summary and the prompt posted after it.
+        self.assertEqual(window.run_options("thread_1")["truncation_strategy"]["last_messages"], 2)
+        window.after_turn("thread_1", "And the overlay routes?", "Use the route table view.")
+        self.assertEqual(window.run_options("thread_1")["truncation_strategy"]["last_messages"], 4)
+        self.assertEqual(window.stats()["threads"], 1)
+
+    def test_turns_observed(self):
+        """Test that reported prompt usage is recorded in the histogram."""
+        window = ContextWindow(strategy="truncate")
+        before = prompt_tokens.count(strategy="truncate")
+        window.after_turn("thread_1", "Hello", "Hi", SimpleNamespace(usage=SimpleNamespace(prompt_tokens=120)))
+        self.assertEqual(prompt_tokens.count(strategy="truncate"), before + 1)
+
+    def test_summary_keeps_recent_turns_within_limit(self):
+        """Test that a long history is shortened to fit, keeping the latest turn."""
+        turns = [(f"Question {number} about routing?", LONG_ANSWER) for number in range(1, 30)]
+        summary = summarize_turns(turns, "Summary of the earlier conversation: Partner asked about VPNs.", 120)
+        self.assertLessEqual(estimate_tokens(summary), 120)
+        self.assertIn("Question 29 about routing?", summary)
+
+class TestSharedContextWindow(unittest.TestCase):
+    """Test that summarize bookkeeping is shared by workers through the state store."""
+
+    def test_other_worker_continues_thread(self):
+        """Test that a follow-up on another worker sees the turns and summary recorded by the first."""
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteStateStore(os.path.join(tmp, "state.sqlite3"))
+            self.addCleanup(store.close)
+            first, second = (ContextWindow(strategy="summarize", max_session_tokens=500, summary_tokens=150, store=store)
+                             for _ in range(2))
+            first.after_turn("thread_1", "How do I check SD-WAN tunnels?", LONG_ANSWER)
+
+            summary = second.before_turn("thread_1", "And the overlay routes?")
+            self.assertIn("Q1: How do I check SD-WAN tunnels?", summary)
+            self.assertEqual(first.run_options("thread_1")["truncation_strategy"]["last_messages"], 2)
+
+            first.forget("thread_1")
+            self.assertEqual(second.run_options("thread_1"), {})
+
+    def test_other_strategies_stay_local(self):
+        """Test that strategies which never read their bookkeeping back do not write to the store."""
+        store = mock.Mock()
+        window = ContextWindow(strategy="truncate", store=store)
+        window.after_turn("thread_1", "Hello", "Hi")
+        self.assertIsNone(window.store)
+        store.set.assert_not_called()
+
+class TestContextWindowOnFakeBackend(unittest.TestCase):
+    """Test that prompt tokens stay bounded over a long session."""
+
+    def run_session(self, window, turns=12):
+        service = FakeAgentsService(FakeAgentsConfig(
+            call_latency=0, run_seconds=0, run_jitter=0, token_delay=0, failure_rate=0, response_words=80, seed=1
+        ))
+        from magentic_one_agent import MagenticOneAgent
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(os.environ, {
+            "AGENT_BACKEND": "fake",
+            "RUN_POLL_STRATEGY": "fixed",
+            "RUN_POLL_INTERVAL": "0.001",
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(tmp, "registry.json")
+        }):
+            agent = MagenticOneAgent(project_client=FakeProjectClient(service))
+            agent.context_window = window
+            agent.initialize_agent()
+            for turn in range(turns):
+                agent.handle_customer_query(f"Follow-up {turn} on the SD-WAN rollout", use_cache=False)
+        return [run.prompt_tokens for run in service.runs.values()]
+
+    def test_prompt_tokens_bounded(self):
+        """Test that truncation and summaries stop the prompt from growing with every turn."""
+        full = self.run_session(ContextWindow(strategy="none"))
+        truncated = self.run_session(ContextWindow(strategy="truncate", last_messages=4))
+        summarized = self.run_session(ContextWindow(strategy="summarize", max_session_tokens=800, summary_tokens=200))
+        self.assertGreater(full[-1], 4 * full[1])
+        self.assertLess(max(truncated), full[-1] / 2)
+        self.assertLess(max(summarized), full[-1] / 2)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,136 @@
+"""
+Tests for the shared credential and its access token cache.
+"""
+
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.credentials import AsyncSharedCredential, SharedCredential, _TokenFile
+
+SCOPE = "https://ai.azure.com/.default"
+
+class ChainCredential:
+    """Stands in for DefaultAzureCredential, counting how often it is asked for a token."""
+
+    def __init__(self, lifetime=3600, delay=0):
+        self.lifetime = lifetime
+        self.delay = delay
+        self.calls = 0
+
+    def get_token(self, *scopes, **kwargs):
+        self.calls += 1
+        time.sleep(self.delay)
+        return SimpleNamespace(token=f"token-{self.calls}", expires_on=int(time.time() + self.lifetime))
+
+    def close(self):
+        pass
+
+class AsyncChainCredential(ChainCredential):
+    async def get_token(self, *scopes, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return SimpleNamespace(token=f"token-{self.calls}", expires_on=int(time.time() + self.lifetime))
+
+    async def close(self):
+        pass
+
+class TestSharedCredential(unittest.TestCase):
+    """Test token reuse, proactive refresh and sharing between workers."""
+
+    def test_token_reused_until_refresh_margin(self):
+        """Test that the chain is walked once for repeated requests."""
+        chain = ChainCredential()
+        credential = SharedCredential(chain, refresh_margin=300)
+        tokens = {credential.get_token(SCOPE).token for _ in range(5)}
+        self.assertEqual(tokens, {"token-1"})
+        self.assertEqual(chain.calls, 1)
+        self.assertEqual(credential.stats()["chain_walks"], 1)
+
+    def test_refresh_in_background_near_expiry(self):
+        """Test that a token inside the refresh margin is still served while a new one is fetched."""
+        chain = ChainCredential(lifetime=120)
+        credential = SharedCredential(chain, refresh_margin=300)
+        credential.get_token(SCOPE)
+        self.assertEqual(credential.get_token(SCOPE).token, "token-1")
+        for _ in range(100):
+            if credential.stats()["chain_walks"] == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(credential.get_token(SCOPE).token, "token-2")
+
+    def test_expired_token_fetched_inline(self):
+        """Test that a token too close to expiry is not handed out."""
+        chain = ChainCredential(lifetime=10)
+        credential = SharedCredential(chain, refresh_margin=0)
+        credential.get_token(SCOPE)
+        self.assertEqual(credential.get_token(SCOPE).token, "token-2")
+
+    def test_claims_challenge_bypasses_cache(self):
+        """Test that a claims challenge always gets a fresh token."""
+        chain = ChainCredential()
+        credential = SharedCredential(chain)
+        credential.get_token(SCOPE)
+        self.assertEqual(credential.get_token(SCOPE, claims='{"access_token":{}}').token, "token-2")
+
+    def test_token_shared_through_file(self):
+        """Test that a second worker reuses the first worker's token from the cache file."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tokens.json")
+            first, second = ChainCredential(), ChainCredential()
+            token = SharedCredential(first, cache_path=path).get_token(SCOPE)
+            self.assertEqual(SharedCredential(second, cache_path=path).get_token(SCOPE).token, token.token)
+            self.assertEqual(second.calls, 0)
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+class TestAsyncSharedCredential(unittest.IsolatedAsyncioTestCase):
+    """Test the asyncio credential."""
+
+    async def test_concurrent_requests_walk_chain_once(self):
+        """Test that callers arriving during the first fetch wait for it instead of walking the chain."""
+        chain = AsyncChainCredential(delay=0.02)
+        credential = AsyncSharedCredential(chain)
+        tokens = await asyncio.gather(*(credential.get_token(SCOPE) for _ in range(10)))
+        self.assertEqual({token.token for token in tokens}, {"token-1"})
+        self.assertEqual(chain.calls, 1)
+        await credential.close()
+
+    async def test_file_lock_wait_leaves_loop_free(self):
+        """Test that waiting for another worker's token file lock does not block the event loop."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "tokens.json")
+            credential = AsyncSharedCredential(AsyncChainCredential(), cache_path=path)
+            sibling = _TokenFile(path)
+            locked = threading.Event()
+            ticks = []
+
+            def hold_lock():
+                with sibling._file_lock():
+                    locked.set()
+                    time.sleep(0.3)
+
+            async def tick():
+                while True:
+                    ticks.append(time.monotonic())
+                    await asyncio.sleep(0.01)
+
+            holder = threading.Thread(target=hold_lock)
+            holder.start()
+            locked.wait()
+            ticker = asyncio.create_task(tick())
+            token = await credential.get_token(SCOPE)
+            ticker.cancel()
+            holder.join()
+            await credential.close()
+            self.assertGreater(len(ticks), 10)
+            self.assertEqual(token.token, "token-1")
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
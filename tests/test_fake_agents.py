@@ -0,0 +1,111 @@
+"""
+Tests for the in-process fake agents backend.
+"""
+
+import tempfile
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends.fake_agents import (
+    AsyncFakeProjectClient, FakeAgentsConfig, FakeAgentsService, FakeProjectClient
+)
+
+def fast_service(**overrides):
+    config = dict(call_latency=0, run_seconds=0, run_jitter=0, token_delay=0, failure_rate=0, response_words=5, seed=1)
+    config.update(overrides)
+    return FakeAgentsService(FakeAgentsConfig(**config))
+
+class TestFakeAgentsClient(unittest.TestCase):
+    """Test the synchronous fake client."""
+
+    def setUp(self):
+        self.client = FakeProjectClient(fast_service()).agents
+        self.agent = self.client.create_agent(model="gpt-4", name="support", instructions="Be helpful")
+        self.thread = self.client.threads.create()
+
+    def test_run_completes_with_assistant_message(self):
+        """Test that a finished run appends a text message tied to the run."""
+        self.client.messages.create(thread_id=self.thread.id, role="user", content="Need SD-WAN help")
+        run = self.client.runs.create(thread_id=self.thread.id, agent_id=self.agent.id)
+        run = self.client.runs.get(thread_id=self.thread.id, run_id=run.id)
+        self.assertEqual(run.status, "completed")
+        messages = list(self.client.messages.list(thread_id=self.thread.id, run_id=run.id, limit=1))
+        self.assertEqual(messages[0].role, "assistant")
+        self.assertEqual(messages[0].content[0].type, "text")
+        self.assertIn("Need SD-WAN help", messages[0].content[0].text.value)
+
+    def test_failure_rate(self):
+        """Test that runs fail when the failure rate is 1."""
+        client = FakeProjectClient(fast_service(failure_rate=1.0)).agents
+        thread = client.threads.create()
+        run = client.runs.create(thread_id=thread.id, agent_id="asst_x")
+        self.assertEqual(client.runs.get(thread_id=thread.id, run_id=run.id).status, "failed")
+
+    def test_stream_yields_tokens(self):
+        """Test that streaming yields the answer token by token and then completes."""
+        self.client.messages.create(thread_id=self.thread.id, role="user", content="Hello")
+        with self.client.runs.stream(thread_id=self.thread.id, agent_id=self.agent.id) as stream:
+            events = list(stream)
+        deltas = [data.text for event, data, _ in events if event == "thread.message.delta"]
+        self.assertGreater(len(deltas), 1)
+        self.assertIn("thread.run.completed", [event for event, _, _ in events])
+
+    def test_one_active_run_per_thread(self):
+        """Test that a second run on a busy thread is rejected like the real service."""
+        client = FakeProjectClient(fast_service(run_seconds=60)).agents
+        thread = client.threads.create()
+        client.runs.create(thread_id=thread.id, agent_id="asst_x")
+        with self.assertRaises(RuntimeError):
+            client.runs.create(thread_id=thread.id, agent_id="asst_x")
+
+class TestAsyncFakeAgentsClient(unittest.IsolatedAsyncioTestCase):
+    """Test the asyncio fake client."""
+
+    async def test_async_stream(self):
+        """Test that the async stream context manager yields deltas."""
+        client = AsyncFakeProjectClient(fast_service()).agents
+        thread = await client.threads.create()
+        await client.messages.create(thread_id=thread.id, role="user", content="Hello")
+        text = ""
+        async with await client.runs.stream(thread_id=thread.id, agent_id="asst_x") as stream:
+            async for event, data, _ in stream:
+                if event == "thread.message.delta":
+                    text += data.text
+        messages = [message async for message in client.messages.list(thread_id=thread.id, limit=1)]
+        self.assertEqual(messages[0].content[0].text.value, text)
+
+class TestAgentOnFakeBackend(unittest.TestCase):
+    """Test the agent end to end without the Azure SDK."""
+
+    def test_query_round_trip(self):
+        """Test that a query is answered through the fake backend."""
+        from magentic_one_agent import MagenticOneAgent
+
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(os.environ, {
+            "AGENT_BACKEND": "fake",
+            "RUN_POLL_STRATEGY": "fixed",
+            "RUN_POLL_INTERVAL": "0.001",
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(tmp, "registry.json")
+        }):
+            agent = MagenticOneAgent(project_client=FakeProjectClient(fast_service()))
+            agent.initialize_agent()
+            response = agent.handle_customer_query("Need SD-WAN help", use_cache=False)
+        self.assertIn("Need SD-WAN help", response)
+
+    def test_empty_partner_fields_dropped(self):
+        """Test that blank partner fields, and the heading when none are left, are not sent."""
+        from magentic_one_agent import MagenticOneAgent
+
+        with mock.patch.dict(os.environ, {"AGENT_BACKEND": "fake"}):
+            agent = MagenticOneAgent(project_client=FakeProjectClient(fast_service()))
+        prompt = agent._enhance_query_with_context("Need help", {"partner_name": " ", "region": "EMEA", "focus_area": None})
+        self.assertIn("- Region: EMEA", prompt)
+        self.assertNotIn("Partner:", prompt)
+        self.assertNotIn("Partner Context", agent._enhance_query_with_context("Need help", {"partner_tier": ""}))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
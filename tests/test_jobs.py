@@ -0,0 +1,250 @@
+"""
+Tests for the SQLite job store and background job runner.
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends.fake_agents import AsyncFakeProjectClient, FakeAgentsConfig, FakeAgentsService
+from services.circuit_breaker import CircuitBreaker
+from services.jobs import JobRunner, JobStore, _PublicHTTPConnection, validate_webhook_url
+
+ITEM = {"type": "scaling", "partner_profile": {"partner_name": "Acme"}}
+
+class RetryLater(RuntimeError):
+    retry_after = 0.01
+
+def public_dns(address):
+    """getaddrinfo stand-in resolving every host to address."""
+    return mock.patch("services.jobs.socket.getaddrinfo", return_value=[
+        (socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", (address, 443))
+    ])
+
+class WebhookReceiver(BaseHTTPRequestHandler):
+    """Records POST paths; /redirect answers with a redirect to /internal."""
+
+    def do_POST(self):
+        self.server.paths.append(self.path)
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path == "/redirect":
+            self.send_response(302)
+            self.send_header("Location", "/internal")
+        else:
+            self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class TestJobRunner(unittest.IsolatedAsyncioTestCase):
+    """Test running, retrying and resuming jobs."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "jobs.sqlite3")
+        self.store = JobStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    async def wait_for(self, job_id, status):
+        for _ in range(200):
+            if self.store.get(job_id)["status"] == status:
+                return self.store.get(job_id, public=True)
+            await asyncio.sleep(0.01)
+        self.fail(f"job {job_id} never reached {status}")
+
+    async def test_submit_returns_immediately_and_completes(self):
+        """Test that a submitted job is queued and later holds its result."""
+        async def handler(job):
+            await asyncio.sleep(0.01)
+            return f"plan for {job['payload']['partner_profile']['partner_name']}"
+
+        runner = JobRunner(self.store, handler, max_concurrency=2)
+        await runner.start()
+        job = runner.submit("scaling", ITEM)
+        self.assertEqual(job["status"], "queued")
+        finished = await self.wait_for(job["id"], "succeeded")
+        self.assertEqual(finished["result"], "plan for Acme")
+        await runner.close()
+
+    async def test_concurrency_cap(self):
+        """Test that no more than max_concurrency jobs run at once."""
+        peak = 0
+
+        async def handler(job):
+            nonlocal peak
+            peak = max(peak, runner.running)
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        runner = JobRunner(self.store, handler, max_concurrency=2)
+        await runner.start()
+        jobs = [runner.submit("scaling", ITEM) for _ in range(6)]
+        for job in jobs:
+            await self.wait_for(job["id"], "succeeded")
+        self.assertEqual(peak, 2)
+        await runner.close()
+
+    async def test_retry_after_errors_requeue(self):
+        """Test that errors carrying retry_after are retried rather than failing the job."""
+        calls = 0
+
+        async def handler(job):
+            nonlocal calls
+            calls += 1
+            if calls < 3:
+                raise RetryLater("busy")
+            return "ok"
+
+        runner = JobRunner(self.store, handler, max_concurrency=1)
+        await runner.start()
+        job = runner.submit("scaling", ITEM)
+        finished = await self.wait_for(job["id"], "succeeded")
+        self.assertEqual(finished["attempts"], 3)
+        await runner.close()
+
+    async def test_failure_recorded(self):
+        """Test that ordinary errors fail the job with the error text."""
+        async def handler(job):
+            raise ValueError("run failed")
+
+        runner = JobRunner(self.store, handler)
+        await runner.start()
+        job = runner.submit("scaling", ITEM)
+        finished = await self.wait_for(job["id"], "failed")
+        self.assertEqual(finished["error"], "run failed")
+        await runner.close()
+
+    async def test_open_circuit_requeues_job(self):
+        """Test that a job answered with the canned circuit-open reply is requeued, not marked succeeded."""
+        from magentic_one_agent import AsyncMagenticOneAgent
+
+        circuit = CircuitBreaker(min_calls=1, failure_rate=0.5, open_seconds=30, enabled=True)
+        circuit.record(False)
+        env = {"AGENT_BACKEND": "fake", "FAKE_AGENT_REGISTRY_PATH": os.path.join(self.tmp.name, "registry.json")}
+        with mock.patch.dict(os.environ, env), mock.patch("magentic_one_agent.get_circuit_breaker", return_value=circuit):
+            agent = AsyncMagenticOneAgent(project_client=AsyncFakeProjectClient(FakeAgentsService(FakeAgentsConfig(
+                call_latency=0, run_seconds=0, run_jitter=0, token_delay=0, failure_rate=0, response_words=5, seed=1
+            ))))
+
+        async def handler(job):
+            return await agent.answer_item(job["payload"])
+
+        runner = JobRunner(self.store, handler)
+        await runner.start()
+        job = runner.submit("scaling", ITEM)
+        for _ in range(200):
+            record = self.store.get(job["id"])
+            if record["attempts"] == 1 and record["status"] == "queued":
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual((record["status"], record["attempts"]), ("queued", 1))
+        self.assertIsNone(record["result"])
+        await runner.close()
+
+    async def test_jobs_survive_restart(self):
+        """Test that a job interrupted by shutdown is resumed by the next runner."""
+        release = asyncio.Event()
+
+        async def blocked(job):
+            await release.wait()
+            return "never"
+
+        first = JobRunner(self.store, blocked)
+        await first.start()
+        job = first.submit("scaling", ITEM)
+        await self.wait_for(job["id"], "running")
+        await first.close()
+        self.assertEqual(self.store.get(job["id"])["status"], "queued")
+
+        async def handler(job):
+            return "resumed"
+
+        second = JobRunner(JobStore(self.path), handler)
+        await second.start()
+        finished = await self.wait_for(job["id"], "succeeded")
+        self.assertEqual(finished["result"], "resumed")
+        await second.close()
+
+    def test_webhook_url_validation(self):
+        """Test that only http(s) webhook URLs are accepted."""
+        with public_dns("93.184.216.34"):
+            validate_webhook_url("https://partner.example.com/hooks/lumen")
+        with self.assertRaises(ValueError):
+            validate_webhook_url("file:///etc/passwd")
+
+    def test_webhook_internal_addresses_rejected(self):
+        """Test that loopback, private and link-local (metadata) webhook hosts are refused."""
+        for url in ("http://127.0.0.1/hook", "http://localhost:8000/hook", "http://10.1.2.3/hook",
+                    "http://192.168.0.5/hook", "http://169.254.169.254/latest/meta-data/", "http://[::1]/hook",
+                    "http://[::ffff:127.0.0.1]/hook"):
+            with self.subTest(url=url), self.assertRaises(ValueError):
+                validate_webhook_url(url)
+        with public_dns("172.16.0.9"), self.assertRaises(ValueError):
+            validate_webhook_url("https://rebound.example.com/hook")
+
+    def test_webhook_allowlist(self):
+        """Test that JOB_WEBHOOK_ALLOWED_HOSTS limits webhooks to the listed hosts, internal or not."""
+        with mock.patch.dict(os.environ, {"JOB_WEBHOOK_ALLOWED_HOSTS": "hooks.internal, partner.example.com"}):
+            self.assertTrue(validate_webhook_url("http://hooks.internal/lumen"))
+            with self.assertRaises(ValueError):
+                validate_webhook_url("https://other.example.com/hook")
+
+class TestWebhookDelivery(unittest.IsolatedAsyncioTestCase):
+    """Test webhook delivery against a local receiver."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = JobStore(os.path.join(self.tmp.name, "jobs.sqlite3"))
+        self.addCleanup(self.store.close)
+        self.server = HTTPServer(("127.0.0.1", 0), WebhookReceiver)
+        self.server.paths = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.base = f"http://127.0.0.1:{self.server.server_port}"
+        self.runner = JobRunner(self.store, None)
+
+    async def deliver(self, path):
+        job = self.store.create("scaling", ITEM, self.base + path)
+        await self.runner._deliver_webhook(job, attempts=1)
+        return self.store.get(job["id"])["webhook_status"]
+
+    async def test_allowlisted_host_delivered(self):
+        """Test that the job record is POSTed to an allowlisted webhook."""
+        with mock.patch.dict(os.environ, {"JOB_WEBHOOK_ALLOWED_HOSTS": "127.0.0.1"}):
+            self.assertEqual(await self.deliver("/hook"), "delivered")
+        self.assertEqual(self.server.paths, ["/hook"])
+
+    async def test_redirects_not_followed(self):
+        """Test that a redirecting webhook fails instead of forwarding the POST."""
+        with mock.patch.dict(os.environ, {"JOB_WEBHOOK_ALLOWED_HOSTS": "127.0.0.1"}):
+            self.assertEqual(await self.deliver("/redirect"), "failed")
+        self.assertEqual(self.server.paths, ["/redirect"])
+
+    async def test_internal_host_rechecked_at_delivery(self):
+        """Test that a stored webhook now pointing at an internal address is not called."""
+        self.assertEqual(await self.deliver("/hook"), "failed")
+        self.assertEqual(self.server.paths, [])
+
+    def test_connection_checks_peer_address(self):
+        """Test that a host resolving to an internal address after validation is refused on connect."""
+        connection = _PublicHTTPConnection("127.0.0.1", self.server.server_port, timeout=5)
+        with self.assertRaises(ValueError):
+            connection.connect()
+        self.assertEqual(self.server.paths, [])
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
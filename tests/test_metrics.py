@@ -0,0 +1,87 @@
+"""
+Tests for the metrics registry and stage timers.
+"""
+
+import asyncio
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.metrics import AsyncTimedCredential, MetricsRegistry, stage, stage_errors, stage_seconds
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Test Prometheus text rendering."""
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_rendering(self):
+        """Test that counters render with labels and a _total suffix."""
+        runs = self.registry.counter("runs", "Runs by status.", ("status",))
+        runs.inc(status="completed")
+        runs.inc(status="completed")
+        runs.inc(status="failed")
+        text = self.registry.render()
+        self.assertIn("# TYPE runs counter", text)
+        self.assertIn('runs_total{status="completed"} 2', text)
+        self.assertIn('runs_total{status="failed"} 1', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that histogram buckets accumulate and include +Inf, sum and count."""
+        latency = self.registry.histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1.0))
+        latency.observe(0.05, stage="run")
+        latency.observe(0.5, stage="run")
+        latency.observe(5.0, stage="run")
+        text = self.registry.render()
+        self.assertIn('latency_seconds_bucket{stage="run",le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{stage="run",le="1.0"} 2', text)
+        self.assertIn('latency_seconds_bucket{stage="run",le="+Inf"} 3', text)
+        self.assertIn('latency_seconds_count{stage="run"} 3', text)
+        self.assertIn('latency_seconds_sum{stage="run"} 5.55', text)
+
+    def test_gauge_callback(self):
+        """Test that callback gauges are read at render time."""
+        state = {"idle": 3}
+        self.registry.gauge("pool_agents", "Agents.", ("state",), callback=lambda: dict(state))
+        state["idle"] = 1
+        self.assertIn('pool_agents{state="idle"} 1', self.registry.render())
+
+    def test_label_values_escaped(self):
+        """Test that quotes in label values do not break the exposition format."""
+        counter = self.registry.counter("errors", "Errors.", ("detail",))
+        counter.inc(detail='bad "value"')
+        self.assertIn('errors_total{detail="bad \\"value\\""} 1', self.registry.render())
+
+class TestStage(unittest.TestCase):
+    """Test the stage timer."""
+
+    def test_stage_records_duration_and_errors(self):
+        """Test that a failing stage is still timed and counted as an error."""
+        before = stage_seconds.count(stage="test_failure")
+        with self.assertRaises(ValueError):
+            with stage("test_failure"):
+                raise ValueError("boom")
+        self.assertEqual(stage_seconds.count(stage="test_failure"), before + 1)
+        self.assertEqual(stage_errors.value(stage="test_failure"), 1)
+
+    def test_timed_credential(self):
+        """Test that token acquisition is timed and other attributes pass through."""
+        async def get_token(*scopes, **kwargs):
+            return SimpleNamespace(token="abc")
+
+        async def close():
+            pass
+
+        credential = AsyncTimedCredential(SimpleNamespace(get_token=get_token, close=close, name="default"))
+        before = stage_seconds.count(stage="credential")
+        token = asyncio.run(credential.get_token("https://ai.azure.com/.default"))
+        self.assertEqual(token.token, "abc")
+        self.assertEqual(credential.name, "default")
+        self.assertEqual(stage_seconds.count(stage="credential"), before + 1)
+        self.assertFalse(hasattr(credential, "get_token_info"))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
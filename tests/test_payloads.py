@@ -0,0 +1,92 @@
+"""
+Tests for precomputed static payloads and ETag revalidation.
+"""
+
+import gzip
+import json
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import payloads
+from services.payloads import PrecomputedPayload, ResponseEncoder, encode_json, etag_matches, negotiate_encoding
+
+class TestPrecomputedPayload(unittest.TestCase):
+    """Test serialization, ETags and cache headers."""
+
+    def test_compact_body_and_stable_etag(self):
+        """Test that the body is compact JSON and equal content gets the same ETag."""
+        payload = PrecomputedPayload({"company": "Lumen Technologies", "colors": ["#3b82f6"]})
+        self.assertEqual(payload.body, b'{"company":"Lumen Technologies","colors":["#3b82f6"]}')
+        self.assertEqual(json.loads(payload.body)["company"], "Lumen Technologies")
+        self.assertEqual(payload.etag, PrecomputedPayload({"company": "Lumen Technologies", "colors": ["#3b82f6"]}).etag)
+        self.assertNotEqual(payload.etag, PrecomputedPayload({"company": "Lumen"}).etag)
+
+    def test_headers(self):
+        """Test that ETag and Cache-Control are sent with max_age."""
+        payload = PrecomputedPayload({"a": 1}, max_age=600)
+        self.assertEqual(payload.headers(), {"ETag": payload.etag, "Cache-Control": "public, max-age=600"})
+
+    def test_not_modified(self):
+        """Test that a matching If-None-Match, weak or in a list, allows a 304."""
+        payload = PrecomputedPayload({"a": 1})
+        self.assertTrue(payload.not_modified(payload.etag))
+        self.assertTrue(payload.not_modified(f'"other", W/{payload.etag}'))
+        self.assertTrue(payload.not_modified("*"))
+        self.assertFalse(payload.not_modified(None))
+        self.assertFalse(payload.not_modified('"other"'))
+
+    def test_etag_matches_requires_quotes(self):
+        """Test that an unquoted tag does not match."""
+        self.assertFalse(etag_matches("abc", '"abc"'))
+
+class TestResponseEncoding(unittest.TestCase):
+    """Test JSON encoding and Accept-Encoding negotiation for answers."""
+
+    ANSWER = {"response": "Lumen SD-WAN bundles for multi-site retail. " * 60, "status": "success"}
+
+    def test_encode_json_matches_standard_encoder(self):
+        """Test that the fast and fallback encoders produce the same compact bytes."""
+        content = {"response": "Café – Lumen\nDone", "status": "success"}
+        expected = json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        self.assertEqual(encode_json(content), expected)
+        with mock.patch.object(payloads, "orjson", None):
+            self.assertEqual(encode_json(content), expected)
+
+    def test_negotiate_encoding(self):
+        """Test that the client's preferred available coding wins and q=0 refuses it."""
+        self.assertEqual(negotiate_encoding("gzip, deflate, br", ("br", "gzip")), "br")
+        self.assertEqual(negotiate_encoding("br;q=0.5, gzip", ("br", "gzip")), "gzip")
+        self.assertEqual(negotiate_encoding("br", ("gzip",)), None)
+        self.assertEqual(negotiate_encoding("*", ("gzip",)), "gzip")
+        self.assertEqual(negotiate_encoding("gzip;q=0", ("gzip",)), None)
+        self.assertEqual(negotiate_encoding(None, ("gzip",)), None)
+
+    def test_compresses_above_threshold(self):
+        """Test that large answers are gzipped for clients that accept it and small ones are not."""
+        encoder = ResponseEncoder(min_bytes=1024, enabled=True)
+        body = encode_json(self.ANSWER)
+        compressed, headers = encoder.encode(body, "gzip")
+        self.assertEqual(headers, {"Vary": "Accept-Encoding", "Content-Encoding": "gzip"})
+        self.assertEqual(gzip.decompress(compressed), body)
+        self.assertLess(len(compressed), len(body) / 4)
+        self.assertEqual(encoder.encode(body, None), (body, {"Vary": "Accept-Encoding"}))
+        small = encode_json({"response": "OK", "status": "success"})
+        self.assertEqual(encoder.encode(small, "gzip"), (small, {}))
+
+    def test_precomputed_variants(self):
+        """Test that a static payload's compressed variant is built once and has its own ETag."""
+        encoder = ResponseEncoder(min_bytes=0, enabled=True)
+        payload = PrecomputedPayload(self.ANSWER)
+        body, headers = payload.encoded(encoder, "gzip")
+        self.assertIs(payload.encoded(encoder, "gzip")[0], body)
+        self.assertEqual(gzip.decompress(body), payload.body)
+        self.assertNotEqual(headers["ETag"], payload.etag)
+        self.assertTrue(etag_matches(headers["ETag"], headers["ETag"]))
+        self.assertEqual(payload.encoded(ResponseEncoder(enabled=False), "gzip"), (payload.body, payload.headers()))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
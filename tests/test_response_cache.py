@@ -0,0 +1,116 @@
+"""
+Tests for the partner response cache.
+"""
+
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import response_cache
+from services.response_cache import (
+    HashingEmbedder, ResponseCache, cosine_similarity, normalize_prompt, sparse_similarity, sparse_vector
+)
+
+class TestResponseCache(unittest.TestCase):
+    """Test exact and similarity cache tiers."""
+
+    def test_exact_hit_ignores_case_and_whitespace(self):
+        """Test that normalized prompts share a cache entry."""
+        cache = ResponseCache()
+        cache.put("Customer Query: What cloud  solutions for SMBs?", "answer", "gold")
+        self.assertEqual(cache.lookup("customer query: what cloud solutions for smbs?", "gold"), ("answer", "exact"))
+
+    def test_scopes_are_isolated(self):
+        """Test that answers are not shared across partner tiers."""
+        cache = ResponseCache()
+        cache.put("What cloud solutions for SMBs?", "gold answer", "gold")
+        self.assertIsNone(cache.get("What cloud solutions for SMBs?", "silver"))
+
+    def test_similar_hit(self):
+        """Test that a reworded question hits the similarity tier."""
+        cache = ResponseCache(similarity_threshold=0.8)
+        cache.put("What cloud solutions are best for SMBs?", "answer", "gold")
+        response, tier = cache.lookup("Which cloud solutions are best for SMBs?", "gold")
+        self.assertEqual((response, tier), ("answer", "similar"))
+        self.assertEqual(cache.lookup("How do I configure SD-WAN failover?", "gold"), (None, "miss"))
+
+    def test_similarity_scan_bounded(self):
+        """Test that a similarity miss compares against at most similarity_scan entries of its own scope."""
+        cache = ResponseCache(max_entries=1000, similarity_threshold=0.8, similarity_scan=64)
+        for number in range(900):
+            cache.put(f"Partner {number} asks about SD-WAN site {number}", "answer", "gold")
+        for number in range(100):
+            cache.put(f"Partner {number} asks about backups", "answer", "silver")
+        with mock.patch.object(response_cache, "sparse_similarity", wraps=sparse_similarity) as compare:
+            self.assertEqual(cache.lookup("Completely unrelated wording here", "silver"), (None, "miss"))
+        self.assertEqual(compare.call_count, 64)
+        self.assertEqual(cache.lookup("Partner 899 asks about SD-WAN site 899!", "gold")[1], "similar")
+
+    def test_similarity_index_follows_eviction(self):
+        """Test that evicted and expired entries leave the per-scope index."""
+        cache = ResponseCache(max_entries=2, similarity_threshold=0.8)
+        for question in ("first question about SD-WAN", "second question about backups", "third question about VoIP"):
+            cache.put(question, question, "gold")
+        self.assertEqual(len(cache._scopes["gold"]), 2)
+        self.assertEqual(cache.lookup("First question about SD-WAN please", "gold"), (None, "miss"))
+        cache.clear()
+        self.assertEqual(cache._scopes, {})
+
+    def test_ttl_expiry(self):
+        """Test that expired entries are not served."""
+        cache = ResponseCache(ttl=0)
+        cache.put("question", "answer")
+        self.assertIsNone(cache.get("question"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_stale_answers_kept_for_degraded_mode(self):
+        """Test that expired answers are only returned by lookup_stale, and only within stale_ttl."""
+        cache = ResponseCache(ttl=0, stale_ttl=60)
+        cache.put("question", "answer", "gold")
+        self.assertEqual(cache.lookup("question", "gold"), (None, "miss"))
+        self.assertEqual(cache.lookup_stale("Question", "gold"), "answer")
+        self.assertIsNone(cache.lookup_stale("question", "silver"))
+        self.assertIsNone(ResponseCache(ttl=0).lookup_stale("question"))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entry is evicted at capacity."""
+        cache = ResponseCache(max_entries=2)
+        cache.put("first", "1")
+        cache.put("second", "2")
+        cache.get("first")
+        cache.put("third", "3")
+        self.assertEqual(cache.get("first"), "1")
+        self.assertIsNone(cache.get("second"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_hit_rate(self):
+        """Test that hit and miss counters feed the hit rate."""
+        cache = ResponseCache()
+        cache.put("question", "answer")
+        cache.get("question")
+        cache.get("other question")
+        self.assertEqual(cache.stats()["hit_rate"], 0.5)
+
+class TestHashingEmbedder(unittest.TestCase):
+    """Test the local embedding used by the similarity tier."""
+
+    def test_identical_text_has_unit_similarity(self):
+        """Test that embeddings are normalized and deterministic."""
+        embedder = HashingEmbedder()
+        vector = embedder(normalize_prompt("Scaling managed services in EMEA"))
+        self.assertAlmostEqual(cosine_similarity(vector, vector), 1.0)
+        self.assertEqual(vector, embedder(normalize_prompt("Scaling managed services in EMEA")))
+
+    def test_sparse_similarity_matches_dense(self):
+        """Test that the sparse form stored by the cache scores like the dense vectors."""
+        embedder = HashingEmbedder()
+        first = embedder("cloud solutions for smbs")
+        second = embedder("which cloud solutions for smbs")
+        self.assertLess(len(sparse_vector(first)), 100)
+        self.assertAlmostEqual(sparse_similarity(first, sparse_vector(second)), cosine_similarity(first, second))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,115 @@
+"""
+Tests for reading a finished run's answer (RESPONSE_RETRIEVAL_MODE).
+"""
+
+import tempfile
+import time
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends.fake_agents import (
+    AsyncFakeProjectClient, FakeAgentsConfig, FakeAgentsService, FakeMessage, FakeProjectClient, FakeText,
+    FakeTextContent, _Record
+)
+
+def text_part(value: str):
+    return FakeTextContent(type="text", text=FakeText(value=value, annotations=[]))
+
+def image_part():
+    return _Record(type="image_file", image_file=_Record(file_id="file_1"))
+
+class RetrievalTestCase(unittest.TestCase):
+    """A fake thread to which messages with any content are appended directly."""
+
+    client_class = FakeProjectClient
+    agent_class = "MagenticOneAgent"
+
+    def setUp(self):
+        self.service = FakeAgentsService(FakeAgentsConfig(call_latency=0, seed=1))
+        self.thread = self.service.create_thread()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def make_agent(self, mode: str = "first_text"):
+        import magentic_one_agent
+
+        with mock.patch.dict(os.environ, {
+            "AGENT_BACKEND": "fake",
+            "RESPONSE_RETRIEVAL_MODE": mode,
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(self.tmp.name, "registry.json")
+        }):
+            agent = getattr(magentic_one_agent, self.agent_class)(project_client=self.client_class(self.service))
+        agent.thread = self.thread
+        return agent
+
+    def add_message(self, role: str, content: list, run_id: str = "run_1"):
+        message = FakeMessage(id=self.service._id("msg"), thread_id=self.thread.id, run_id=run_id, role=role,
+                              content=content, created_at=time.time())
+        self.service.messages[self.thread.id].append(message)
+        return message
+
+    def finished_run(self, run_id: str = "run_1"):
+        return SimpleNamespace(id=run_id, thread_id=self.thread.id)
+
+class TestFetchRunResponse(RetrievalTestCase):
+    """Test MagenticOneAgent._fetch_run_response."""
+
+    def test_first_text_vs_all_text(self):
+        """Test that first_text returns the first text part and all_text joins every text part."""
+        self.add_message("assistant", [text_part("Overview"), image_part(), text_part("Details")])
+        self.assertEqual(self.make_agent("first_text")._fetch_run_response(self.finished_run()), "Overview")
+        self.assertEqual(self.make_agent("all_text")._fetch_run_response(self.finished_run()), "Overview\n\nDetails")
+
+    def test_only_the_runs_newest_message(self):
+        """Test that one message is fetched: the newest written by this run, not by earlier runs."""
+        self.add_message("assistant", [text_part("Earlier run")], run_id="run_0")
+        self.add_message("assistant", [text_part("First draft")])
+        self.add_message("assistant", [text_part("Final answer")])
+        self.add_message("assistant", [text_part("Later run")], run_id="run_2")
+        agent = self.make_agent()
+        with mock.patch.object(self.service, "list_messages", wraps=self.service.list_messages) as list_messages:
+            self.assertEqual(agent._fetch_run_response(self.finished_run()), "Final answer")
+        list_messages.assert_called_once()
+        self.assertEqual(list_messages.call_args.args[1:], ("run_1", mock.ANY, 1))
+
+    def test_newest_message_not_from_assistant(self):
+        """Test that nothing is returned when the run's newest message is not the assistant's."""
+        self.add_message("assistant", [text_part("Answer")])
+        self.add_message("user", [text_part("Follow-up")])
+        self.assertIsNone(self.make_agent()._fetch_run_response(self.finished_run()))
+
+    def test_message_without_text(self):
+        """Test that a message with only non-text parts gives None in both modes."""
+        self.add_message("assistant", [image_part()])
+        self.assertIsNone(self.make_agent("first_text")._fetch_run_response(self.finished_run()))
+        self.assertIsNone(self.make_agent("all_text")._fetch_run_response(self.finished_run()))
+
+    def test_run_without_messages(self):
+        """Test that a run that wrote nothing gives None."""
+        self.assertIsNone(self.make_agent()._fetch_run_response(self.finished_run()))
+
+class TestAsyncFetchRunResponse(RetrievalTestCase, unittest.IsolatedAsyncioTestCase):
+    """Test AsyncMagenticOneAgent._fetch_run_response."""
+
+    client_class = AsyncFakeProjectClient
+    agent_class = "AsyncMagenticOneAgent"
+
+    async def test_modes(self):
+        """Test that both retrieval modes read the run's newest assistant message."""
+        self.add_message("assistant", [text_part("Earlier")])
+        self.add_message("assistant", [text_part("Overview"), text_part("Details")])
+        self.assertEqual(await self.make_agent("first_text")._fetch_run_response(self.finished_run()), "Overview")
+        self.assertEqual(await self.make_agent("all_text")._fetch_run_response(self.finished_run()), "Overview\n\nDetails")
+
+    async def test_not_from_assistant(self):
+        """Test that a newest message from the user gives None."""
+        self.add_message("user", [text_part("Hello")])
+        self.assertIsNone(await self.make_agent()._fetch_run_response(self.finished_run()))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,87 @@
+"""
+Tests for adaptive run polling.
+"""
+
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.run_polling import (
+    ExponentialBackoffPolling,
+    PollMetrics,
+    PollRateLimiter,
+    RunPoller,
+    URGENCY_POLL_PROFILES
+)
+
+class NoDelayPolling(ExponentialBackoffPolling):
+    """Backoff schedule with the sleeps removed so tests run instantly."""
+
+    def delays(self, urgency="medium"):
+        for _ in super().delays(urgency):
+            yield 0.0
+
+class TestExponentialBackoffPolling(unittest.TestCase):
+    """Test the backoff schedule."""
+
+    def test_critical_polls_faster_than_low(self):
+        """Test that critical runs start with a shorter interval than low ones."""
+        strategy = ExponentialBackoffPolling(jitter=0)
+        critical = next(strategy.delays("critical"))
+        low = next(strategy.delays("low"))
+        self.assertLess(critical, low)
+
+    def test_delays_capped_at_max_interval(self):
+        """Test that delays grow but never exceed the profile maximum."""
+        strategy = ExponentialBackoffPolling(jitter=0)
+        delays = list(strategy.delays("medium"))
+        self.assertEqual(len(delays), URGENCY_POLL_PROFILES["medium"]["max_polls"])
+        self.assertEqual(max(delays), URGENCY_POLL_PROFILES["medium"]["max_interval"])
+        self.assertEqual(delays, sorted(delays))
+
+    def test_unknown_urgency_uses_medium(self):
+        """Test that unknown urgencies fall back to the medium profile."""
+        strategy = ExponentialBackoffPolling(jitter=0)
+        self.assertEqual(next(strategy.delays("unknown")), next(strategy.delays("medium")))
+
+class TestRunPoller(unittest.TestCase):
+    """Test waiting for run completion."""
+
+    def test_counts_polls_until_terminal(self):
+        """Test that the poller stops at a terminal status and records its cost."""
+        statuses = iter(["in_progress", "in_progress", "completed"])
+        metrics = PollMetrics()
+        poller = RunPoller(NoDelayPolling(), PollRateLimiter(rate=1000, burst=1000), metrics)
+
+        run, stats = poller.wait(
+            SimpleNamespace(id="run_1", status="queued"),
+            lambda: SimpleNamespace(id="run_1", status=next(statuses)),
+            "critical"
+        )
+
+        self.assertEqual(run.status, "completed")
+        self.assertEqual(stats.polls, 3)
+        self.assertEqual(metrics.snapshot()["polls_by_urgency"], {"critical": 3})
+
+    def test_already_terminal_run_is_not_polled(self):
+        """Test that a completed run costs no poll calls."""
+        poller = RunPoller(NoDelayPolling(), PollRateLimiter(rate=1000), PollMetrics())
+        _, stats = poller.wait(SimpleNamespace(id="run_2", status="completed"), lambda: None)
+        self.assertEqual(stats.polls, 0)
+
+class TestPollRateLimiter(unittest.TestCase):
+    """Test the shared poll rate limiter."""
+
+    def test_burst_then_throttle(self):
+        """Test that calls beyond the burst are delayed."""
+        limiter = PollRateLimiter(rate=10, burst=2)
+        self.assertEqual(limiter._reserve(), 0.0)
+        self.assertEqual(limiter._reserve(), 0.0)
+        self.assertGreater(limiter._reserve(), 0.0)
+        self.assertEqual(limiter.throttled, 1)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,230 @@
+"""
+Tests for run deadlines, retries of transient failures and hedged runs.
+"""
+
+import tempfile
+import time
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends.fake_agents import FakeAgentsConfig, FakeAgentsService, FakeProjectClient
+from services.run_polling import FixedIntervalPolling, PollMetrics, PollRateLimiter, RunPoller
+from services.run_resilience import RunResilience, classify_run, run_hedges
+from services.token_budget import TokenBudget, TokenBudgetExceeded
+
+def run(status, code=None, run_id="run_1"):
+    return SimpleNamespace(id=run_id, status=status, last_error={"code": code} if code else None)
+
+class TestClassifyRun(unittest.TestCase):
+    """Test how finished and abandoned runs are classified."""
+
+    def test_outcomes(self):
+        """Test each status and error code maps to the outcome callers act on."""
+        self.assertEqual(classify_run(run("completed")), "completed")
+        self.assertEqual(classify_run(run("incomplete")), "incomplete")
+        self.assertEqual(classify_run(run("expired")), "transient")
+        self.assertEqual(classify_run(run("failed", "server_error")), "transient")
+        self.assertEqual(classify_run(run("failed", "content_filter")), "failed")
+        self.assertEqual(classify_run(run("requires_action")), "failed")
+        self.assertEqual(classify_run(run("in_progress")), "timeout")
+        self.assertEqual(classify_run(run("cancelling")), "timeout")
+
+class TestRunResilience(unittest.TestCase):
+    """Test retry and hedge decisions."""
+
+    def test_retry_delay_respects_limits(self):
+        """Test that retries stop after max_retries or when they would pass the deadline."""
+        resilience = RunResilience(max_retries=2, retry_base_delay=0.01, retry_max_delay=0.01)
+        deadline = time.monotonic() + 60
+        self.assertIsNotNone(resilience.retry_delay(0, deadline))
+        self.assertIsNone(resilience.retry_delay(2, deadline))
+        self.assertIsNone(resilience.retry_delay(0, time.monotonic()))
+
+    def test_per_endpoint_deadlines(self):
+        """Test that endpoint deadlines come from RUN_DEADLINE_<ENDPOINT> with RUN_DEADLINE as default."""
+        with mock.patch.dict(os.environ, {"RUN_DEADLINE": "30", "RUN_DEADLINE_TECHNICAL": "10"}):
+            resilience = RunResilience()
+        self.assertEqual(resilience.deadlines, {"query": 30.0, "technical": 10.0, "scaling": 30.0})
+
+    def test_hedge_after_uses_recent_p95(self):
+        """Test that hedging is opt-in per urgency and waits for the recent p95 once known."""
+        resilience = RunResilience(hedge_urgencies=("critical",), hedge_delay=8, min_samples=20)
+        self.assertIsNone(resilience.hedge_after("technical", "medium"))
+        self.assertEqual(resilience.hedge_after("technical", "critical"), 8)
+        for seconds in range(1, 101):
+            resilience.record("technical", "completed", seconds / 10)
+        self.assertAlmostEqual(resilience.hedge_after("technical", "critical"), 9.6)
+
+class TestRunPollerDeadlines(unittest.TestCase):
+    """Test deadline-bounded and hedged waits."""
+
+    def poller(self):
+        return RunPoller(FixedIntervalPolling(0.001, max_polls=10000), PollRateLimiter(rate=100000), PollMetrics())
+
+    def test_wait_stops_at_deadline(self):
+        """Test that a run that never finishes is returned once the deadline passes."""
+        started = time.monotonic()
+        latest, _ = self.poller().wait(run("queued"), lambda: run("in_progress"), deadline=started + 0.05)
+        self.assertEqual(latest.status, "in_progress")
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_hedge_wins_over_slow_run(self):
+        """Test that a hedged run completing first wins and the slow run is handed back for cancelling."""
+        hedge = run("completed", run_id="run_2")
+        winner, others, _ = self.poller().wait_hedged(
+            run("queued"), lambda: run("in_progress"), lambda: (run("queued", run_id="run_2"), lambda: hedge),
+            hedge_after=0.01, deadline=time.monotonic() + 5
+        )
+        self.assertEqual(winner.id, "run_2")
+        self.assertEqual([other.id for other in others], ["run_1"])
+
+    def test_no_hedge_when_first_run_is_fast(self):
+        """Test that no second run is started when the first completes before hedge_after."""
+        start_hedge = mock.Mock()
+        winner, others, _ = self.poller().wait_hedged(run("queued"), lambda: run("completed"), start_hedge, hedge_after=5)
+        self.assertEqual((winner.status, others), ("completed", []))
+        start_hedge.assert_not_called()
+
+class TestAgentRunResilience(unittest.TestCase):
+    """Test deadlines, retries and hedging end to end on the fake backend."""
+
+    def make_agent(self, service, resilience):
+        from magentic_one_agent import MagenticOneAgent
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        with mock.patch.dict(os.environ, {
+            "AGENT_BACKEND": "fake",
+            "RUN_POLL_STRATEGY": "fixed",
+            "RUN_POLL_INTERVAL": "0.005",
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(self.tmp.name, "registry.json")
+        }):
+            agent = MagenticOneAgent(project_client=FakeProjectClient(service))
+        agent.run_resilience = resilience
+        agent.initialize_agent()
+        return agent
+
+    def service(self, **overrides):
+        config = dict(call_latency=0, run_seconds=0, run_jitter=0, token_delay=0, failure_rate=0, response_words=5, seed=1)
+        config.update(overrides)
+        return FakeAgentsService(FakeAgentsConfig(**config))
+
+    def test_deadline_cancels_run(self):
+        """Test that a hung run is cancelled at the deadline and reported as a timeout."""
+        from magentic_one_agent import TIMEOUT_RESPONSE
+
+        service = self.service(run_seconds=60)
+        agent = self.make_agent(service, RunResilience(deadlines={"technical": 0.05}))
+        response = agent.handle_technical_support("Router down", urgency="high", use_cache=False)
+        self.assertEqual(response, TIMEOUT_RESPONSE)
+        self.assertEqual(agent.last_run_outcome, "timeout")
+        self.assertEqual([r.status for r in service.runs.values()], ["cancelling"])
+
+    def test_require_answer_rejects_apology(self):
+        """Test that callers storing answers (jobs, batches) get RunFailed instead of the apology."""
+        from magentic_one_agent import RunFailed
+
+        service = self.service(run_seconds=60)
+        agent = self.make_agent(service, RunResilience(deadlines={"technical": 0.05}))
+        response = agent.handle_technical_support("Router down", urgency="high", use_cache=False)
+        with self.assertRaises(RunFailed) as failed:
+            agent._require_answer(response)
+        self.assertEqual(failed.exception.outcome, "timeout")
+        self.assertEqual(agent._require_answer("Restart the edge router."), "Restart the edge router.")
+
+    def test_transient_failures_retried(self):
+        """Test that server errors are retried with backoff up to max_retries."""
+        service = self.service(failure_rate=1.0)
+        agent = self.make_agent(service, RunResilience(max_retries=2, retry_base_delay=0.001))
+        agent.handle_customer_query("Need SD-WAN help", use_cache=False)
+        self.assertEqual(len(service.runs), 3)
+        self.assertEqual(agent.last_run_outcome, "transient")
+
+    def test_hedged_run_answers(self):
+        """Test that a hedged run answers a slow critical request and its scratch thread is removed."""
+        service = self.service(run_seconds=60)
+        create_run = service.create_run
+
+        def first_run_slow(*args, **kwargs):
+            created = create_run(*args, **kwargs)
+            service.config.run_seconds = 0
+            return created
+
+        service.create_run = first_run_slow
+        agent = self.make_agent(service, RunResilience(hedge_urgencies=("critical",), hedge_delay=0.02))
+        won = run_hedges.value(result="won")
+        response = agent.handle_technical_support("Core router down", urgency="critical", use_cache=False)
+        self.assertIn("TECHNICAL SUPPORT REQUEST", response)
+        self.assertEqual(run_hedges.value(result="won"), won + 1)
+        self.assertEqual(sorted(r.status for r in service.runs.values()), ["cancelling", "completed"])
+        self.assertEqual(list(service.threads), [agent.thread.id])
+
+    def test_no_hedge_for_follow_ups(self):
+        """Test that a run on a thread with earlier turns is not hedged on a scratch thread without them."""
+        service = self.service()
+        agent = self.make_agent(service, RunResilience(hedge_urgencies=("critical",), hedge_delay=0.02))
+        agent.handle_technical_support("Core router down", urgency="critical", use_cache=False)
+        service.config.run_seconds = 0.1
+        started = run_hedges.value(result="started")
+        response = agent.handle_technical_support("It is down again", urgency="critical", use_cache=False)
+        self.assertIn("TECHNICAL SUPPORT REQUEST", response)
+        self.assertEqual(run_hedges.value(result="started"), started)
+        self.assertEqual(list(service.threads), [agent.thread.id])
+
+    def test_hedge_and_retry_runs_reserve_budget(self):
+        """Test that hedged runs and retries each reserve tokens, and a full budget skips the hedge."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        service = self.service(failure_rate=1.0)
+        agent = self.make_agent(service, RunResilience(max_retries=2, retry_base_delay=0.001))
+        agent.token_budget = TokenBudget(tpm=1000000, state_path=os.path.join(tmp.name, "retry.json"))
+        agent.handle_customer_query("Need SD-WAN help", use_cache=False)
+        self.assertEqual(agent.token_budget.stats()["requests_in_window"], 3)
+
+        service = self.service(run_seconds=0.2)
+        agent = self.make_agent(service, RunResilience(hedge_urgencies=("critical",), hedge_delay=0.02))
+        agent.token_budget = TokenBudget(tpm=1000000, state_path=os.path.join(tmp.name, "hedge.json"))
+        agent.handle_technical_support("Core router down", urgency="critical", use_cache=False)
+        self.assertEqual(agent.token_budget.stats()["requests_in_window"], 2)
+
+        estimate = agent._estimate_run_tokens(agent.support_templates.get_technical_template("Core router down", "critical"))
+        agent.reset_session()
+        agent.token_budget = TokenBudget(tpm=estimate * 1.5, state_path=os.path.join(tmp.name, "full.json"))
+        started = run_hedges.value(result="started")
+        agent.handle_technical_support("Core router down", urgency="critical", use_cache=False)
+        self.assertEqual(run_hedges.value(result="started"), started)
+
+    def full_budget(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        budget = TokenBudget(tpm=1000, state_path=os.path.join(tmp.name, "budget.json"), max_wait=0)
+        budget.reserve(1000)
+        return budget
+
+    def test_shed_query_not_posted(self):
+        """Test that a shed follow-up leaves the thread holding only the answered turn."""
+        service = self.service()
+        agent = self.make_agent(service, RunResilience())
+        agent.handle_customer_query("Need SD-WAN help", use_cache=False)
+        agent.token_budget = self.full_budget()
+        with self.assertRaises(TokenBudgetExceeded):
+            agent.handle_customer_query("And the overlay routes?", use_cache=False)
+        self.assertEqual([message.role for message in service.messages[agent.thread.id]], ["user", "assistant"])
+
+    def test_shed_stream_not_posted(self):
+        """Test that a shed streamed follow-up leaves nothing on the thread either."""
+        service = self.service()
+        agent = self.make_agent(service, RunResilience())
+        list(agent.stream_customer_query("Need SD-WAN help"))
+        agent.token_budget = self.full_budget()
+        with self.assertRaises(TokenBudgetExceeded):
+            list(agent.stream_customer_query("And the overlay routes?"))
+        self.assertEqual([message.role for message in service.messages[agent.thread.id]], ["user", "assistant"])
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,203 @@
+"""
+Tests for per-partner thread reuse.
+"""
+
+import asyncio
+import tempfile
+import time
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.sessions import AsyncSessionManager, SessionManager
+
+try:
+    import fastapi
+except ImportError:  # pragma: no cover - optional dependency
+    fastapi = None
+
+class FakeThreads:
+    """In-memory stand-in for the threads operations."""
+
+    def __init__(self):
+        self.created = 0
+        self.deleted = []
+
+    def create(self):
+        self.created += 1
+        return SimpleNamespace(id=f"thread_{self.created}")
+
+    def delete(self, thread_id):
+        self.deleted.append(thread_id)
+
+class FakeAsyncThreads(FakeThreads):
+    async def create(self):
+        return super().create()
+
+    async def delete(self, thread_id):
+        super().delete(thread_id)
+
+class TestSessionManager(unittest.TestCase):
+    """Test the thread-based session manager."""
+
+    def setUp(self):
+        self.threads = FakeThreads()
+        self.manager = SessionManager(SimpleNamespace(threads=self.threads), idle_ttl=60, prewarm=0)
+
+    def test_follow_up_reuses_thread(self):
+        """Test that the same key gets the same thread."""
+        with self.manager.session("partner:Acme") as first:
+            pass
+        with self.manager.session("partner:Acme") as second:
+            pass
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(self.manager.stats()["reused"], 1)
+
+    def test_anonymous_thread_deleted_after_use(self):
+        """Test that a request without a key gets a throwaway thread."""
+        with self.manager.session() as thread:
+            pass
+        self.assertEqual(self.threads.deleted, [thread.id])
+
+    def test_idle_session_expires(self):
+        """Test that idle sessions are expired and their threads deleted."""
+        self.manager.idle_ttl = 0
+        with self.manager.session("partner:Acme") as first:
+            pass
+        self.manager.expire_idle()
+        with self.manager.session("partner:Acme") as second:
+            pass
+        self.assertNotEqual(first.id, second.id)
+        self.assertEqual(self.threads.deleted, [first.id])
+
+    def test_in_use_session_not_expired(self):
+        """Test that a session is never expired while a request holds it."""
+        self.manager.idle_ttl = 0
+        with self.manager.session("partner:Acme"):
+            self.manager.expire_idle()
+            self.assertEqual(self.manager.stats()["expired"], 0)
+
+    def test_prewarmed_threads_used(self):
+        """Test that pre-created threads are handed out first."""
+        manager = SessionManager(SimpleNamespace(threads=self.threads), prewarm=2, cleanup_interval=60)
+        manager.start()
+        deadline = time.monotonic() + 2
+        while manager.stats()["spare_threads"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        with manager.session("partner:Acme"):
+            pass
+        manager.close()
+        self.assertEqual(manager.stats()["prewarmed_used"], 1)
+
+    def test_claim_creates_thread_only_when_needed(self):
+        """Test that a claimed session only takes a thread once one is asked for."""
+        with self.manager.claim() as claim:
+            pass
+        with self.manager.claim("partner:Acme") as claim:
+            pass
+        self.assertEqual(self.threads.created, 0)
+        with self.manager.claim() as claim:
+            thread = self.manager.thread_for(claim)
+            self.assertIs(self.manager.thread_for(claim), thread)
+        self.assertEqual(self.threads.created, 1)
+        self.assertEqual(self.threads.deleted, [thread.id])
+
+class TestAsyncSessionManager(unittest.IsolatedAsyncioTestCase):
+    """Test the asyncio session manager."""
+
+    async def test_same_key_requests_are_serialized(self):
+        """Test that concurrent requests for one key never overlap on the thread."""
+        threads = FakeAsyncThreads()
+        manager = AsyncSessionManager(SimpleNamespace(threads=threads), prewarm=1, cleanup_interval=60)
+        await manager.start()
+        active = 0
+        overlap = False
+
+        async def request():
+            nonlocal active, overlap
+            async with manager.session("session:abc") as thread:
+                active += 1
+                overlap = overlap or active > 1
+                await asyncio.sleep(0.01)
+                active -= 1
+                return thread.id
+
+        ids = await asyncio.gather(request(), request(), request())
+        await manager.close()
+        self.assertFalse(overlap)
+        self.assertEqual(len(set(ids)), 1)
+        self.assertEqual(manager.stats()["reused"], 2)
+
+@unittest.skipUnless(fastapi is not None, "fastapi is not installed")
+class TestLeasedAgentSessions(unittest.IsolatedAsyncioTestCase):
+    """Test how the API's leases use sessions, admission and the pool."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.env = mock.patch.dict(os.environ, {
+            "AGENT_BACKEND": "fake",
+            "FAKE_AGENTS_CALL_LATENCY_MS": "0",
+            "FAKE_AGENTS_RUN_SECONDS": "0",
+            "FAKE_AGENTS_TOKEN_DELAY_MS": "0",
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(cls.tmp.name, "registry.json"),
+            "JOB_DB_PATH": os.path.join(cls.tmp.name, "jobs.sqlite3")
+        })
+        cls.env.start()
+        import app
+
+        cls.app = app
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.tmp.cleanup()
+
+    async def asyncSetUp(self):
+        self.sessions = await self.app._get_session_manager()
+
+    async def asyncTearDown(self):
+        await self.app.session_manager.close()
+        self.app.session_manager = None
+        await self.app.agent_pool.close()
+
+    def threads_taken(self):
+        stats = self.sessions.stats()
+        return stats["created"] + stats["prewarmed_used"]
+
+    async def test_partner_burst_waits_without_holding_capacity(self):
+        """Test that a queued follow-up holds neither an admission slot nor a pooled agent."""
+        entered = asyncio.Event()
+
+        async def follow_up():
+            async with self.app._leased_agent("partner:Burst Inc"):
+                entered.set()
+
+        async with self.app._leased_agent("partner:Burst Inc"):
+            waiting = asyncio.create_task(follow_up())
+            await asyncio.sleep(0.05)
+            self.assertFalse(entered.is_set())
+            self.assertEqual(self.app.admission.in_flight, 1)
+            self.assertEqual(self.app.agent_pool.health()["in_use"], 1)
+        await waiting
+        self.assertTrue(entered.is_set())
+        self.assertEqual(self.app.admission.in_flight, 0)
+
+    async def test_keyless_cache_hit_takes_no_thread(self):
+        """Test that a one-off request answered from the response cache never takes a thread."""
+        async with self.app._leased_agent() as agent:
+            if agent.response_cache is None:
+                self.skipTest("response cache disabled")
+            await agent.handle_customer_query("Which SD-WAN tier suits 40 branches?")
+        taken = self.threads_taken()
+        async with self.app._leased_agent() as agent:
+            await agent.handle_customer_query("Which SD-WAN tier suits 40 branches?")
+            self.assertEqual(agent.last_cache_status, "exact")
+        self.assertEqual(self.threads_taken(), taken)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
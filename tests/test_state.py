@@ -0,0 +1,254 @@
+"""
+Tests for the shared state store and the components that use it across workers.
+"""
+
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends.fake_agents import AsyncFakeProjectClient, FakeAgentsConfig, FakeAgentsService
+from services.state import MemoryStateStore, RedisStateStore, SQLiteStateStore
+from services.context_window import ContextWindow
+from services.response_cache import ResponseCache
+from services.sessions import AsyncSessionManager, SessionManager
+from services.agent_registry import AgentRegistry
+from services.token_budget import TokenBudget
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+class StoreContract:
+    """Behaviour every backend must provide; mixed into one TestCase per backend."""
+
+    def make_store(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = self.make_store()
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_round_trip_and_delete(self):
+        """Test that JSON values are stored, copied and deleted."""
+        value = {"thread_id": "thread_1", "tags": ["gold"]}
+        self.store.set("session:acme", value)
+        loaded = self.store.get("session:acme")
+        loaded["tags"].append("changed")
+        self.assertEqual(self.store.get("session:acme"), value)
+        self.store.delete("session:acme")
+        self.assertIsNone(self.store.get("session:acme"))
+
+    def test_ttl_expiry(self):
+        """Test that values disappear after their TTL."""
+        self.store.set("short", 1, ttl=0.05)
+        self.assertEqual(self.store.get("short"), 1)
+        time.sleep(0.1)
+        self.assertIsNone(self.store.get("short"))
+
+    def test_add_only_if_absent(self):
+        """Test that add does not overwrite a live key but replaces an expired one."""
+        self.assertTrue(self.store.add("owner", "a", ttl=0.05))
+        self.assertFalse(self.store.add("owner", "b"))
+        time.sleep(0.1)
+        self.assertTrue(self.store.add("owner", "c"))
+
+    def test_lock_excludes_and_times_out(self):
+        """Test that a held lock blocks other holders until released."""
+        with self.store.lock("registry", ttl=5):
+            with self.assertRaises(TimeoutError):
+                with self.store.lock("registry", ttl=5, timeout=0.05):
+                    pass
+        with self.store.lock("registry", ttl=5, timeout=0.05):
+            pass
+
+class TestMemoryStateStore(StoreContract, unittest.TestCase):
+    def make_store(self):
+        return MemoryStateStore()
+
+class TestSQLiteStateStore(StoreContract, unittest.TestCase):
+    def make_store(self):
+        return SQLiteStateStore(os.path.join(self.tmp.name, "state.sqlite3"))
+
+    def test_lock_across_connections(self):
+        """Test that two workers (connections to one file) exclude each other."""
+        other = SQLiteStateStore(self.store.path)
+        inside = []
+
+        def worker(store, name):
+            with store.lock("budget", ttl=5):
+                inside.append(name)
+                time.sleep(0.02)
+                inside.append(name)
+
+        threads = [threading.Thread(target=worker, args=(s, n)) for s, n in ((self.store, "a"), (other, "b"))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn(inside, (["a", "a", "b", "b"], ["b", "b", "a", "a"]))
+        other.close()
+
+@unittest.skipUnless(fakeredis is not None, "fakeredis is not installed")
+class TestRedisStateStore(StoreContract, unittest.TestCase):
+    def make_store(self):
+        return RedisStateStore(client=fakeredis.FakeRedis(), prefix="test:")
+
+class FakeThreads:
+    def __init__(self):
+        self.created = 0
+        self.deleted = []
+
+    def create(self):
+        self.created += 1
+        return SimpleNamespace(id=f"thread_{self.created}")
+
+    def delete(self, thread_id):
+        self.deleted.append(thread_id)
+
+class TestSharedComponents(unittest.TestCase):
+    """Test that two workers on one SQLite store share answers, threads, agents and budget."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "state.sqlite3")
+        self.worker_a, self.worker_b = SQLiteStateStore(path), SQLiteStateStore(path)
+
+    def tearDown(self):
+        self.worker_a.close()
+        self.worker_b.close()
+        self.tmp.cleanup()
+
+    def test_response_cache_shared_tier(self):
+        """Test that an answer cached by one worker is a shared hit on another."""
+        ResponseCache(store=self.worker_a).put("What is SD-WAN?", "answer", scope="gold")
+        other = ResponseCache(store=self.worker_b)
+        self.assertEqual(other.lookup("what is  SD-WAN?", scope="gold"), ("answer", "shared"))
+        self.assertEqual(other.lookup("What is SD-WAN?", scope="gold"), ("answer", "exact"))
+        self.assertEqual(other.lookup("What is SD-WAN?", scope="silver"), (None, "miss"))
+
+    def test_session_thread_shared(self):
+        """Test that a follow-up on another worker continues the same thread."""
+        threads = FakeThreads()
+        client = SimpleNamespace(threads=threads)
+        first = SessionManager(client, idle_ttl=60, prewarm=0, store=self.worker_a)
+        second = SessionManager(client, idle_ttl=60, prewarm=0, store=self.worker_b)
+        with first.session("acme") as thread:
+            first_id = thread.id
+        with second.session("acme") as thread:
+            self.assertEqual(thread.id, first_id)
+        self.assertEqual(threads.created, 1)
+        self.assertEqual(second.stats()["shared_reused"], 1)
+
+    def test_expiry_keeps_thread_used_elsewhere(self):
+        """Test that a worker does not delete a thread another worker used recently."""
+        threads = FakeThreads()
+        client = SimpleNamespace(threads=threads)
+        first = SessionManager(client, idle_ttl=0.05, prewarm=0, store=self.worker_a)
+        with first.session("acme"):
+            pass
+        time.sleep(0.1)
+        SessionManager(client, idle_ttl=60, prewarm=0, store=self.worker_b)._publish("acme", SimpleNamespace(id="thread_1"))
+        first.expire_idle()
+        self.assertEqual(threads.deleted, [])
+
+    def test_agent_ids_shared(self):
+        """Test that the second worker reuses the agent the first one created."""
+        client = SimpleNamespace(created=0)
+
+        def create_agent(**kwargs):
+            client.created += 1
+            return SimpleNamespace(id=f"asst_{client.created}", name=kwargs["name"], metadata=kwargs["metadata"])
+
+        client.create_agent = create_agent
+        client.get_agent = lambda agent_id: SimpleNamespace(id=agent_id)
+        client.list_agents = lambda: []
+        for store in (self.worker_a, self.worker_b):
+            registry = AgentRegistry(client, os.path.join(self.tmp.name, "unused.json"), store=store)
+            agent = registry.get_or_create(model="gpt-4", name="support", instructions="Help.", tools=[])
+        self.assertEqual(agent.id, "asst_1")
+        self.assertEqual(client.created, 1)
+
+    def test_token_budget_shared(self):
+        """Test that reservations made by one worker count against the other."""
+        TokenBudget(tpm=1000, store=self.worker_a).reserve(900)
+        self.assertIsNone(TokenBudget(tpm=1000, store=self.worker_b).reserve(200)[0])
+
+class SlowStore(MemoryStateStore):
+    """Shared store whose calls block like a busy SQLite file or a distant Redis server."""
+
+    shared = True
+    delay = 0.2
+
+    def get(self, key: str):
+        time.sleep(self.delay)
+        return super().get(key)
+
+    def set(self, key: str, value, ttl: float = None):
+        time.sleep(self.delay)
+        super().set(key, value, ttl)
+
+    def add(self, key: str, value, ttl: float = None):
+        time.sleep(self.delay)
+        return super().add(key, value, ttl)
+
+class TestAsyncStoreCalls(unittest.IsolatedAsyncioTestCase):
+    """Test that the async request path makes its store calls off the event loop."""
+
+    async def test_query_leaves_loop_free(self):
+        """Test that sessions, registry, cache and context window never stall the loop on a slow store."""
+        from magentic_one_agent import AsyncMagenticOneAgent
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        store = SlowStore()
+        service = FakeAgentsService(FakeAgentsConfig(
+            call_latency=0, run_seconds=0, run_jitter=0, token_delay=0, failure_rate=0, response_words=5, seed=1
+        ))
+        with mock.patch.dict(os.environ, {
+            "AGENT_BACKEND": "fake",
+            "RUN_POLL_STRATEGY": "fixed",
+            "RUN_POLL_INTERVAL": "0.001",
+            "COALESCE_ENABLED": "false",
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(tmp.name, "registry.json")
+        }), mock.patch("magentic_one_agent.get_shared_store", return_value=store):
+            agent = AsyncMagenticOneAgent(project_client=AsyncFakeProjectClient(service))
+        agent.response_cache = ResponseCache(store=store)
+        agent.context_window = ContextWindow(strategy="summarize", store=store)
+        sessions = AsyncSessionManager(agent.agent_client, prewarm=0, store=store)
+        ticks = [time.monotonic()]
+
+        async def tick():
+            while True:
+                await asyncio.sleep(0.005)
+                ticks.append(time.monotonic())
+
+        ticker = asyncio.create_task(tick())
+        try:
+            async with sessions.claim("acme") as claim:
+                agent.thread_source = lambda: sessions.thread_for(claim)
+                await agent.handle_customer_query("What is SD-WAN?")
+        finally:
+            ticker.cancel()
+            ticks.append(time.monotonic())
+            await sessions.close()
+        self.assertEqual(agent.last_run_outcome, "completed")
+        saved = store.get(f"context_window:{agent.thread.id}")
+        self.assertEqual(len(saved["turns"]), 1)
+        self.assertEqual(ResponseCache(store=store).lookup(saved["turns"][0][0])[1], "shared")
+        self.assertLess(max(later - earlier for earlier, later in zip(ticks, ticks[1:])), store.delay / 2)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,324 @@
+"""
+Tests for streamed answers from the agents and the SSE endpoints.
+"""
+
+import asyncio
+import json
+import tempfile
+import unittest
+import sys
+import os
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backends.fake_agents import AsyncFakeProjectClient, FakeAgentsConfig, FakeAgentsService, FakeProjectClient
+from services.circuit_breaker import CircuitBreaker
+from services.run_resilience import RunResilience
+from services.token_budget import TokenBudget
+
+try:
+    from fastapi.testclient import TestClient
+except ImportError:  # pragma: no cover - optional dependency
+    TestClient = None
+
+PARTNER_PROFILE = {"partner_name": "TechSolutions Inc", "partner_tier": "Gold",
+                   "focus_area": "Cloud Infrastructure", "region": "North America"}
+
+def fast_service(**overrides):
+    config = dict(call_latency=0, run_seconds=0, run_jitter=0, token_delay=0, failure_rate=0, response_words=5, seed=1)
+    config.update(overrides)
+    return FakeAgentsService(FakeAgentsConfig(**config))
+
+class StreamingAgentTestCase(unittest.TestCase):
+    """Agents on the fake backend with their own breaker and no shared budget."""
+
+    agent_class = "MagenticOneAgent"
+    client_class = FakeProjectClient
+
+    def make_agent(self, service, budget=None):
+        import magentic_one_agent
+
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        with mock.patch.dict(os.environ, {
+            "AGENT_BACKEND": "fake",
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(self.tmp.name, "registry.json")
+        }):
+            agent = getattr(magentic_one_agent, self.agent_class)(project_client=self.client_class(service))
+        agent.circuit_breaker = CircuitBreaker(enabled=False)
+        agent.token_budget = budget
+        return agent
+
+    def budget(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return TokenBudget(tpm=1000000, state_path=os.path.join(tmp.name, "budget.json"))
+
+    def assert_framed(self, events):
+        """Header first, footer last, only deltas or a single error in between."""
+        kinds = [event for event, _ in events]
+        self.assertEqual(kinds[0], "header")
+        self.assertEqual(kinds[-1], "footer")
+        self.assertIn("LUMEN", events[0][1].upper())
+        self.assertIn("Lumen Technologies", events[-1][1])
+        return kinds[1:-1], "".join(text for event, text in events if event == "delta")
+
+class TestSyncStreaming(StreamingAgentTestCase):
+    """Test MagenticOneAgent's streaming methods."""
+
+    def test_query_event_order(self):
+        """Test that deltas come between the header and footer and add up to the stored answer."""
+        service = fast_service()
+        agent = self.make_agent(service)
+        events = list(agent.stream_customer_query("Need SD-WAN help", events=True))
+        middle, text = self.assert_framed(events)
+        self.assertGreater(len(middle), 1)
+        self.assertEqual(set(middle), {"delta"})
+        self.assertEqual(text, next(iter(service.runs.values())).answer)
+
+    def test_plain_text_mode(self):
+        """Test that without events=True only the text chunks are yielded."""
+        chunks = list(self.make_agent(fast_service()).stream_customer_query("Need SD-WAN help"))
+        self.assertTrue(all(isinstance(chunk, str) for chunk in chunks))
+        self.assertIn("Need SD-WAN help", "".join(chunks))
+
+    def test_technical_and_scaling(self):
+        """Test that the technical and scaling streams render their templates and are framed the same way."""
+        agent = self.make_agent(fast_service())
+        _, text = self.assert_framed(list(agent.stream_technical_support("Router down", "critical", events=True)))
+        self.assertIn("TECHNICAL SUPPORT REQUEST", text)
+        _, text = self.assert_framed(list(agent.stream_partner_scaling_recommendations(PARTNER_PROFILE, events=True)))
+        self.assertIn("PARTNER SCALING CONSULTATION REQUEST", text)
+
+    def test_error_event_without_text(self):
+        """Test that a run that fails before any text yields one error event between header and footer."""
+        from magentic_one_agent import FALLBACK_RESPONSE
+
+        events = list(self.make_agent(fast_service(failure_rate=1.0)).stream_customer_query("Need help", events=True))
+        middle, _ = self.assert_framed(events)
+        self.assertEqual(middle, ["error"])
+        self.assertEqual(events[1][1], FALLBACK_RESPONSE)
+
+    def test_deadline_stops_stream(self):
+        """Test that a stream running past the endpoint's deadline is cancelled and ends with the timeout apology."""
+        from magentic_one_agent import TIMEOUT_RESPONSE
+
+        service = fast_service(token_delay=0.02, response_words=50)
+        agent = self.make_agent(service)
+        agent.run_resilience = RunResilience(deadlines={"technical": 0.1})
+        events = list(agent.stream_technical_support("Router down", "high", events=True))
+        middle, _ = self.assert_framed(events)
+        self.assertEqual(middle[-1], "error")
+        self.assertEqual(events[-2][1], TIMEOUT_RESPONSE)
+        self.assertEqual(agent.last_run_outcome, "timeout")
+        self.assertEqual([run.status for run in service.runs.values()], ["cancelling"])
+
+    def test_budget_settled_with_usage(self):
+        """Test that the streamed run's reservation is replaced by its reported usage."""
+        service = fast_service()
+        budget = self.budget()
+        list(self.make_agent(service, budget).stream_customer_query("Need SD-WAN help"))
+        run = next(iter(service.runs.values()))
+        self.assertEqual(budget.stats()["tokens_in_window"], run.usage.total_tokens)
+
+class TestAsyncStreaming(StreamingAgentTestCase, unittest.IsolatedAsyncioTestCase):
+    """Test AsyncMagenticOneAgent's streaming methods."""
+
+    agent_class = "AsyncMagenticOneAgent"
+    client_class = AsyncFakeProjectClient
+
+    async def collect(self, stream):
+        return [event async for event in stream]
+
+    async def test_query_event_order(self):
+        """Test that deltas come between the header and footer and add up to the stored answer."""
+        service = fast_service()
+        agent = self.make_agent(service)
+        middle, text = self.assert_framed(await self.collect(agent.stream_customer_query("Need SD-WAN help", events=True)))
+        self.assertEqual(set(middle), {"delta"})
+        self.assertEqual(text, next(iter(service.runs.values())).answer)
+
+    async def test_technical_and_scaling(self):
+        """Test that the technical and scaling streams are framed and render their templates."""
+        agent = self.make_agent(fast_service())
+        _, text = self.assert_framed(await self.collect(agent.stream_technical_support("Router down", "high", events=True)))
+        self.assertIn("TECHNICAL SUPPORT REQUEST", text)
+        _, text = self.assert_framed(await self.collect(
+            agent.stream_partner_scaling_recommendations(PARTNER_PROFILE, events=True)
+        ))
+        self.assertIn("PARTNER SCALING CONSULTATION REQUEST", text)
+
+    async def test_error_event_without_text(self):
+        """Test that a failed run yields a single error event."""
+        agent = self.make_agent(fast_service(failure_rate=1.0))
+        middle, _ = self.assert_framed(await self.collect(agent.stream_customer_query("Need help", events=True)))
+        self.assertEqual(middle, ["error"])
+
+    async def test_deadline_stops_stream(self):
+        """Test that a stream running past the endpoint's deadline is cancelled with a timeout error event."""
+        from magentic_one_agent import TIMEOUT_RESPONSE
+
+        service = fast_service(token_delay=0.02, response_words=50)
+        agent = self.make_agent(service)
+        agent.run_resilience = RunResilience(deadlines={"query": 0.1})
+        events = await self.collect(agent.stream_customer_query("Need SD-WAN help", events=True))
+        middle, _ = self.assert_framed(events)
+        self.assertEqual(events[-2], ("error", TIMEOUT_RESPONSE))
+        self.assertEqual([run.status for run in service.runs.values()], ["cancelling"])
+
+    async def test_budget_settled_with_usage(self):
+        """Test that the streamed run's reservation is replaced by its reported usage."""
+        service = fast_service()
+        budget = self.budget()
+        await self.collect(self.make_agent(service, budget).stream_customer_query("Need SD-WAN help"))
+        run = next(iter(service.runs.values()))
+        self.assertEqual(budget.stats()["tokens_in_window"], run.usage.total_tokens)
+
+@unittest.skipUnless(TestClient is not None, "fastapi is not installed")
+class TestStreamLease(unittest.IsolatedAsyncioTestCase):
+    """Test that a stream is admitted after its session claim and frees its lease when the client leaves early."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.env = mock.patch.dict(os.environ, {
+            "AGENT_BACKEND": "fake",
+            "FAKE_AGENTS_CALL_LATENCY_MS": "0",
+            "FAKE_AGENTS_RUN_SECONDS": "0",
+            "FAKE_AGENTS_TOKEN_DELAY_MS": "0",
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(cls.tmp.name, "registry.json"),
+            "JOB_DB_PATH": os.path.join(cls.tmp.name, "jobs.sqlite3")
+        })
+        cls.env.start()
+        import app
+
+        cls.app = app
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.tmp.cleanup()
+
+    async def asyncTearDown(self):
+        if self.app.session_manager is not None:
+            await self.app.session_manager.close()
+            self.app.session_manager = None
+        await self.app.agent_pool.close()
+
+    async def disconnect_after(self, messages: int):
+        """Serve a stream to a client that goes away after `messages` ASGI messages."""
+        response = await self.app._stream_response(
+            lambda agent: agent.stream_customer_query("Need SD-WAN help", events=True)
+        )
+        self.assertEqual(self.app.admission.in_flight, 1)
+        sent = []
+
+        async def send(message):
+            if len(sent) == messages:
+                raise OSError("client disconnected")
+            sent.append(message)
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+        with self.assertRaises(Exception):
+            await response(scope, receive, send)
+        return sent
+
+    async def test_admitted_after_session_claim(self):
+        """Test that a stream waiting behind its session's earlier run holds no admission slot meanwhile."""
+        sessions = await self.app._get_session_manager()
+        async with sessions.claim("partner:Acme"):
+            pending = asyncio.create_task(self.app._stream_response(
+                lambda agent: agent.stream_customer_query("Need SD-WAN help", events=True), "partner:Acme"
+            ))
+            await asyncio.sleep(0.05)
+            self.assertFalse(pending.done())
+            self.assertEqual(self.app.admission.in_flight, 0)
+        response = await pending
+        self.assertEqual(self.app.admission.in_flight, 1)
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+        self.assertIn(b"event: done", sent[-2]["body"])
+        self.assertEqual(self.app.admission.in_flight, 0)
+
+    async def test_disconnect_before_first_event(self):
+        """Test that a client leaving before the stream starts does not leak its admission ticket."""
+        self.assertEqual(await self.disconnect_after(0), [])
+        self.assertEqual(self.app.admission.in_flight, 0)
+
+    async def test_disconnect_mid_stream(self):
+        """Test that a client leaving mid-stream releases the ticket and returns the pooled agent."""
+        sent = await self.disconnect_after(2)
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(self.app.admission.in_flight, 0)
+        self.assertEqual(self.app.agent_pool.health()["in_use"], 0)
+
+def parse_sse(body: str):
+    """[(event, text)] from an SSE body."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])["text"]))
+    return events
+
+@unittest.skipUnless(TestClient is not None, "fastapi is not installed")
+class TestStreamEndpoints(unittest.TestCase):
+    """Test the SSE routes against the fake backend."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.env = mock.patch.dict(os.environ, {
+            "AGENT_BACKEND": "fake",
+            "STARTUP_MODE": "eager",
+            "FAKE_AGENTS_CALL_LATENCY_MS": "0",
+            "FAKE_AGENTS_RUN_SECONDS": "0",
+            "FAKE_AGENTS_TOKEN_DELAY_MS": "0",
+            "FAKE_AGENT_REGISTRY_PATH": os.path.join(cls.tmp.name, "registry.json"),
+            "JOB_DB_PATH": os.path.join(cls.tmp.name, "jobs.sqlite3")
+        })
+        cls.env.start()
+        import app
+
+        cls.app = app
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.env.stop()
+        cls.tmp.cleanup()
+
+    def stream(self, path: str, body: dict):
+        with TestClient(self.app.app) as client:
+            response = client.post(path, json=body)
+            in_flight = self.app.admission.in_flight
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        self.assertEqual(in_flight, 0)
+        return parse_sse(response.text)
+
+    def test_query_stream_framing(self):
+        """Test that /query/stream sends header, deltas, footer and done, and frees its admission slot."""
+        events = self.stream("/query/stream", {"query": "Need SD-WAN help"})
+        kinds = [event for event, _ in events]
+        self.assertEqual((kinds[0], kinds[-2], kinds[-1]), ("header", "footer", "done"))
+        self.assertEqual(set(kinds[1:-2]), {"delta"})
+
+    def test_technical_and_scaling_streams(self):
+        """Test that the other stream routes frame their answers the same way."""
+        for path, body in (("/technical-support/stream", {"technical_issue": "Router down", "urgency": "high"}),
+                           ("/partner-scaling/stream", {"partner_profile": PARTNER_PROFILE})):
+            kinds = [event for event, _ in self.stream(path, body)]
+            self.assertEqual((kinds[0], kinds[-1]), ("header", "done"))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
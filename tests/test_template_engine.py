@@ -0,0 +1,146 @@
+"""
+Tests for the precompiled template engine.
+"""
+
+import unittest
+import tempfile
+import sys
+import os
+from types import SimpleNamespace
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from templates.engine import CompiledTemplate, TemplateError, TemplateRegistry
+from templates.compaction import PromptCompactor, compact_whitespace
+from templates.support_templates import TEMPLATE_DIRECTORY, TEMPLATE_FIELDS
+from config.lumen_branding import LumenBrandConfig
+from magentic_one_agent import BaseMagenticOneAgent
+
+class TestCompiledTemplate(unittest.TestCase):
+    """Test template compilation and rendering."""
+
+    def test_render_matches_format(self):
+        """Test that rendering matches str.format on the stripped source."""
+        source = "\nPartner: {partner_name}\nTier: {partner_tier} ({partner_name})\n"
+        template = CompiledTemplate("example", source)
+        self.assertEqual(template.fields, {"partner_name", "partner_tier"})
+        self.assertEqual(
+            template.render(partner_name="Acme", partner_tier="Gold"),
+            source.strip().format(partner_name="Acme", partner_tier="Gold")
+        )
+
+    def test_values_are_not_reinterpreted(self):
+        """Test that braces inside values are inserted literally."""
+        template = CompiledTemplate("example", "Issue: {issue}")
+        self.assertEqual(template.render(issue="{not_a_field}"), "Issue: {not_a_field}")
+
+    def test_missing_value_raises(self):
+        """Test that rendering without a required value fails clearly."""
+        with self.assertRaises(TemplateError):
+            CompiledTemplate("example", "{region}").render()
+
+    def test_format_spec_rejected(self):
+        """Test that only plain slots are accepted."""
+        with self.assertRaises(TemplateError):
+            CompiledTemplate("example", "{region!r}")
+
+class TestTemplateRegistry(unittest.TestCase):
+    """Test loading, validation and hot reload."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "greeting.txt")
+        self._write("Hello {name}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, content, mtime=None):
+        with open(self.path, "w") as f:
+            f.write(content)
+        if mtime is not None:
+            os.utime(self.path, (mtime, mtime))
+
+    def test_field_mismatch_fails_at_load(self):
+        """Test that undeclared or missing slots are rejected at load time."""
+        with self.assertRaises(TemplateError):
+            TemplateRegistry(self.tmp.name, {"greeting": ("partner",)})
+
+    def test_missing_file_fails_at_load(self):
+        """Test that a declared template without a file is rejected."""
+        with self.assertRaises(TemplateError):
+            TemplateRegistry(self.tmp.name, {"greeting": ("name",), "absent": ()})
+
+    def test_hot_reload(self):
+        """Test that modified files are recompiled, keeping the last good version on error."""
+        registry = TemplateRegistry(self.tmp.name, {"greeting": ("name",)}, hot_reload=True, reload_interval=0)
+        self.assertEqual(registry.render("greeting", name="Acme"), "Hello Acme")
+
+        self._write("Welcome {name}", mtime=os.path.getmtime(self.path) + 10)
+        self.assertEqual(registry.render("greeting", name="Acme"), "Welcome Acme")
+
+        self._write("Welcome {partner}", mtime=os.path.getmtime(self.path) + 10)
+        self.assertEqual(registry.render("greeting", name="Acme"), "Welcome Acme")
+
+class TestPromptCompaction(unittest.TestCase):
+    """Test whitespace compaction and removal of guidance repeated from the instructions."""
+
+    INSTRUCTIONS = """
+        RESPONSE GUIDELINES:
+        - Provide specific, actionable recommendations
+        - Offer escalation paths for complex issues
+    """
+
+    def test_whitespace_normalized(self):
+        """Test that indentation is removed, blank runs collapse and nesting is kept."""
+        text = "\n        HEADER:   one\n\n\n        1. Item  \n           - Detail\n        "
+        self.assertEqual(compact_whitespace(text), "HEADER: one\n\n1. Item\n   - Detail")
+
+    def test_repeated_guidance_dropped(self):
+        """Test that a line already in the instructions is removed, ignoring case, markers and punctuation."""
+        compactor = PromptCompactor(self.INSTRUCTIONS)
+        text = "Issue: {issue}\n\nPlease provide specific, actionable recommendations.\n- Root cause analysis"
+        self.assertEqual(compactor.compact(text), "Issue: {issue}\n\n- Root cause analysis")
+
+    def test_slot_lines_and_short_lines_kept(self):
+        """Test that lines with slots or too few words are never removed."""
+        compactor = PromptCompactor(self.INSTRUCTIONS + "\n- Offer escalation paths for {tier} issues")
+        self.assertFalse(compactor.is_redundant("- Offer escalation paths for {tier} issues"))
+        self.assertFalse(compactor.is_redundant("Provide specific"))
+
+    def test_similar_sentences_dropped(self):
+        """Test that a sentence restating reference guidance with extra words is removed on its own."""
+        compactor = PromptCompactor(self.INSTRUCTIONS)
+        text = "Root cause first. Please provide specific, actionable recommendations tailored to this partner.\n- Impact assessment"
+        self.assertEqual(compactor.compact(text), "Root cause first.\n- Impact assessment")
+        self.assertFalse(compactor.is_redundant("PROVIDE SPECIFIC ACTIONABLE RECOMMENDATIONS"))
+        self.assertFalse(compactor.is_redundant("Please provide specific recommendations including:"))
+        self.assertFalse(compactor.is_redundant("Offer training paths for new sales staff"))
+
+    def test_shipped_templates_shrink(self):
+        """Test that the shipped templates lose the closing lines that restate the agent instructions."""
+        with mock.patch.dict(os.environ, {"PROMPT_COMPACTION": "false"}):
+            instructions = BaseMagenticOneAgent._build_instructions(SimpleNamespace(brand_config=LumenBrandConfig()))
+        registry = TemplateRegistry(TEMPLATE_DIRECTORY, TEMPLATE_FIELDS, compactor=PromptCompactor(instructions))
+        report = registry.compaction_report()
+        self.assertGreater(report["scaling"]["tokens_saved"], 0)
+        self.assertGreater(report["technical"]["tokens_saved"], 0)
+        rendered = registry.render("scaling", partner_name="Acme", partner_tier="Gold", focus_area="SD-WAN", region="EMEA")
+        self.assertNotIn("actionable recommendations tailored", rendered)
+        self.assertIn("Partnership program benefits for Gold tier", rendered)
+        self.assertIn("3. LUMEN SOLUTION ALIGNMENT", rendered)
+
+    def test_registry_compiles_compacted_source(self):
+        """Test that the registry renders the compacted template and reports the savings."""
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "technical.txt"), "w") as f:
+                f.write("    Issue: {issue}\n\n\n    Offer escalation paths for complex issues.\n")
+            registry = TemplateRegistry(tmp, {"technical": ("issue",)}, compactor=PromptCompactor(self.INSTRUCTIONS))
+            self.assertEqual(registry.render("technical", issue="VPN down"), "Issue: VPN down")
+            report = registry.compaction_report()["technical"]
+            self.assertGreater(report["tokens_saved"], 0)
+            self.assertLess(report["tokens_after"], report["tokens_before"])
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,148 @@
+"""
+Tests for the shared token budget and rate-limit retry hints.
+"""
+
+import asyncio
+import tempfile
+import threading
+import time
+import unittest
+import sys
+import os
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.token_budget import (
+    TokenBudget, TokenBudgetExceeded, estimate_tokens, is_rate_limited, retry_after_hint, retry_delay
+)
+
+class TestTokenBudget(unittest.TestCase):
+    """Test the sliding-window budget."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "budget.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_reservations_within_quota(self):
+        """Test that reservations are granted until the TPM quota is used."""
+        budget = TokenBudget(tpm=1000, state_path=self.path)
+        self.assertIsNotNone(budget.reserve(600)[0])
+        reservation, delay = budget.reserve(600)
+        self.assertIsNone(reservation)
+        self.assertGreater(delay, 59)
+
+    def test_budget_shared_through_state_file(self):
+        """Test that two budgets on the same file (two workers) see each other's usage."""
+        TokenBudget(tpm=1000, state_path=self.path).reserve(900)
+        self.assertIsNone(TokenBudget(tpm=1000, state_path=self.path).reserve(200)[0])
+
+    def test_rpm_limit(self):
+        """Test that the request count is limited independently of tokens."""
+        budget = TokenBudget(rpm=2, state_path=self.path)
+        budget.reserve(1)
+        budget.reserve(1)
+        self.assertIsNone(budget.reserve(1)[0])
+
+    def test_shed_when_wait_too_long(self):
+        """Test that work is shed rather than waiting past max_wait."""
+        budget = TokenBudget(tpm=1000, state_path=self.path, max_wait=0.1)
+        budget.acquire(1000)
+        with self.assertRaises(TokenBudgetExceeded) as shed:
+            budget.acquire(500)
+        self.assertGreater(shed.exception.retry_after, 1)
+
+    def test_settle_frees_overestimate(self):
+        """Test that settling with actual usage frees the unused estimate."""
+        budget = TokenBudget(tpm=1000, state_path=self.path)
+        reservation, _ = budget.reserve(900)
+        budget.settle(reservation, 300)
+        self.assertIsNotNone(budget.reserve(600)[0])
+
+    def test_estimate_tokens(self):
+        """Test that the local estimate scales with the prompt length."""
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertGreater(estimate_tokens("word " * 400), estimate_tokens("word " * 100))
+
+class TestTokenBudgetAsync(unittest.IsolatedAsyncioTestCase):
+    """Test that async reservations never block the event loop."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.budget = TokenBudget(tpm=1000, state_path=os.path.join(self.tmp.name, "budget.json"))
+
+    async def test_loop_runs_while_shared_lock_is_held(self):
+        """Test that a reservation waiting on another worker's lock leaves the loop free."""
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        locked = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with self.budget._shared_lock():
+                locked.set()
+                release.wait()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        locked.wait()
+        acquire = asyncio.create_task(self.budget.acquire_async(100))
+        await asyncio.sleep(0.2)
+        self.assertFalse(acquire.done())
+        release.set()
+        reservation = await acquire
+        holder.join()
+        ticker.cancel()
+        self.assertIsNotNone(reservation)
+        self.assertGreater(len(ticks), 10)
+
+    async def test_settle_async(self):
+        """Test that settling from a coroutine frees the overestimate."""
+        reservation = await self.budget.acquire_async(900)
+        await self.budget.settle_async(reservation, 300)
+        self.assertIsNotNone(self.budget.reserve(600)[0])
+        self.assertEqual((await self.budget.stats_async())["tokens_in_window"], 900)
+
+class TestRateLimitHints(unittest.TestCase):
+    """Test throttling detection and retry hints."""
+
+    def test_failed_run_hint(self):
+        """Test that a throttled run's message yields the retry hint."""
+        run = SimpleNamespace(status="failed", last_error={
+            "code": "rate_limit_exceeded",
+            "message": "Rate limit is exceeded. Try again in 17 seconds."
+        })
+        self.assertTrue(is_rate_limited(run))
+        self.assertEqual(retry_after_hint(run), 17)
+
+    def test_http_error_header(self):
+        """Test that a 429 error honours the Retry-After header."""
+        error = RuntimeError("Too Many Requests")
+        error.status_code = 429
+        error.response = SimpleNamespace(status_code=429, headers={"Retry-After": "4"})
+        self.assertTrue(is_rate_limited(error))
+        self.assertEqual(retry_delay(error, attempt=0), 4)
+
+    def test_other_failures_not_retried(self):
+        """Test that ordinary failures are not treated as throttling."""
+        run = SimpleNamespace(status="failed", last_error={"code": "server_error", "message": "boom"})
+        self.assertFalse(is_rate_limited(run))
+        self.assertFalse(is_rate_limited(ValueError("bad input")))
+
+    def test_backoff_without_hint(self):
+        """Test that missing hints fall back to capped exponential backoff."""
+        error = RuntimeError("rate limit reached")
+        self.assertLessEqual(retry_delay(error, attempt=10, max_wait=5), 5)
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)